@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, Body, File, UploadFile, Form, HTTPException
+from fastapi import APIRouter, Depends, Body, File, UploadFile, Form, HTTPException, Request
 from fastapi.responses import JSONResponse
 from sse_starlette.sse import EventSourceResponse
 from sqlalchemy.orm import Session
@@ -6,28 +6,32 @@ from datetime import datetime
 from log_config import configure_logging
 
 from crud.rag import (
-    rag_chat,
+    arag_chat,
     rag_streaming_chat,
-    get_relevant_legal_cases,
+    aget_relevant_legal_cases,
 )
 
 from crud.chat import (
     add_legal_chat_message,
     add_legal_session_summary,
     legal_session_exist,
-    read_pdf,
-    upload_legal_description,
-    generate_question,
-    summarize_session,
-    init_postgres_chat_memory,
+    aread_pdf,
+    aupload_legal_description,
+    agenerate_question,
+    asummarize_session,
+    init_legal_session_memory,
 )
 from langchain_openai import ChatOpenAI
-from langchain.memory import ConversationSummaryBufferMemory
 from crud.user import get_userid_by_token
 from database.session import get_session
 from schemas.message import LegalChatAdd
 from core.auth_bearer import JWTBearer
-from crud.agent import agent_run
+from core.config import settings
+from core.executor import run_blocking
+from core.metrics import metrics
+from core.stream_buffer import stream_hub
+from core.streaming import negotiate_protocol
+from crud.agent import agent_run, buffered_agent_run
 
 # Configure logging
 logger = configure_logging(__name__)
@@ -62,22 +66,22 @@ async def rag_regulation_chat(
             logger.debug(f"File name: {file_name}")
             time_stamp = created_date.timestamp()
             legal_s3_key = f"{time_stamp}_{file_name}"
-            upload_legal_description(
+            await aupload_legal_description(
                 file_content=pdf_contents,
                 user_id=user_id,
                 session_id=session_id,
                 legal_s3_key=legal_s3_key,
             )
             logger.debug(f"Uploaded legal description with s3 key: {legal_s3_key}")
-            pdf_contents = read_pdf(pdf_contents)
+            pdf_contents = await aread_pdf(pdf_contents)
             logger.debug("Read PDF contents.")
-            standalone_question = generate_question(
+            standalone_question = await agenerate_question(
                 pdf_contents=pdf_contents, question=question
             )
             logger.debug("Generated standalone question.")
-        response = rag_chat(question=standalone_question, session_id=session_id)
+        response = await arag_chat(question=standalone_question, session_id=session_id)
         answer = response["answer"]
-        logger.debug("Received answer from rag_chat.")
+        logger.debug("Received answer from arag_chat.")
         user_message = LegalChatAdd(
             user_id=user_id,
             session_id=session_id,
@@ -98,11 +102,11 @@ async def rag_regulation_chat(
             legal_s3_key="",
             created_date=created_date,
         )
-        add_legal_chat_message(user_message, session)
+        await run_blocking(add_legal_chat_message, user_message, session)
         logger.debug("Added user message to chat.")
-        add_legal_chat_message(ai_message, session)
+        await run_blocking(add_legal_chat_message, ai_message, session)
         logger.debug("Added AI message to chat.")
-        if legal_session_exist(session_id=session_id, session=session):
+        if await run_blocking(legal_session_exist, session_id=session_id, session=session):
             logger.info(f"Legal session exists for session_id: {session_id}")
             return JSONResponse(
                 content={
@@ -118,8 +122,8 @@ async def rag_regulation_chat(
             )
         else:
             logger.info(f"Legal session does not exist for session_id: {session_id}. Summarizing session.")
-            summary = summarize_session(question=standalone_question, answer=answer)
-            add_legal_session_summary(
+            summary = await asummarize_session(question=standalone_question, answer=answer)
+            await add_legal_session_summary(
                 user_id=user_id, session_id=session_id, summary=summary, session=session
             )
             logger.debug("Added legal session summary.")
@@ -146,6 +150,7 @@ async def rag_regulation_chat(
 
 @router.post("/chat-streaming", tags=["RagController"], status_code=200)
 async def rag_streaming(
+    request: Request,
     session_id: str = Form(),
     question: str = Form(),
     file: UploadFile = File(None),
@@ -171,25 +176,25 @@ async def rag_streaming(
             logger.debug(f"File name: {file_name}")
             time_stamp = created_date.timestamp()
             legal_s3_key = f"{time_stamp}_{file_name}"
-            upload_legal_description(
+            await aupload_legal_description(
                 file_content=pdf_contents,
                 user_id=user_id,
                 session_id=session_id,
                 legal_s3_key=legal_s3_key,
             )
             logger.debug(f"Uploaded legal description with s3 key: {legal_s3_key}")
-            pdf_contents = read_pdf(pdf_contents)
+            pdf_contents = await aread_pdf(pdf_contents)
             logger.debug("Read PDF contents.")
-            standalone_question = generate_question(
+            standalone_question = await agenerate_question(
                 pdf_contents=pdf_contents, question=question
             )
             logger.debug("Generated standalone question.")
-        chat_memory = init_postgres_chat_memory(session_id=session_id)
-        memory = ConversationSummaryBufferMemory(
+        memory = await run_blocking(
+            init_legal_session_memory,
+            session_id=session_id,
             llm=ChatOpenAI(model_name="gpt-4-1106-preview", temperature=0),
             memory_key="chat_history",
             return_messages="on",
-            chat_memory=chat_memory,
             max_token_limit=3000,
             output_key="answer",
             ai_prefix="Question",
@@ -203,10 +208,11 @@ async def rag_streaming(
                 session_id=session_id,
                 user_id=user_id,
                 db_session=session,
-                chat_history=memory.buffer,
+                chat_history=await run_blocking(lambda: memory.buffer),
                 legal_attached=attached_pdf,
                 legal_file_name=file_name,
                 legal_s3_key=legal_s3_key,
+                stream_protocol=negotiate_protocol(request),
             ),
             media_type="text/event-stream",
         )
@@ -219,12 +225,12 @@ async def rag_streaming(
 
 
 @router.post("/get-legal-cases", tags=["RagController"])
-def get_legal_cases(body: dict = Body(), dependencies=Depends(JWTBearer())):
+async def get_legal_cases(body: dict = Body(), dependencies=Depends(JWTBearer())):
     logger.info("Received /get-legal-cases request.")
     try:
         session_id = body["session_id"]
         logger.debug(f"Session ID: {session_id}")
-        legal_cases = get_relevant_legal_cases(session_id=session_id)
+        legal_cases = await aget_relevant_legal_cases(session_id=session_id)
         logger.debug(f"Retrieved legal cases: {legal_cases}")
         return JSONResponse(
             content={"session_id": session_id, "legal_cases": legal_cases}, status_code=200
@@ -237,8 +243,15 @@ def get_legal_cases(body: dict = Body(), dependencies=Depends(JWTBearer())):
         )
 
 
+@router.get("/metrics", tags=["RagController"])
+def rag_metrics(dependencies=Depends(JWTBearer())):
+    logger.info("Received /metrics request.")
+    return JSONResponse(content=metrics.snapshot(), status_code=200)
+
+
 @router.post("/chat-agent-streaming", tags=["RagController"], status_code=200)
 async def rag_agent_streaming(
+    request: Request,
     session_id: str = Form(),
     question: str = Form(),
     file: UploadFile = File(None),
@@ -252,6 +265,18 @@ async def rag_agent_streaming(
     attached_pdf = False
     try:
         user_id = get_userid_by_token(dependencies)
+        owner = (user_id, session_id)
+        if settings.STREAM_RESUME_ENABLED:
+            # A reconnect with Last-Event-ID reattaches to the answer in progress
+            # (or replays the finished one) instead of asking the LLM again.
+            resumed = stream_hub.resume(
+                request.headers.get("Last-Event-ID"),
+                owner,
+                question,
+                negotiate_protocol(request),
+            )
+            if resumed is not None:
+                return EventSourceResponse(resumed, media_type="text/event-stream")
         created_date = datetime.now()
         if file is None:
             standalone_question = question
@@ -267,30 +292,39 @@ async def rag_agent_streaming(
                 logger.debug(f"File name: {file_name}")
                 time_stamp = created_date.timestamp()
                 legal_s3_key = f"{time_stamp}_{file_name}"
-                upload_legal_description(
+                await aupload_legal_description(
                     file_content=pdf_contents,
                     user_id=user_id,
                     session_id=session_id,
                     legal_s3_key=legal_s3_key,
                 )
                 logger.debug(f"Uploaded legal description with s3 key: {legal_s3_key}")
-                pdf_contents = read_pdf(pdf_contents)
+                pdf_contents = await aread_pdf(pdf_contents)
                 logger.debug("Read PDF contents.")
-                standalone_question = generate_question(
+                standalone_question = await agenerate_question(
                     pdf_contents=pdf_contents, question=question
                 )
                 logger.debug("Generated standalone question.")
+        run = dict(
+            standalone_question=standalone_question,
+            question=question,
+            session_id=session_id,
+            user_id=user_id,
+            legal_attached=attached_pdf,
+            legal_file_name=file_name,
+            legal_s3_key=legal_s3_key,
+        )
+        if settings.STREAM_RESUME_ENABLED:
+            # The buffered run keeps going after a disconnect, past this request's session.
+            answer_stream = stream_hub.start(buffered_agent_run(**run), owner, question).events(
+                protocol=negotiate_protocol(request)
+            )
+        else:
+            answer_stream = agent_run(
+                **run, db_session=session, stream_protocol=negotiate_protocol(request)
+            )
         return EventSourceResponse(
-            agent_run(
-                standalone_question=standalone_question,
-                question=question,
-                session_id=session_id,
-                user_id=user_id,
-                db_session=session,
-                legal_attached=attached_pdf,
-                legal_file_name=file_name,
-                legal_s3_key=legal_s3_key,
-            ),
+            answer_stream,
             media_type="text/event-stream",
         )
     except Exception as e:
@@ -0,0 +1,95 @@
+"""
+Per-request agent setup cost, before and after the prebuilt agent.
+
+"before" builds the prompt, the three tools, a ChatOpenAI, the OpenAI functions
+agent and the AgentExecutor for every call, the way crud/agent.py used to.
+"after" binds temperature, max_tokens and the user id to the worker's
+PrebuiltAgent and wraps it in an AgentExecutor. Nothing is sent to OpenAI;
+allocations are measured with tracemalloc.
+
+Run from the app directory:
+    python -m benchmarks.agent_build --iterations 200
+"""
+import argparse
+import statistics
+import time
+import tracemalloc
+
+from langchain.agents import AgentExecutor, create_openai_functions_agent
+from langchain.chat_models import ChatOpenAI
+from langchain.memory import ConversationBufferMemory
+from langchain.prompts import ChatPromptTemplate
+from langchain_community.tools.tavily_search import TavilySearchResults
+
+from core.config import settings
+from core.prompt import main_agent_prompt
+from crud.agent import get_agent
+from tools.rag_legal_tool import rag_legal_tool
+from tools.rag_regulation_tool import rag_regulation_tool
+
+
+def setup_before(memory, user_id):
+    prompt = ChatPromptTemplate.from_messages([
+        ("system", main_agent_prompt),
+        ("placeholder", "{chat_history}"),
+        ("human", "{input}"),
+        ("placeholder", "{agent_scratchpad}"),
+    ])
+    tools = [
+        rag_regulation_tool(),
+        rag_legal_tool(),
+        TavilySearchResults(max_results=1),
+    ]
+    llm = ChatOpenAI(
+        model_name=settings.LLM_MODEL_NAME,
+        temperature=0.6,
+        max_tokens=6000,
+        openai_api_key=settings.OPENAI_API_KEY,
+        streaming=True,
+        model_kwargs={"user": str(user_id)},
+    )
+    agent = create_openai_functions_agent(llm=llm, tools=tools, prompt=prompt)
+    return AgentExecutor(agent=agent, tools=tools, verbose=True, memory=memory)
+
+
+def setup_after(memory, user_id):
+    return get_agent().executor(memory, temperature=0.6, max_tokens=6000, user_id=user_id)
+
+
+def measure(setup, iterations):
+    memory = ConversationBufferMemory(
+        memory_key="chat_history", return_messages=True, output_key="output"
+    )
+    setup(memory, 0)
+    samples = []
+    for user_id in range(iterations):
+        start = time.perf_counter()
+        setup(memory, user_id)
+        samples.append((time.perf_counter() - start) * 1000)
+
+    # Peak memory allocated while building one request's executor.
+    peaks = []
+    for user_id in range(min(iterations, 20)):
+        tracemalloc.start()
+        setup(memory, user_id)
+        peaks.append(tracemalloc.get_traced_memory()[1] / 1024)
+        tracemalloc.stop()
+    return samples, statistics.mean(peaks)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--iterations", type=int, default=200)
+    args = parser.parse_args()
+
+    for name, setup in (("before", setup_before), ("after", setup_after)):
+        samples, peak_kib = measure(setup, args.iterations)
+        print(
+            f"{name:<8} mean={statistics.mean(samples):8.3f}ms "
+            f"p50={statistics.median(samples):8.3f}ms "
+            f"allocated/request={peak_kib:8.1f}KiB"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Agent time to first token with the old and the new creativity grading.
+
+The old path asked gpt-4o for a creativity score on every question and only
+then loaded the session memory; the new path grades locally (the LLM only for
+unsure questions), caches the score and loads memory while grading runs. The
+LLM, memory and agent latencies are simulated; the local grader is the real one.
+
+Run from the app directory:
+    python -m benchmarks.agent_setup --grade-ms 700 --memory-ms 150 --agent-ttft-ms 450
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from langchain_core.runnables import RunnableLambda
+
+from core.creativity_grader import CreativityGrader
+
+QUESTIONS = [
+    "İşe iade davasında zamanaşımı süresi nedir?",
+    "Kıdem tazminatı ne kadar olur?",
+    "Kiracıya karşı tahliye için bir ihtarname hazırlar mısın?",
+    "Boşanma davasında velayet için nasıl bir strateji izlemeliyim?",
+    "Komşumun ağacı bahçeme taşıyor, ne yapabilirim?",
+    "TBK 344. maddesi neyi düzenler?",
+    "İşverenime karşı bir savunma yaz.",
+    "Miras paylaşımında anlaşamıyoruz.",
+]
+
+
+def sleeper(ms, scale):
+    async def call(*_):
+        await asyncio.sleep(scale * ms / 1000)
+
+    return call
+
+
+async def old_path(question, args):
+    await sleeper(args.grade_ms, args.scale)()
+    await sleeper(args.memory_ms, args.scale)()
+    await sleeper(args.agent_ttft_ms, args.scale)()
+
+
+async def new_path(question, grader, args):
+    grade = asyncio.create_task(grader.agrade(question))
+    await sleeper(args.memory_ms, args.scale)()
+    await grade
+    await sleeper(args.agent_ttft_ms, args.scale)()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--grade-ms", type=float, default=700)
+    parser.add_argument("--memory-ms", type=float, default=150)
+    parser.add_argument("--agent-ttft-ms", type=float, default=450)
+    parser.add_argument("--rounds", type=int, default=2, help="passes over the questions")
+    parser.add_argument(
+        "--scale", type=float, default=0.5, help="fraction of the modelled latency actually slept"
+    )
+    args = parser.parse_args()
+
+    wait = sleeper(args.grade_ms, args.scale)
+
+    async def llm_grade(inputs):
+        await wait()
+        return {"creativity_score": 5}
+
+    grader = CreativityGrader(
+        grade_chain=RunnableLambda(lambda inputs: {"creativity_score": 5}, afunc=llm_grade)
+    )
+
+    # Warm up the regexes and the event loop outside the timings.
+    grader.local_model.predict(QUESTIONS[0])
+    asyncio.run(sleeper(0, args.scale)())
+
+    results = {"old": [], "new": []}
+    for _ in range(args.rounds):
+        for question in QUESTIONS:
+            for name, run in (("old", old_path(question, args)), ("new", new_path(question, grader, args))):
+                start = time.perf_counter()
+                asyncio.run(run)
+                results[name].append((time.perf_counter() - start) * 1000 / args.scale)
+
+    print(f"{'path':>5} {'p50 ttft':>10} {'max ttft':>10}")
+    for name, timings in results.items():
+        print(f"{name:>5} {statistics.median(timings):>8.0f}ms {max(timings):>8.0f}ms")
+
+
+if __name__ == "__main__":
+    main()
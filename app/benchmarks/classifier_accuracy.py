@@ -0,0 +1,110 @@
+"""
+Accuracy and latency of the local namespace classifier against the LLM labels.
+
+Questions come from --questions (one per line, labelled here by the gpt-4o
+structured-output call, which needs OPENAI_API_KEY) or --labels (tab separated
+question and YARGITAY/DANISTAY, e.g. a file written by an earlier --write-labels).
+For every confidence threshold the report shows how many questions the local
+model answers, its accuracy on those against the LLM label, and the LLM time
+saved per question.
+
+--fit trains the logistic model on 80% of the labelled questions and evaluates
+it on the held-out 20%; --save writes the trained weights for
+CLASSIFIER_WEIGHTS_PATH.
+
+Run from the app directory:
+    python -m benchmarks.classifier_accuracy --questions questions.txt --write-labels labels.tsv
+    python -m benchmarks.classifier_accuracy --labels labels.tsv --fit --save classifier.json
+"""
+import argparse
+import random
+import statistics
+import time
+
+from crud.classify import Classifier, KeywordClassifier
+
+THRESHOLDS = (0.6, 0.7, 0.8, 0.9, 0.95)
+
+
+def label_with_llm(questions):
+    classifier = Classifier()
+    labels, timings = [], []
+    for question in questions:
+        start = time.perf_counter()
+        result = classifier.classify_chain.invoke({"question": question})
+        timings.append((time.perf_counter() - start) * 1000)
+        labels.append(result["category"])
+    return labels, timings
+
+
+def evaluate(model, questions, labels, llm_ms):
+    local_ms, predictions = [], []
+    for question in questions:
+        start = time.perf_counter()
+        predictions.append(model.predict(question))
+        local_ms.append((time.perf_counter() - start) * 1000)
+    print(
+        f"local latency p50={statistics.median(local_ms) * 1000:.1f}us "
+        f"max={max(local_ms) * 1000:.1f}us, LLM latency mean={llm_ms:.0f}ms"
+    )
+    accuracy = sum(p == label for (p, _), label in zip(predictions, labels)) / len(labels)
+    print(f"accuracy without fallback: {accuracy:.3f} over {len(labels)} questions")
+    for threshold in THRESHOLDS:
+        covered = [
+            (category, label)
+            for (category, confidence), label in zip(predictions, labels)
+            if confidence >= threshold
+        ]
+        share = len(covered) / len(labels)
+        correct = sum(category == label for category, label in covered)
+        local_accuracy = correct / len(covered) if covered else 1.0
+        overall = (correct + len(labels) - len(covered)) / len(labels)
+        print(
+            f"threshold={threshold:.2f} local={share:6.1%} local_accuracy={local_accuracy:.3f} "
+            f"overall_accuracy={overall:.3f} saved/question={share * llm_ms:6.0f}ms"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--questions", default=None)
+    parser.add_argument("--labels", default=None)
+    parser.add_argument("--write-labels", default=None)
+    parser.add_argument("--llm-ms", type=float, default=1200.0, help="LLM latency assumed with --labels")
+    parser.add_argument("--fit", action="store_true")
+    parser.add_argument("--save", default=None)
+    args = parser.parse_args()
+
+    if args.labels:
+        with open(args.labels, encoding="utf-8") as file:
+            rows = [line.rstrip("\n").split("\t") for line in file if "\t" in line]
+        questions, labels = [row[0] for row in rows], [row[1] for row in rows]
+        llm_ms = args.llm_ms
+    elif args.questions:
+        with open(args.questions, encoding="utf-8") as file:
+            questions = [line.strip() for line in file if line.strip()]
+        labels, timings = label_with_llm(questions)
+        llm_ms = statistics.mean(timings)
+        if args.write_labels:
+            with open(args.write_labels, "w", encoding="utf-8") as file:
+                file.writelines(f"{q}\t{label}\n" for q, label in zip(questions, labels))
+    else:
+        parser.error("pass --questions FILE or --labels FILE")
+
+    model = KeywordClassifier.load(None)
+    if args.fit:
+        order = list(range(len(questions)))
+        random.Random(0).shuffle(order)
+        split = int(len(order) * 0.8)
+        train, test = order[:split], order[split:]
+        model = KeywordClassifier.fit([questions[i] for i in train], [labels[i] for i in train])
+        questions, labels = [questions[i] for i in test], [labels[i] for i in test]
+        print(f"trained on {len(train)} questions, {len(model.weights)} features")
+        if args.save:
+            model.save(args.save)
+            print(f"saved weights to {args.save}")
+    evaluate(model, questions, labels, llm_ms)
+
+
+if __name__ == "__main__":
+    main()
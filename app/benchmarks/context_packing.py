@@ -0,0 +1,78 @@
+"""
+Prompt tokens of the QA context with and without context packing.
+
+Splits synthetic cases the way ingestion does (chunk_size=800, chunk_overlap=300),
+takes --top-n reranked chunks where hits cluster in neighbouring chunks of a few
+cases, as Cohere returns them for a focused question, and reports the context
+tokens before and after merging overlaps and applying the token budget.
+
+Run from the app directory:
+    python -m benchmarks.context_packing --top-n 10 --budget 3000
+"""
+import argparse
+import random
+import statistics
+
+from langchain_core.documents import Document
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from core.context import pack_documents
+from core.text import count_tokens
+
+SENTENCES = (
+    "Davacı, kira bedelinin tespitini talep etmiştir.",
+    "Mahkemece emsal kira bedelleri dikkate alınarak karar verilmiştir.",
+    "Türk Borçlar Kanunu'nun 344. maddesi uyarınca hakkaniyete uygun bedel belirlenir.",
+    "Bilirkişi raporunda taşınmazın konumu ve niteliği değerlendirilmiştir.",
+    "Davalı vekili, bedelin fahiş olduğunu ileri sürerek istinaf yoluna başvurmuştur.",
+    "Dairemizce yapılan incelemede usul ve yasaya aykırılık görülmemiştir.",
+)
+
+
+def case(rng, sentences=120):
+    return " ".join(rng.choice(SENTENCES) + f" ({i})" for i in range(sentences))
+
+
+def ranked_chunks(rng, splitter, cases, top_n):
+    pool = []
+    for number in range(cases):
+        source = f"case-{number}"
+        chunks = splitter.split_documents(
+            [Document(page_content=case(rng), metadata={"source_link": source})]
+        )
+        start = rng.randrange(len(chunks) - 3)
+        pool.extend(chunks[start : start + rng.randint(1, 4)])
+    rng.shuffle(pool)
+    top = pool[:top_n]
+    for rank, doc in enumerate(top):
+        doc.metadata["relevance_score"] = 1 - rank / top_n
+    return top
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--top-n", type=int, default=10)
+    parser.add_argument("--cases", type=int, default=5)
+    parser.add_argument("--budget", type=int, default=3000)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    splitter = RecursiveCharacterTextSplitter(chunk_size=800, chunk_overlap=300)
+    before, after, spans = [], [], []
+    for _ in range(args.queries):
+        top = ranked_chunks(rng, splitter, args.cases, args.top_n)
+        packed = pack_documents(top, args.budget)
+        before.append(sum(count_tokens(doc.page_content) for doc in top))
+        after.append(sum(count_tokens(doc.page_content) for doc in packed))
+        spans.append(len(packed))
+
+    print(f"chunks per prompt      {args.top_n}")
+    print(f"spans per prompt       {statistics.mean(spans):.1f}")
+    print(f"context tokens before  {statistics.mean(before):.0f}")
+    print(f"context tokens after   {statistics.mean(after):.0f}")
+    print(f"saved                  {1 - sum(after) / sum(before):.1%}")
+
+
+if __name__ == "__main__":
+    main()
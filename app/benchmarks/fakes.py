@@ -0,0 +1,114 @@
+"""
+In-process stand-ins for the OpenAI, Pinecone and Cohere clients used by the benchmarks.
+
+Every fake client pays `handshake_ms` in its constructor, the TLS handshake a
+newly created client makes on its first request, and is counted in `opened`.
+"""
+import hashlib
+import random
+import time
+from collections import Counter
+from types import SimpleNamespace
+from typing import List
+
+from langchain_core.embeddings import FakeEmbeddings
+from langchain_core.language_models import FakeListChatModel
+
+# Fake clients created so far, by class name.
+opened: Counter = Counter()
+
+
+def connect(client, handshake_ms: float):
+    opened[type(client).__name__] += 1
+    if handshake_ms:
+        time.sleep(handshake_ms / 1000)
+
+
+def clients_opened() -> int:
+    return sum(opened.values())
+
+
+class FakeOpenAIEmbeddings(FakeEmbeddings):
+    """OpenAIEmbeddings double returning random vectors."""
+
+    def __init__(self, handshake_ms: float = 0.0, **kwargs):
+        super().__init__(**kwargs)
+        connect(self, handshake_ms)
+
+
+class FakeChatOpenAI(FakeListChatModel):
+    """ChatOpenAI double answering with the given responses in turn."""
+
+    def __init__(self, handshake_ms: float = 0.0, **kwargs):
+        kwargs.setdefault("responses", [""])
+        super().__init__(**kwargs)
+        connect(self, handshake_ms)
+
+
+class FakeIndex:
+    """Pinecone Index double that returns deterministic matches."""
+
+    def __init__(
+        self,
+        name: str,
+        dimension: int = 3072,
+        latency_ms: float = 0.0,
+        handshake_ms: float = 0.0,
+    ):
+        self.name = name
+        self.dimension = dimension
+        self.latency_ms = latency_ms
+        self.queries = 0
+        connect(self, handshake_ms)
+
+    def query(self, vector=None, top_k=10, include_metadata=True, namespace=None, filter=None, **kwargs):
+        self.queries += 1
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000)
+        seed = int(hashlib.md5(str(vector[:4]).encode()).hexdigest()[:8], 16)
+        rng = random.Random(seed)
+        matches = []
+        for rank in range(top_k):
+            chunk_id = f"{namespace or 'default'}-{rng.randint(0, 5 * top_k)}"
+            matches.append(
+                {
+                    "id": chunk_id,
+                    "score": round(0.9 - rank * 0.01, 4),
+                    "metadata": {
+                        "text": f"chunk {chunk_id} of {self.name}",
+                        "source": f"{chunk_id}.txt",
+                        "source_link": f"https://chat.adaletgpt.com/dataset/legal_case_data?case_id={chunk_id}&type=txt",
+                    },
+                }
+            )
+        return {"matches": matches, "namespace": namespace or ""}
+
+
+class FakePineconeClient:
+    """Pinecone client double. Every index it opens is a new client with its own handshake."""
+
+    def __init__(self, handshake_ms: float = 0.0, latency_ms: float = 0.0):
+        self.handshake_ms = handshake_ms
+        self.latency_ms = latency_ms
+
+    def Index(self, name: str = "", **kwargs):
+        return FakeIndex(name, latency_ms=self.latency_ms, handshake_ms=self.handshake_ms)
+
+
+class FakeCohereClient:
+    """Cohere client double that scores documents by their position."""
+
+    def __init__(self, latency_ms: float = 0.0, handshake_ms: float = 0.0):
+        self.latency_ms = latency_ms
+        self.calls = 0
+        connect(self, handshake_ms)
+
+    def rerank(self, query: str, documents: List[str], top_n: int = 3, **kwargs):
+        self.calls += 1
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000)
+        results = [
+            SimpleNamespace(index=i, relevance_score=1.0 / (i + 1))
+            for i in range(min(top_n or len(documents), len(documents)))
+        ]
+        return SimpleNamespace(results=results)
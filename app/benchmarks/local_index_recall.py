@@ -0,0 +1,126 @@
+"""
+Recall and latency of the local IVF index against a reference search.
+
+With --queries, every line of the file is a held-out question: it is embedded
+with text-embedding-3-large and searched both in Pinecone and in the local export
+of the same index (python -m ingestion.build_local_index). Recall@k is the share
+of Pinecone's top-k ids that the local index also returns.
+
+With --synthetic N, nothing leaves the process: N clustered random vectors are
+indexed in a temporary directory and compared with exact brute-force search.
+
+Run from the app directory:
+    python -m benchmarks.local_index_recall --index adaletgpt-legalcase-data-v1 --namespace YARGITAY --queries held_out.txt
+    python -m benchmarks.local_index_recall --synthetic 100000 --quantization int8
+"""
+import argparse
+import statistics
+import tempfile
+import time
+
+import numpy as np
+
+from core.config import settings
+from core.local_index import LocalVectorIndex, local_index_path
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, (time.perf_counter() - start) * 1000
+
+
+def report(name, samples):
+    samples = sorted(samples)
+    p99 = samples[min(len(samples) - 1, int(len(samples) * 0.99))]
+    print(f"{name:<10} p50={statistics.median(samples):8.3f}ms p99={p99:8.3f}ms")
+
+
+def compare(queries, reference, local, k):
+    recalls, reference_ms, local_ms = [], [], []
+    for vector in queries:
+        expected, elapsed = timed(lambda: reference(vector))
+        reference_ms.append(elapsed)
+        found, elapsed = timed(lambda: local(vector))
+        local_ms.append(elapsed)
+        recalls.append(len(set(expected[:k]) & set(found[:k])) / max(1, len(expected[:k])))
+    print(f"recall@{k}={statistics.mean(recalls):.4f} over {len(queries)} queries")
+    report("reference", reference_ms)
+    report("local", local_ms)
+
+
+def run_live(args):
+    from pinecone import Pinecone
+    from langchain_openai import OpenAIEmbeddings
+
+    with open(args.queries, encoding="utf-8") as file:
+        questions = [line.strip() for line in file if line.strip()]
+    vectors = OpenAIEmbeddings(model="text-embedding-3-large").embed_documents(questions)
+    remote = Pinecone(api_key=settings.PINECONE_API_KEY).Index(args.index)
+    local = LocalVectorIndex.load(
+        local_index_path(settings.LOCAL_INDEX_DIR, args.index), nprobe=args.nprobe
+    )
+    if local is None:
+        raise SystemExit("Build the local index first: python -m ingestion.build_local_index")
+
+    def search(index, vector):
+        results = index.query(vector=vector, top_k=args.k, include_metadata=False, namespace=args.namespace)
+        return [match["id"] for match in results["matches"]]
+
+    compare(vectors, lambda v: search(remote, v), lambda v: search(local, v), args.k)
+
+
+def run_synthetic(args):
+    rng = np.random.default_rng(0)
+    centers = rng.normal(size=(256, args.dimension)).astype(np.float32)
+    labels = rng.integers(0, len(centers), args.synthetic)
+    vectors = centers[labels] + 0.5 * rng.normal(size=(args.synthetic, args.dimension)).astype(np.float32)
+    namespaces = ["YARGITAY", "DANISTAY"]
+    records = (
+        (namespaces[i % 2], str(i), vectors[i], {"text": str(i)}) for i in range(args.synthetic)
+    )
+    normalized = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    queries = normalized[rng.choice(args.synthetic, args.query_count, replace=False)]
+    queries = queries + 0.05 * rng.normal(size=queries.shape).astype(np.float32)
+    in_namespace = np.arange(args.synthetic) % 2 == 0
+
+    def exact(vector):
+        scores = normalized @ (vector / np.linalg.norm(vector))
+        scores[~in_namespace] = -np.inf
+        return [str(i) for i in np.argsort(scores)[::-1][: args.k]]
+
+    with tempfile.TemporaryDirectory() as directory:
+        _, build_ms = timed(
+            lambda: LocalVectorIndex.build(directory, records, quantization=args.quantization)
+        )
+        local = LocalVectorIndex(directory, nprobe=args.nprobe)
+        print(f"built {len(local)} vectors in {len(local.centroids)} lists in {build_ms:.0f}ms")
+
+        def search(vector):
+            return [local.ids[row] for row, _ in local.search(vector, args.k, "YARGITAY")]
+
+        compare(queries, exact, search, args.k)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--index", default=settings.LEGAL_CASE_INDEX_NAME)
+    parser.add_argument("--namespace", default=None)
+    parser.add_argument("--queries", default=None)
+    parser.add_argument("--synthetic", type=int, default=0)
+    parser.add_argument("--dimension", type=int, default=256)
+    parser.add_argument("--query-count", type=int, default=200)
+    parser.add_argument("--quantization", choices=["float32", "int8"], default="float32")
+    parser.add_argument("--nprobe", type=int, default=settings.LOCAL_INDEX_NPROBE)
+    parser.add_argument("--k", type=int, default=50)
+    args = parser.parse_args()
+    if args.synthetic:
+        run_synthetic(args)
+    elif args.queries:
+        run_live(args)
+    else:
+        parser.error("pass --queries FILE or --synthetic N")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Latency of generate_question for attached PDFs, single call vs map-reduce.
+
+The LLMs are simulated with a latency model (time to first token, prefill per
+input token, decode per output token) fitted to the OpenAI models in use; the
+map step runs through core.condense.amap_condense exactly as agenerate_question
+does. Inputs over --context tokens cannot be sent as a single call at all.
+
+Run from the app directory:
+    python -m benchmarks.pdf_condensation --sizes 2000 8000 32000 100000
+"""
+import argparse
+import asyncio
+import time
+
+from langchain_core.runnables import RunnableLambda
+
+from core.condense import amap_condense
+from core.text import count_tokens
+
+PARAGRAPH = (
+    "Davacı vekili, müvekkilinin 01.03.2019 tarihli kira sözleşmesi ile kiracı olduğu "
+    "taşınmazın aylık kira bedelinin 4.500 TL olarak belirlendiğini, davalının Türk "
+    "Borçlar Kanunu'nun 344. maddesine aykırı olarak artış talep ettiğini ileri sürmüştür."
+)
+
+# (time to first token ms, prefill ms per input token, decode ms per output token)
+MAIN_MODEL = (400, 0.04, 15)
+MAP_MODEL = (300, 0.015, 6)
+
+
+def simulated_llm(model, output_tokens, scale):
+    ttft, prefill, decode = model
+
+    async def call(inputs):
+        text = inputs["chunk"] if "chunk" in inputs else inputs["pdf_contents"]
+        tokens = count_tokens(text)
+        output = min(output_tokens, tokens)
+        await asyncio.sleep(scale * (ttft + tokens * prefill + output * decode) / 1000)
+        words = text.split()
+        return " ".join(words[: max(1, len(words) * output // max(tokens, 1))])
+
+    return RunnableLambda(lambda inputs: inputs, afunc=call)
+
+
+async def generate(text, args, map_reduce):
+    question = simulated_llm(MAIN_MODEL, 120, args.scale)
+    if map_reduce:
+        text = await amap_condense(
+            text,
+            simulated_llm(MAP_MODEL, args.map_output, args.scale),
+            max_tokens=args.threshold,
+            chunk_tokens=args.chunk_tokens,
+            max_concurrency=args.concurrency,
+        )
+    await question.ainvoke({"pdf_contents": text})
+    return count_tokens(text)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[2000, 8000, 32000, 100000])
+    parser.add_argument("--threshold", type=int, default=24000)
+    parser.add_argument("--chunk-tokens", type=int, default=3000)
+    parser.add_argument("--map-output", type=int, default=300)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--context", type=int, default=128000)
+    parser.add_argument(
+        "--scale", type=float, default=0.1, help="fraction of the modelled latency actually slept"
+    )
+    args = parser.parse_args()
+
+    paragraph_tokens = count_tokens(PARAGRAPH)
+    print(f"{'tokens':>8} {'single':>10} {'map-reduce':>11} {'prompt tokens':>14}")
+    for size in args.sizes:
+        text = "\n\n".join([PARAGRAPH] * max(1, size // paragraph_tokens))
+        timings = []
+        for map_reduce in (False, True):
+            start = time.perf_counter()
+            prompt_tokens = asyncio.run(generate(text, args, map_reduce))
+            timings.append((time.perf_counter() - start) * 1000 / args.scale)
+        single = "n/a" if count_tokens(text) > args.context else f"{timings[0]:.0f}ms"
+        print(f"{size:>8} {single:>10} {timings[1]:>9.0f}ms {prompt_tokens:>14}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+Per-request retrieval setup cost, before and after RetrievalRegistry.
+
+"before" rebuilds OpenAIEmbeddings, PineconeVectorStore, CohereRerank,
+MultiQueryRetriever, ContextualCompressionRetriever and a gpt-4o ChatOpenAI for
+every call, the way crud/rag.py used to. "after" looks the same retriever up in
+a registry. OpenAI, Pinecone and Cohere are fakes (benchmarks/fakes.py), so
+nothing leaves the process; --handshake-ms is paid by every fake client when it
+is created, on both paths.
+
+Run from the app directory:
+    python -m benchmarks.registry_setup --iterations 200 --handshake-ms 30
+"""
+import argparse
+import statistics
+import time
+
+import httpx
+from langchain.prompts import PromptTemplate
+from langchain.retrievers.contextual_compression import ContextualCompressionRetriever
+from langchain.retrievers.multi_query import MultiQueryRetriever
+from langchain_cohere import CohereRerank
+from langchain_pinecone import PineconeVectorStore
+
+from benchmarks import fakes
+from benchmarks.fakes import (
+    FakeChatOpenAI,
+    FakeCohereClient,
+    FakeOpenAIEmbeddings,
+    FakePineconeClient,
+)
+from core.config import settings
+from core.prompt import multi_query_prompt_template
+from core.registry import RetrievalRegistry
+
+
+def setup_before(pinecone_client, handshake_ms):
+    embeddings = FakeOpenAIEmbeddings(handshake_ms=handshake_ms, size=3072)
+    docsearch = PineconeVectorStore(
+        index=pinecone_client.Index(settings.INDEX_NAME),
+        embedding=embeddings,
+        namespace="YONETMELIK",
+    )
+    base_retriever = MultiQueryRetriever.from_llm(
+        retriever=docsearch.as_retriever(search_kwargs={"k": 50}),
+        llm=FakeChatOpenAI(handshake_ms=handshake_ms),
+        prompt=PromptTemplate(
+            input_variables=["question"], template=multi_query_prompt_template
+        ),
+    )
+    compressor = CohereRerank(
+        top_n=10, client=FakeCohereClient(handshake_ms=handshake_ms)
+    )
+    return ContextualCompressionRetriever(
+        base_compressor=compressor, base_retriever=base_retriever
+    )
+
+
+def setup_after(registry):
+    return registry.retriever(
+        settings.INDEX_NAME,
+        namespace="YONETMELIK",
+        k=50,
+        top_n=10,
+        multi_query=True,
+        pack=True,
+    )
+
+
+def measure(fn, iterations):
+    """Per-call latencies in ms and the fake clients opened per call."""
+    samples = []
+    opened = fakes.clients_opened()
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples, (fakes.clients_opened() - opened) / iterations
+
+
+def report(name, samples, clients):
+    samples = sorted(samples)
+    p99 = samples[min(len(samples) - 1, int(len(samples) * 0.99))]
+    print(
+        f"{name:<8} mean={statistics.mean(samples):8.3f}ms "
+        f"p50={statistics.median(samples):8.3f}ms p99={p99:8.3f}ms "
+        f"clients_opened/request={clients:.2f}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--handshake-ms", type=float, default=0.0)
+    args = parser.parse_args()
+
+    before_client = FakePineconeClient(handshake_ms=args.handshake_ms)
+    report(
+        "before",
+        *measure(lambda: setup_before(before_client, args.handshake_ms), args.iterations),
+    )
+
+    # The worker's clients are created once at startup, outside of the requests.
+    registry = RetrievalRegistry(
+        embeddings=FakeOpenAIEmbeddings(handshake_ms=args.handshake_ms, size=3072),
+        pinecone_client=FakePineconeClient(handshake_ms=args.handshake_ms),
+        cohere_client=FakeCohereClient(handshake_ms=args.handshake_ms),
+        http_client=httpx.Client(),
+        http_async_client=httpx.AsyncClient(),
+    )
+    report("after", *measure(lambda: setup_after(registry), args.iterations))
+
+
+if __name__ == "__main__":
+    main()
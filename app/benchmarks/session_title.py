@@ -0,0 +1,74 @@
+"""
+Duration of a first-turn answer stream with the session title generated after or alongside the answer.
+
+"after" is the old flow: the title LLM starts from the question and the full
+answer once the answer has streamed. "llm" starts it from the question with the
+answer and interleaves its tokens (core.streaming.merge_streams); "local" sends
+the keyword title of core.title.local_title. LLM latencies are simulated.
+
+Run from the app directory:
+    python -m benchmarks.session_title --answer-tokens 400 --title-ttft-ms 500
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from core.streaming import PrefetchedStream, merge_streams
+from core.title import local_title
+
+QUESTION = "Kiracının tahliye davasında ihtarname süresi nedir?"
+
+
+async def tokens(ttft_ms, count, ms_per_token, scale):
+    await asyncio.sleep(scale * ttft_ms / 1000)
+    for _ in range(count):
+        await asyncio.sleep(scale * ms_per_token / 1000)
+        yield "x "
+
+
+async def local_tokens():
+    yield local_title(QUESTION)
+
+
+async def first_turn(mode, args):
+    answer = tokens(args.answer_ttft_ms, args.answer_tokens, args.ms_per_token, args.scale)
+    if mode == "after":
+        async for _ in answer:
+            pass
+        title = tokens(args.title_ttft_ms, args.title_tokens, args.ms_per_token, args.scale)
+        async for _ in title:
+            pass
+        return
+    if mode == "llm":
+        title = tokens(args.title_ttft_ms, args.title_tokens, args.ms_per_token, args.scale)
+    else:
+        title = local_tokens()
+    async for _ in merge_streams({0: answer, 1: PrefetchedStream(title)}):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--answer-ttft-ms", type=float, default=900)
+    parser.add_argument("--answer-tokens", type=int, default=400)
+    parser.add_argument("--title-ttft-ms", type=float, default=500)
+    parser.add_argument("--title-tokens", type=int, default=12)
+    parser.add_argument("--ms-per-token", type=float, default=12)
+    parser.add_argument("--runs", type=int, default=1)
+    parser.add_argument(
+        "--scale", type=float, default=1.0, help="fraction of the modelled latency actually slept"
+    )
+    args = parser.parse_args()
+
+    for mode in ("after", "llm", "local"):
+        durations = []
+        for _ in range(args.runs):
+            start = time.perf_counter()
+            asyncio.run(first_turn(mode, args))
+            durations.append((time.perf_counter() - start) * 1000 / args.scale)
+        print(f"{mode:<6} stream duration={statistics.median(durations):8.0f}ms")
+
+
+if __name__ == "__main__":
+    main()
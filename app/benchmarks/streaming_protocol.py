@@ -0,0 +1,64 @@
+"""
+Bytes sent and server CPU per streamed answer, cumulative vs delta SSE protocol.
+
+Replays a synthetic answer of --tokens tokens (plus a session title) through
+StreamEncoder and sse_starlette's ServerSentEvent encoding, the way
+rag_streaming_chat and agent_run emit it, and reports the wire bytes and the
+process CPU time spent per answer.
+
+Run from the app directory:
+    python -m benchmarks.streaming_protocol --tokens 3000 --answers 20
+"""
+import argparse
+import random
+import time
+
+from sse_starlette.sse import ServerSentEvent
+
+from core.streaming import CUMULATIVE, DELTA, StreamEncoder
+
+WORDS = (
+    "Yargıtay", "kararında", "kira", "bedelinin", "tespiti", "davasında", "Türk",
+    "Borçlar", "Kanunu'nun", "344.", "maddesi", "uyarınca", "hakkaniyete", "uygun",
+    "şekilde", "belirlenir", "ve", "mahkeme", "emsal", "kira", "bedellerini", "dikkate",
+)
+
+
+def tokens(count, seed=0):
+    rng = random.Random(seed)
+    return [(" " if i else "") + rng.choice(WORDS) for i in range(count)]
+
+
+def stream(protocol, answer_tokens, title_tokens):
+    encoder = StreamEncoder(protocol)
+    payloads = [encoder.text(0, token) for token in answer_tokens]
+    payloads += [encoder.text(1, token) for token in title_tokens]
+    payloads += [encoder.value(2, ""), encoder.value(3, ""), encoder.complete()]
+    return sum(len(ServerSentEvent(data=p).encode()) for p in payloads if p), len(payloads)
+
+
+def measure(protocol, answer_tokens, title_tokens, answers):
+    start = time.process_time()
+    for _ in range(answers):
+        sent, events = stream(protocol, answer_tokens, title_tokens)
+    return sent, events, (time.process_time() - start) * 1000 / answers
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--tokens", type=int, default=3000)
+    parser.add_argument("--title-tokens", type=int, default=12)
+    parser.add_argument("--answers", type=int, default=20)
+    args = parser.parse_args()
+
+    answer_tokens = tokens(args.tokens)
+    title_tokens = tokens(args.title_tokens, seed=1)
+    for name, protocol in (("cumulative", CUMULATIVE), ("delta", DELTA)):
+        sent, events, cpu_ms = measure(protocol, answer_tokens, title_tokens, args.answers)
+        print(
+            f"{name:<10} events={events} bytes/answer={sent:>11,} cpu/answer={cpu_ms:8.2f}ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Prompt tokens of the agent's second function-calling round, before and after tool output compaction.
+
+"before" is what rag_legal_tool used to return: the reranked Documents, which
+format_to_openai_function_messages turns into their repr with all metadata.
+"after" is core.snippets.compact_documents over the same documents. The round's prompt is the agent system prompt, the
+question and the function message; the chat history is left out.
+
+Run from the app directory:
+    python -m benchmarks.tool_output --turns 50 --budget 1500
+"""
+import argparse
+import random
+import statistics
+
+from langchain.agents.format_scratchpad.openai_functions import (
+    format_to_openai_function_messages,
+)
+from langchain_core.agents import AgentActionMessageLog
+from langchain_core.documents import Document
+
+from benchmarks.context_packing import SENTENCES
+from core.config import settings
+from core.prompt import main_agent_prompt
+from core.snippets import compact_documents
+from core.text import count_tokens
+
+QUESTIONS = (
+    "kira bedelinin tespiti emsal bedel",
+    "hakkaniyete uygun bedel 344. madde",
+    "istinaf başvurusu fahiş bedel",
+)
+
+
+def decisions(rng, count):
+    documents = []
+    for number in range(count):
+        text = " ".join(
+            rng.choice(SENTENCES) + f" ({i})" for i in range(rng.randint(40, 160))
+        )
+        documents.append(
+            Document(
+                page_content=text,
+                metadata={
+                    "source": f"karar-{number}.txt",
+                    "source_link": f"https://karararama.yargitay.gov.tr/{number}",
+                    "id": f"{number:032x}",
+                    "score": rng.random(),
+                    "relevance_score": 1 - number / count,
+                },
+            )
+        )
+    return documents
+
+
+def round_tokens(question, observation):
+    action = AgentActionMessageLog(
+        tool="rag_legal", tool_input={"question": question}, log="", message_log=[]
+    )
+    (message,) = format_to_openai_function_messages([(action, observation)])
+    return count_tokens(main_agent_prompt) + count_tokens(question) + count_tokens(message.content)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--turns", type=int, default=50)
+    parser.add_argument("--top-n", type=int, default=6)
+    parser.add_argument("--budget", type=int, default=settings.LEGAL_TOOL_MAX_TOKENS)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    results = {"before": [], "after": []}
+    for _ in range(args.turns):
+        question = rng.choice(QUESTIONS)
+        documents = decisions(rng, args.top_n)
+        results["before"].append(round_tokens(question, documents))
+        results["after"].append(
+            round_tokens(question, compact_documents(documents, question, args.budget))
+        )
+
+    for name, tokens in results.items():
+        print(
+            f"{name:<8} prompt tokens/turn mean={statistics.mean(tokens):8.0f} "
+            f"max={max(tokens):6d}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+import math
+import os
+import pickle
+from array import array
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+from core.text import tokenize
+from log_config import configure_logging
+
+# Configure logging
+logger = configure_logging(__name__)
+
+
+class BM25Index:
+    """
+    In-process Okapi BM25 index over Pinecone chunks.
+
+    Postings are stored as one contiguous uint32 doc-id array and one uint16
+    term-frequency array, with per-term offsets, so the whole index is a handful
+    of NumPy arrays. Documents keep their Pinecone vector id so lexical hits can be
+    fused with dense hits by id.
+    """
+
+    def __init__(
+        self,
+        terms: Dict[str, int],
+        offsets: np.ndarray,
+        doc_ids: np.ndarray,
+        tfs: np.ndarray,
+        doc_lengths: np.ndarray,
+        documents: List[Tuple[str, str, dict]],
+        k1: float = 1.2,
+        b: float = 0.75,
+    ):
+        self.terms = terms
+        self.offsets = offsets
+        self.doc_ids = doc_ids
+        self.tfs = tfs
+        self.doc_lengths = doc_lengths
+        self.documents = documents
+        self.k1 = k1
+        self.b = b
+        self.avg_doc_length = float(doc_lengths.mean()) if len(doc_lengths) else 0.0
+        self.avg_doc_length = self.avg_doc_length or 1.0
+
+    @classmethod
+    def build(cls, records: Iterable[Tuple[str, str, dict]], **kwargs) -> "BM25Index":
+        """Build from (vector_id, text, metadata) records."""
+        postings: Dict[str, Tuple[array, array]] = defaultdict(
+            lambda: (array("I"), array("H"))
+        )
+        documents = []
+        doc_lengths = array("I")
+        for doc_index, (vector_id, text, metadata) in enumerate(records):
+            tokens = tokenize(text)
+            for term, tf in Counter(tokens).items():
+                ids, freqs = postings[term]
+                ids.append(doc_index)
+                freqs.append(min(tf, 65535))
+            doc_lengths.append(len(tokens))
+            documents.append((vector_id, text, metadata))
+
+        terms = {}
+        offsets = np.zeros(len(postings) + 1, dtype=np.uint64)
+        for term_id, term in enumerate(sorted(postings)):
+            terms[term] = term_id
+            offsets[term_id + 1] = offsets[term_id] + len(postings[term][0])
+        doc_ids = np.empty(int(offsets[-1]), dtype=np.uint32)
+        tfs = np.empty(int(offsets[-1]), dtype=np.uint16)
+        for term, term_id in terms.items():
+            start, end = int(offsets[term_id]), int(offsets[term_id + 1])
+            doc_ids[start:end] = np.frombuffer(postings[term][0], dtype=np.uint32)
+            tfs[start:end] = np.frombuffer(postings[term][1], dtype=np.uint16)
+
+        return cls(
+            terms,
+            offsets,
+            doc_ids,
+            tfs,
+            np.frombuffer(doc_lengths, dtype=np.uint32).copy(),
+            documents,
+            **kwargs,
+        )
+
+    def __len__(self) -> int:
+        return len(self.documents)
+
+    def search(self, query: str, k: int = 20) -> List[Tuple[int, float]]:
+        """Return up to k (document index, BM25 score) pairs, best first."""
+        n_docs = len(self.documents)
+        if n_docs == 0:
+            return []
+        scores = np.zeros(n_docs, dtype=np.float32)
+        norm = self.k1 * (1 - self.b + self.b * self.doc_lengths / self.avg_doc_length)
+        for term in set(tokenize(query)):
+            term_id = self.terms.get(term)
+            if term_id is None:
+                continue
+            start, end = int(self.offsets[term_id]), int(self.offsets[term_id + 1])
+            ids = self.doc_ids[start:end]
+            tf = self.tfs[start:end].astype(np.float32)
+            df = end - start
+            idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+            scores[ids] += idf * tf * (self.k1 + 1) / (tf + norm[ids])
+
+        candidates = np.flatnonzero(scores)
+        if len(candidates) > k:
+            candidates = candidates[np.argpartition(scores[candidates], -k)[-k:]]
+        ranked = candidates[np.argsort(scores[candidates])[::-1]]
+        return [(int(i), float(scores[i])) for i in ranked]
+
+    def get_documents(self, query: str, k: int = 20) -> List[Document]:
+        docs = []
+        for doc_index, score in self.search(query, k):
+            vector_id, text, metadata = self.documents[doc_index]
+            docs.append(
+                Document(
+                    page_content=text,
+                    metadata={**metadata, "id": vector_id, "bm25_score": score},
+                )
+            )
+        return docs
+
+    def save(self, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "wb") as file:
+            pickle.dump(
+                {
+                    "terms": self.terms,
+                    "offsets": self.offsets,
+                    "doc_ids": self.doc_ids,
+                    "tfs": self.tfs,
+                    "doc_lengths": self.doc_lengths,
+                    "documents": self.documents,
+                    "k1": self.k1,
+                    "b": self.b,
+                },
+                file,
+                protocol=pickle.HIGHEST_PROTOCOL,
+            )
+
+    @classmethod
+    def load(cls, path: str) -> Optional["BM25Index"]:
+        """Load an index written by `save`, or None if the file does not exist."""
+        if not os.path.exists(path):
+            logger.warning(f"BM25 index not found: {path}")
+            return None
+        with open(path, "rb") as file:
+            data = pickle.load(file)
+        logger.info(f"Loaded BM25 index {path} with {len(data['documents'])} documents")
+        return cls(**data)
+
+
+def bm25_index_path(directory: str, index_name: str, namespace: Optional[str]) -> str:
+    return os.path.join(directory, f"{index_name}-{namespace or 'default'}.bm25.pkl")
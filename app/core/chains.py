@@ -0,0 +1,193 @@
+import asyncio
+import contextvars
+import time
+from concurrent.futures import Future
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from langchain.chains import ConversationalRetrievalChain
+from langchain.chains.conversational_retrieval.base import _get_chat_history
+from langchain_core.callbacks import (
+    AsyncCallbackManagerForChainRun,
+    CallbackManagerForChainRun,
+)
+from langchain_core.documents import Document
+
+from core.executor import speculation_executor
+from core.metrics import metrics
+from core.text import normalize_text
+from log_config import configure_logging
+
+# Configure logging
+logger = configure_logging(__name__)
+
+# Speculative retrieval of the running chain call: (raw question, started at, task or future).
+_speculation: contextvars.ContextVar = contextvars.ContextVar("speculation", default=None)
+
+
+class SpeculativeConversationalRetrievalChain(ConversationalRetrievalChain):
+    """
+    ConversationalRetrievalChain that retrieves for the raw question while the
+    question LLM condenses it with the chat history.
+
+    When the condensed question comes back, the speculative documents are used if
+    its embedding is at least `similarity_threshold` similar to the raw question;
+    otherwise a second retrieval runs for the condensed question. Stage timings are
+    recorded under `pipeline.condense_ms`, `pipeline.retrieval_ms` and
+    `pipeline.overlap_ms` (time saved by running both at once), hits and misses
+    under `pipeline.speculative_hits` / `pipeline.speculative_misses`.
+
+    A miss that comes after the speculative retrieval started has paid Pinecone
+    and Cohere for nothing; those are counted under
+    `pipeline.speculative_wasted_retrievals` with the time they ran under
+    `pipeline.speculative_wasted_ms`. The sync path runs the speculative
+    retrieval on its own small pool, not the blocking executor: the caller waits
+    on it and may itself be a blocking executor thread.
+    """
+
+    embeddings: Any
+    similarity_threshold: float = 0.9
+
+    def _has_history(self, inputs: Dict[str, Any]) -> bool:
+        get_chat_history = self.get_chat_history or _get_chat_history
+        return bool(get_chat_history(inputs["chat_history"]))
+
+    @staticmethod
+    def _cosine(a: np.ndarray, b: np.ndarray) -> float:
+        norm = float(np.linalg.norm(a) * np.linalg.norm(b))
+        return float(a @ b) / norm if norm else 0.0
+
+    def _record(self, hit: bool, similarity: float, condense_ms: float, retrieval_ms: float):
+        metrics.incr("pipeline.speculative_hits" if hit else "pipeline.speculative_misses")
+        metrics.observe("pipeline.condense_ms", condense_ms)
+        metrics.observe("pipeline.retrieval_ms", retrieval_ms)
+        metrics.observe("pipeline.overlap_ms", min(condense_ms, retrieval_ms) if hit else 0.0)
+        logger.info(
+            f"Speculative retrieval {'hit' if hit else 'miss'} (similarity {similarity:.3f}): "
+            f"condense {condense_ms:.0f}ms, retrieval {retrieval_ms:.0f}ms"
+        )
+
+    @staticmethod
+    def _record_waste(wasted_ms: float):
+        metrics.incr("pipeline.speculative_wasted_retrievals")
+        metrics.observe("pipeline.speculative_wasted_ms", wasted_ms)
+
+    def _discard(self, speculative: Future, started: float):
+        """Drop the speculative retrieval of a miss, recording the work already paid for."""
+        if speculative.cancel():
+            return
+        if not speculative.done():
+            # A running thread cannot be stopped; it is recorded once it finishes.
+            speculative.add_done_callback(lambda future: self._discard(future, started))
+            return
+        if speculative.exception() is None:
+            self._record_waste(speculative.result()[1])
+        else:
+            self._record_waste((time.perf_counter() - started) * 1000)
+
+    def _timed_retrieval(self, question: str, run_manager) -> Any:
+        start = time.perf_counter()
+        docs = self.retriever.invoke(question, config={"callbacks": run_manager.get_child()})
+        return docs, (time.perf_counter() - start) * 1000
+
+    async def _atimed_retrieval(self, question: str, run_manager) -> Any:
+        start = time.perf_counter()
+        docs = await self.retriever.ainvoke(
+            question, config={"callbacks": run_manager.get_child()}
+        )
+        return docs, (time.perf_counter() - start) * 1000
+
+    async def _acall(
+        self,
+        inputs: Dict[str, Any],
+        run_manager: Optional[AsyncCallbackManagerForChainRun] = None,
+    ) -> Dict[str, Any]:
+        if not self._has_history(inputs):
+            return await super()._acall(inputs, run_manager=run_manager)
+        _run_manager = run_manager or AsyncCallbackManagerForChainRun.get_noop_manager()
+        task = asyncio.create_task(self._atimed_retrieval(inputs["question"], _run_manager))
+        token = _speculation.set((inputs["question"], time.perf_counter(), task))
+        try:
+            return await super()._acall(inputs, run_manager=run_manager)
+        finally:
+            _speculation.reset(token)
+            if not task.done():
+                task.cancel()
+
+    async def _aget_docs(
+        self,
+        question: str,
+        inputs: Dict[str, Any],
+        *,
+        run_manager: AsyncCallbackManagerForChainRun,
+    ) -> List[Document]:
+        speculation = _speculation.get()
+        if speculation is None:
+            return await super()._aget_docs(question, inputs, run_manager=run_manager)
+        raw_question, started, task = speculation
+        condense_ms = (time.perf_counter() - started) * 1000
+        similarity = 1.0
+        if normalize_text(question) != normalize_text(raw_question):
+            raw_vector, new_vector = await asyncio.gather(
+                self.embeddings.aembed_query_array(raw_question),
+                self.embeddings.aembed_query_array(question),
+            )
+            similarity = self._cosine(raw_vector, new_vector)
+        if similarity >= self.similarity_threshold:
+            docs, retrieval_ms = await task
+            self._record(True, similarity, condense_ms, retrieval_ms)
+        else:
+            if task.done() and not task.cancelled() and task.exception() is None:
+                self._record_waste(task.result()[1])
+            else:
+                # Requests already sent to Pinecone and Cohere are paid for even if cancelled.
+                task.cancel()
+                self._record_waste(condense_ms)
+            docs, retrieval_ms = await self._atimed_retrieval(question, run_manager)
+            self._record(False, similarity, condense_ms, retrieval_ms)
+        return self._reduce_tokens_below_limit(docs)
+
+    def _call(
+        self,
+        inputs: Dict[str, Any],
+        run_manager: Optional[CallbackManagerForChainRun] = None,
+    ) -> Dict[str, Any]:
+        if not self._has_history(inputs):
+            return super()._call(inputs, run_manager=run_manager)
+        _run_manager = run_manager or CallbackManagerForChainRun.get_noop_manager()
+        future = speculation_executor.submit(
+            self._timed_retrieval, inputs["question"], _run_manager
+        )
+        token = _speculation.set((inputs["question"], time.perf_counter(), future))
+        try:
+            return super()._call(inputs, run_manager=run_manager)
+        finally:
+            _speculation.reset(token)
+            future.cancel()
+
+    def _get_docs(
+        self,
+        question: str,
+        inputs: Dict[str, Any],
+        *,
+        run_manager: CallbackManagerForChainRun,
+    ) -> List[Document]:
+        speculation = _speculation.get()
+        if speculation is None:
+            return super()._get_docs(question, inputs, run_manager=run_manager)
+        raw_question, started, future = speculation
+        condense_ms = (time.perf_counter() - started) * 1000
+        similarity = 1.0
+        if normalize_text(question) != normalize_text(raw_question):
+            similarity = self._cosine(
+                self.embeddings.embed_query_array(raw_question),
+                self.embeddings.embed_query_array(question),
+            )
+        if similarity >= self.similarity_threshold:
+            docs, retrieval_ms = future.result()
+            self._record(True, similarity, condense_ms, retrieval_ms)
+        else:
+            self._discard(future, started)
+            docs, retrieval_ms = self._timed_retrieval(question, run_manager)
+            self._record(False, similarity, condense_ms, retrieval_ms)
+        return self._reduce_tokens_below_limit(docs)
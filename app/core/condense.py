@@ -0,0 +1,86 @@
+import time
+from typing import List
+
+from langchain_core.runnables import Runnable
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from core.metrics import metrics
+from core.text import count_tokens
+from log_config import configure_logging
+
+# Configure logging
+logger = configure_logging(__name__)
+
+
+def split_by_tokens(text: str, chunk_tokens: int) -> List[str]:
+    """Split on paragraph, line and sentence boundaries into chunks of at most `chunk_tokens`."""
+    splitter = RecursiveCharacterTextSplitter(
+        chunk_size=chunk_tokens,
+        chunk_overlap=0,
+        length_function=count_tokens,
+        separators=["\n\n", "\n", ". ", " ", ""],
+    )
+    return splitter.split_text(text)
+
+
+def _record(tokens_in: int, tokens_out: int, chunks: int, start: float):
+    metrics.incr("condense.chunks", chunks)
+    metrics.incr("condense.tokens_in", tokens_in)
+    metrics.incr("condense.tokens_out", tokens_out)
+    metrics.observe("condense.map_ms", (time.perf_counter() - start) * 1000)
+    logger.info(f"Condensed {chunks} chunks: {tokens_in} -> {tokens_out} tokens")
+
+
+async def amap_condense(
+    text: str,
+    map_chain: Runnable,
+    max_tokens: int,
+    chunk_tokens: int,
+    max_concurrency: int = 4,
+    max_rounds: int = 3,
+) -> str:
+    """
+    Shrink `text` below `max_tokens` by condensing token-bounded chunks with
+    `map_chain` ({"chunk": ...} -> str), at most `max_concurrency` at a time.
+
+    The condensed chunks are joined in document order; if the result is still
+    over `max_tokens` it is condensed again, up to `max_rounds` times. Text that
+    already fits is returned unchanged.
+    """
+    for _ in range(max_rounds):
+        tokens_in = count_tokens(text)
+        if tokens_in <= max_tokens:
+            break
+        start = time.perf_counter()
+        chunks = split_by_tokens(text, chunk_tokens)
+        parts = await map_chain.abatch(
+            [{"chunk": chunk} for chunk in chunks],
+            config={"max_concurrency": max_concurrency},
+        )
+        text = "\n\n".join(parts)
+        _record(tokens_in, count_tokens(text), len(chunks), start)
+    return text
+
+
+def map_condense(
+    text: str,
+    map_chain: Runnable,
+    max_tokens: int,
+    chunk_tokens: int,
+    max_concurrency: int = 4,
+    max_rounds: int = 3,
+) -> str:
+    """Synchronous `amap_condense`; chunks are condensed on a thread pool."""
+    for _ in range(max_rounds):
+        tokens_in = count_tokens(text)
+        if tokens_in <= max_tokens:
+            break
+        start = time.perf_counter()
+        chunks = split_by_tokens(text, chunk_tokens)
+        parts = map_chain.batch(
+            [{"chunk": chunk} for chunk in chunks],
+            config={"max_concurrency": max_concurrency},
+        )
+        text = "\n\n".join(parts)
+        _record(tokens_in, count_tokens(text), len(chunks), start)
+    return text
@@ -42,6 +42,73 @@ class Settings(BaseSettings):
     IYZIPAY_BASE_URL:str
     VERIFICATION_URL:str
     DOWNLOAD_URL:str
+    HTTP_POOL_MAX_CONNECTIONS: int = 100
+    HTTP_POOL_MAX_KEEPALIVE: int = 20
+    RETRIEVAL_WARMUP: bool = True
+    MULTI_QUERY_MAX_CONCURRENCY: int = 4
+    EMBEDDING_CACHE_SIZE: int = 4096
+    EMBEDDING_CACHE_TTL_SECONDS: int = 86400
+    REGULATION_INDEX_VERSION: str = "1"
+    # Off by default: a near-duplicate question can differ in the article or
+    # regulation it asks about; enable once the threshold is tuned on real traffic.
+    SEMANTIC_CACHE_ENABLED: bool = False
+    SEMANTIC_CACHE_THRESHOLD: float = 0.95
+    SEMANTIC_CACHE_SIZE: int = 10000
+    SEMANTIC_CACHE_TTL_SECONDS: int = 86400
+    RERANK_CACHE_SIZE: int = 10000
+    RERANK_CACHE_TTL_SECONDS: int = 86400
+    RERANK_ADAPTIVE_POOL: bool = True
+    RERANK_MIN_SCORE: float = 0.2
+    RERANK_KNEE_GAP: float = 0.05
+    RERANK_MIN_CANDIDATES: int = 20
+    RERANK_MAX_TOKENS: int = 512
+    BM25_INDEX_DIR: str = "bm25"
+    BM25_TOP_K: int = 20
+    LEGAL_SOURCE_MULTI_QUERY: bool = False
+    VECTOR_BACKEND: str = "pinecone"
+    LOCAL_INDEX_DIR: str = "vectors"
+    LOCAL_INDEX_NPROBE: int = 16
+    CLASSIFIER_CONFIDENCE: float = 0.8
+    LEGAL_NAMESPACE_MODE: str = "classify"
+    STREAM_COALESCE_WINDOW_MS: int = 30
+    STREAM_COALESCE_MAX_BYTES: int = 512
+    STREAM_RESUME_ENABLED: bool = True
+    # With resume, a disconnect cancels the answer only after this grace period.
+    STREAM_RESUME_GRACE_SECONDS: int = 15
+    STREAM_BUFFER_MAX_BYTES: int = 262144
+    STREAM_BUFFER_MAX_STREAMS: int = 1000
+    STREAM_BUFFER_TTL_SECONDS: int = 600
+    SPECULATIVE_RETRIEVAL: bool = True
+    SPECULATIVE_SIMILARITY_THRESHOLD: float = 0.9
+    BLOCKING_EXECUTOR_MAX_WORKERS: int = 16
+    SPECULATION_EXECUTOR_MAX_WORKERS: int = 4
+    CONTEXT_PACKING: bool = True
+    CONTEXT_MAX_TOKENS: int = 3000
+    CONTEXT_MIN_OVERLAP_CHARS: int = 40
+    LEGAL_CASES_PRECOMPUTE: bool = False
+    LEGAL_CASES_CACHE_SIZE: int = 10000
+    LEGAL_CASES_CACHE_TTL_SECONDS: int = 3600
+    PDF_MAP_REDUCE_THRESHOLD_TOKENS: int = 24000
+    PDF_CHUNK_TOKENS: int = 3000
+    PDF_MAP_MODEL_NAME: str = "gpt-4o-mini"
+    PDF_MAP_MAX_CONCURRENCY: int = 8
+    CREATIVITY_CONFIDENCE: float = 0.8
+    CREATIVITY_CACHE_SIZE: int = 10000
+    CREATIVITY_CACHE_TTL_SECONDS: int = 86400
+    TOOL_CACHE_ENABLED: bool = True
+    TOOL_CACHE_SIZE: int = 2048
+    TOOL_CACHE_TTL_SECONDS: int = 1800
+    TOOL_OUTPUT_COMPACTION: bool = True
+    LEGAL_TOOL_MAX_TOKENS: int = 1500
+    REGULATION_TOOL_MAX_TOKENS: int = 1000
+    # "llm": stream an LLM title generated from the question alongside the answer.
+    # "local": keyword title only. "local_refine": keyword title at once, replaced
+    # by the LLM title in the database in the background.
+    SESSION_TITLE_MODE: str = "llm"
+    SESSION_TITLE_MODEL_NAME: str = "gpt-4o-mini"
+    CLASSIFIER_WEIGHTS_PATH: str = "classifier.json"
+    CLASSIFIER_CACHE_SIZE: int = 10000
+    CLASSIFIER_CACHE_TTL_SECONDS: int = 86400
     class Config:
         env_file = ".env"
 
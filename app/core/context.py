@@ -0,0 +1,170 @@
+from typing import Dict, List, Optional, Sequence
+
+from langchain_core.callbacks import Callbacks
+from langchain_core.documents import Document
+from langchain_core.documents.compressor import BaseDocumentCompressor
+
+from core.metrics import metrics
+from core.rerank import document_id
+from core.text import count_tokens, truncate_tokens
+from log_config import configure_logging
+
+# Configure logging
+logger = configure_logging(__name__)
+
+
+def merge_overlapping(first: str, second: str, min_overlap: int = 40) -> Optional[str]:
+    """
+    Join two chunks of the same text when one contains the other or they overlap
+    by at least `min_overlap` characters (in either order), None otherwise.
+    """
+    if second in first:
+        return first
+    if first in second:
+        return second
+    for head, tail in ((first, second), (second, first)):
+        probe = tail[:min_overlap]
+        if len(probe) < min_overlap:
+            continue
+        position = head.find(probe)
+        while position != -1:
+            if tail.startswith(head[position:]):
+                return head + tail[len(head) - position :]
+            position = head.find(probe, position + 1)
+    return None
+
+
+def _source(doc: Document) -> str:
+    return doc.metadata.get("source_link") or doc.metadata.get("source") or document_id(doc)
+
+
+def _score(doc: Document) -> float:
+    score = doc.metadata.get("relevance_score", doc.metadata.get("score"))
+    return float(score) if score is not None else 0.0
+
+
+def merge_chunks(documents: Sequence[Document], min_overlap: int = 40) -> List[Document]:
+    """
+    Merge overlapping chunks of the same `source_link` (or `source`) into one span.
+
+    A span keeps the metadata of its best chunk, the best score of its chunks and
+    the number of chunks it was built from as `merged_chunks`. Spans are returned
+    best first; ties keep the input (rerank) order.
+    """
+    groups: Dict[str, List[Dict]] = {}
+    order = 0
+    for doc in documents:
+        spans = groups.setdefault(_source(doc), [])
+        span = {
+            "text": doc.page_content,
+            "score": _score(doc),
+            "order": order,
+            "metadata": doc.metadata,
+            "chunks": 1,
+        }
+        order += 1
+        # A new chunk can bridge two spans, so keep merging until nothing overlaps.
+        merged = True
+        while merged:
+            merged = False
+            for other in spans:
+                text = merge_overlapping(other["text"], span["text"], min_overlap)
+                if text is None:
+                    continue
+                spans.remove(other)
+                best = min(other, span, key=lambda s: (-s["score"], s["order"]))
+                span = {
+                    "text": text,
+                    "score": best["score"],
+                    "order": best["order"],
+                    "metadata": best["metadata"],
+                    "chunks": other["chunks"] + span["chunks"],
+                }
+                merged = True
+                break
+        spans.append(span)
+
+    spans = sorted(
+        (span for spans in groups.values() for span in spans),
+        key=lambda span: (-span["score"], span["order"]),
+    )
+    return [
+        Document(
+            page_content=span["text"],
+            metadata={**span["metadata"], "merged_chunks": span["chunks"]},
+        )
+        for span in spans
+    ]
+
+
+def pack_documents(
+    documents: Sequence[Document], max_tokens: int, min_overlap: int = 40
+) -> List[Document]:
+    """
+    Context for the stuff-documents prompt: overlapping chunks of a source are
+    merged, then spans are added best first while they fit in `max_tokens`
+    (cl100k tokens). A span that does not fit is skipped so a smaller, lower
+    ranked one can still use the rest of the budget; the best span is truncated
+    rather than dropped if it alone exceeds the budget.
+    """
+    if not documents:
+        return []
+    tokens_in = sum(count_tokens(doc.page_content) for doc in documents)
+    packed, used = [], 0
+    for doc in merge_chunks(documents, min_overlap):
+        tokens = count_tokens(doc.page_content)
+        if used + tokens <= max_tokens:
+            packed.append(doc)
+            used += tokens
+        elif not packed:
+            packed.append(
+                Document(
+                    page_content=truncate_tokens(doc.page_content, max_tokens),
+                    metadata=doc.metadata,
+                )
+            )
+            used = max_tokens
+
+    metrics.incr("context.chunks_in", len(documents))
+    metrics.incr("context.spans_out", len(packed))
+    metrics.incr("context.tokens_in", tokens_in)
+    metrics.incr("context.tokens_out", used)
+    logger.debug(
+        f"Packed {len(documents)} chunks into {len(packed)} spans: "
+        f"{tokens_in} -> {used} tokens (budget {max_tokens})"
+    )
+    return packed
+
+
+class ContextPacker(BaseDocumentCompressor):
+    """
+    Runs the reranker, then packs its top documents with `pack_documents`, so the
+    QA prompts get each passage of a case once and stay within `max_tokens`.
+    """
+
+    compressor: BaseDocumentCompressor
+    max_tokens: int = 3000
+    min_overlap: int = 40
+
+    class Config:
+        arbitrary_types_allowed = True
+
+    def compress_documents(
+        self,
+        documents: Sequence[Document],
+        query: str,
+        callbacks: Optional[Callbacks] = None,
+    ) -> Sequence[Document]:
+        ranked = self.compressor.compress_documents(documents, query, callbacks=callbacks)
+        return pack_documents(ranked, self.max_tokens, self.min_overlap)
+
+    async def acompress_documents(
+        self,
+        documents: Sequence[Document],
+        query: str,
+        callbacks: Optional[Callbacks] = None,
+    ) -> Sequence[Document]:
+        ranked = await self.compressor.acompress_documents(
+            documents, query, callbacks=callbacks
+        )
+        return pack_documents(ranked, self.max_tokens, self.min_overlap)
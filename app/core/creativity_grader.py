@@ -1,28 +1,176 @@
+import re
+import time
+from typing import Dict, Optional, Tuple
+
 from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.runnables import Runnable
 from pydantic import BaseModel, Field
-from langchain_openai import ChatOpenAI
+from core.cache import TTLCache
+from core.config import settings
+from core.metrics import metrics
 from core.prompt import creativity_grader_prompt_template
+from core.registry import get_registry
+from core.text import normalize_text
+from log_config import configure_logging
+
+# Configure logging
+logger = configure_logging(__name__)
+
+# Patterns over the normalized (Turkish lowercased) question.
+# Drafting requests need the most freedom: petitions, contracts, notices, defences.
+DRAFTING = re.compile(
+    r"\b(dilekçe\w*|tasla\w*|ihtarname\w*|sözleşme (yaz|hazırla|taslağ)\w*|"
+    r"savunma (yaz|hazırla)\w*|metin (yaz|oluştur|hazırla)\w*|"
+    r"(yaz|hazırla|oluştur|düzenle)"
+    r"(ar mısın|r mısın|ur musun|abilir misin|yabilir misin|ın|yın|un|)\b)"
+)
+# Argument building and hypotheticals.
+ARGUMENT = re.compile(
+    r"\b(strateji\w*|argüman\w*|nasıl savun\w*|savunabilir\w*|varsay\w*|"
+    r"olsaydı|senaryo\w*|yorumla\w*|değerlendir\w*|karşı\s?argüman\w*|ikna\w*)"
+)
+# Fact lookups: definitions, durations, amounts, articles.
+FACTUAL = re.compile(
+    r"\b(nedir|ne demek\w*|kaç\w*|ne kadar\w*|ne zaman\w*|hangi\w*|süre\w*|"
+    r"zamanaşım\w*|maddesi\w*|madde \d+|kimdir|var mı|mıdır|midir|mudur|müdür)"
+)
+
 
 class GradeCreativity(BaseModel):
     """Grade the creativity of a user's question on a scale of 1 to 10."""
+
     creativity_score: int = Field(
         description="Creativity score of the user's question, ranging from 1 to 10"
     )
 
-def get_llm_parameter(question:str):
-    try:
-        llm = ChatOpenAI(model="gpt-4o", temperature=0)
-        structured_llm_grader = llm.with_structured_output(GradeCreativity)
-        grade_prompt = ChatPromptTemplate.from_template(creativity_grader_prompt_template)
-        retrieval_grader = grade_prompt | structured_llm_grader
-        result = retrieval_grader.invoke({"question": question})
-        creativity_score = result["creativity_score"]
-        temperature = creativity_score/10
-        max_tokens = 3000 + creativity_score*500
-        return {
-            "temperature": temperature,
-            "max_tokens": max_tokens
-        }
-            
-    except Exception as ex:
-        raise RuntimeError(f"OpenAI calling error:{ex}")
\ No newline at end of file
+
+class LocalCreativityGrader:
+    """
+    Rule-based grader over the question text: drafting verbs ("dilekçe yaz"),
+    argument and hypothetical wording, fact question words and length.
+    Returns a score in 1..10 and a confidence; mixed or missing signals are
+    reported with low confidence so the LLM grader decides.
+    """
+
+    def predict(self, question: str) -> Tuple[int, float]:
+        text = normalize_text(question)
+        words = len(text.split())
+        drafting = bool(DRAFTING.search(text))
+        argument = bool(ARGUMENT.search(text))
+        factual = bool(FACTUAL.search(text))
+
+        if drafting and not factual:
+            return (9 if words > 40 else 8), 0.9
+        if argument and not drafting and not factual:
+            return 6, 0.85
+        if factual and not drafting and not argument:
+            return (3 if words > 30 else 2), 0.9
+        if drafting or argument:
+            return 6, 0.6
+        return 4, 0.5
+
+
+def llm_parameters(creativity_score: int) -> Dict[str, float]:
+    return {
+        "temperature": creativity_score / 10,
+        "max_tokens": 3000 + creativity_score * 500,
+    }
+
+
+def build_grade_chain(llm) -> Runnable:
+    grade_prompt = ChatPromptTemplate.from_template(creativity_grader_prompt_template)
+    return grade_prompt | llm.with_structured_output(GradeCreativity)
+
+
+def get_grade_chain() -> Runnable:
+    """The worker's gpt-4o grade chain on the registry's pooled clients, built on first use."""
+    registry = get_registry()
+    return registry.get_or_create(
+        ("creativity_grader",),
+        lambda: build_grade_chain(registry.chat_llm(model_name="gpt-4o", temperature=0)),
+    )
+
+
+class CreativityGrader:
+    """
+    Chooses the agent temperature and max_tokens from the creativity a question needs.
+
+    The local grader answers when its confidence reaches CREATIVITY_CONFIDENCE;
+    only unsure questions go to the gpt-4o structured output call, which is
+    looked up in the retrieval registry unless a `grade_chain` is given. Scores
+    are memoized per normalized question.
+    """
+
+    def __init__(self, grade_chain: Optional[Runnable] = None, local_model=None):
+        self._grade_chain = grade_chain
+        self.local_model = local_model or LocalCreativityGrader()
+        self.confidence = settings.CREATIVITY_CONFIDENCE
+        self.cache = TTLCache(
+            maxsize=settings.CREATIVITY_CACHE_SIZE, ttl=settings.CREATIVITY_CACHE_TTL_SECONDS
+        )
+        metrics.register_gauge("creativity_cache", self.cache.stats)
+
+    @property
+    def grade_chain(self) -> Runnable:
+        return self._grade_chain or get_grade_chain()
+
+    @grade_chain.setter
+    def grade_chain(self, chain: Runnable):
+        self._grade_chain = chain
+
+    def _local(self, key: str) -> Tuple[Optional[int], int]:
+        score = self.cache.get(key)
+        if score is not None:
+            metrics.incr("creativity.cache_hits")
+            return score, score
+        score, confidence = self.local_model.predict(key)
+        if confidence >= self.confidence:
+            metrics.incr("creativity.local")
+            self.cache.set(key, score)
+            return score, score
+        logger.debug(f"Local creativity grader not confident ({score}, {confidence:.2f}), asking LLM")
+        return None, score
+
+    def _store_llm(self, key: str, result, start: float) -> int:
+        metrics.incr("creativity.llm")
+        metrics.observe("creativity.llm_ms", (time.perf_counter() - start) * 1000)
+        score = min(10, max(1, int(result["creativity_score"])))
+        self.cache.set(key, score)
+        return score
+
+    def grade(self, question: str) -> int:
+        key = normalize_text(question)
+        score, fallback = self._local(key)
+        if score is not None:
+            return score
+        start = time.perf_counter()
+        try:
+            result = self.grade_chain.invoke({"question": question})
+        except Exception as e:
+            logger.warning(f"LLM creativity grader failed, using the local score: {e}")
+            return fallback
+        return self._store_llm(key, result, start)
+
+    async def agrade(self, question: str) -> int:
+        key = normalize_text(question)
+        score, fallback = self._local(key)
+        if score is not None:
+            return score
+        start = time.perf_counter()
+        try:
+            result = await self.grade_chain.ainvoke({"question": question})
+        except Exception as e:
+            logger.warning(f"LLM creativity grader failed, using the local score: {e}")
+            return fallback
+        return self._store_llm(key, result, start)
+
+
+creativity_grader = CreativityGrader()
+
+
+def get_llm_parameter(question: str):
+    return llm_parameters(creativity_grader.grade(question))
+
+
+async def aget_llm_parameter(question: str):
+    return llm_parameters(await creativity_grader.agrade(question))
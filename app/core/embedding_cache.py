@@ -0,0 +1,62 @@
+from typing import List
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from core.cache import TTLCache
+from core.text import normalize_text
+from log_config import configure_logging
+
+# Configure logging
+logger = configure_logging(__name__)
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Query-embedding cache in front of another `Embeddings` implementation.
+
+    Queries are keyed by their normalized text (Turkish-aware casing, collapsed
+    whitespace) and stored as float32 arrays, which halves the memory of the
+    3072-float lists returned by text-embedding-3-large. Document embedding is
+    passed straight through since it is only used by ingestion.
+    """
+
+    def __init__(self, embeddings: Embeddings, maxsize: int = 4096, ttl: float = 86400):
+        self.embeddings = embeddings
+        self.cache = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embeddings.embed_documents(texts)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        return await self.embeddings.aembed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_query_array(text).tolist()
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return (await self.aembed_query_array(text)).tolist()
+
+    def embed_query_array(self, text: str) -> np.ndarray:
+        """Cached float32 embedding of `text`, shared between callers (read-only)."""
+        key = normalize_text(text)
+        vector = self.cache.get(key)
+        if vector is None:
+            vector = self._store(key, self.embeddings.embed_query(text))
+        return vector
+
+    async def aembed_query_array(self, text: str) -> np.ndarray:
+        key = normalize_text(text)
+        vector = self.cache.get(key)
+        if vector is None:
+            vector = self._store(key, await self.embeddings.aembed_query(text))
+        return vector
+
+    def _store(self, key: str, embedding: List[float]) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        vector.flags.writeable = False
+        self.cache.set(key, vector)
+        return vector
+
+    def stats(self):
+        return self.cache.stats()
@@ -0,0 +1,94 @@
+import asyncio
+import contextvars
+import functools
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from core.config import settings
+from core.metrics import metrics
+from log_config import configure_logging
+
+# Configure logging
+logger = configure_logging(__name__)
+
+
+class BlockingExecutor:
+    """
+    Bounded thread pool for the blocking calls left on the async request paths
+    (OCR, S3, psycopg, SQLAlchemy).
+
+    `max_workers` bounds how many run at once, so a burst of PDF uploads cannot
+    take every thread of the worker; calls beyond that wait in the pool queue,
+    and the wait is recorded as `<name>.queue_ms`.
+    """
+
+    def __init__(
+        self, max_workers: int = 16, name: str = "executor", thread_name_prefix: str = "blocking"
+    ):
+        self.max_workers = max_workers
+        self.name = name
+        self.thread_name_prefix = thread_name_prefix
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        self.pending = 0
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.max_workers, thread_name_prefix=self.thread_name_prefix
+                    )
+        return self._executor
+
+    def _call(self, fn: Callable[..., Any], *args, **kwargs) -> Callable[[], Any]:
+        context = contextvars.copy_context()
+        submitted = time.perf_counter()
+
+        def call():
+            metrics.observe(f"{self.name}.queue_ms", (time.perf_counter() - submitted) * 1000)
+            return context.run(functools.partial(fn, *args, **kwargs))
+
+        return call
+
+    def submit(self, fn: Callable[..., Any], *args, **kwargs) -> Future:
+        """Start `fn(*args, **kwargs)` in the pool from sync code, with the caller's context variables."""
+        return self.executor.submit(self._call(fn, *args, **kwargs))
+
+    async def run(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """Run `fn(*args, **kwargs)` in the pool with the caller's context variables."""
+        call = self._call(fn, *args, **kwargs)
+        self.pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, call)
+        finally:
+            self.pending -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {"max_workers": self.max_workers, "pending": self.pending}
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+blocking_executor = BlockingExecutor(max_workers=settings.BLOCKING_EXECUTOR_MAX_WORKERS)
+metrics.register_gauge("blocking_executor", blocking_executor.stats)
+
+# Speculative retrievals of the sync RAG chain. Their caller blocks on the result,
+# often from a blocking_executor thread, so they must not queue behind it.
+speculation_executor = BlockingExecutor(
+    max_workers=settings.SPECULATION_EXECUTOR_MAX_WORKERS,
+    name="speculation_executor",
+    thread_name_prefix="speculation",
+)
+metrics.register_gauge("speculation_executor", speculation_executor.stats)
+
+
+async def run_blocking(fn: Callable[..., Any], *args, **kwargs) -> Any:
+    """Await a blocking call on the bounded executor instead of the event loop."""
+    return await blocking_executor.run(fn, *args, **kwargs)
@@ -0,0 +1,277 @@
+import os
+import pickle
+import time
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from core.metrics import metrics
+from log_config import configure_logging
+
+# Configure logging
+logger = configure_logging(__name__)
+
+DEFAULT_NAMESPACE = ""
+
+
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def _kmeans(vectors: np.ndarray, n_lists: int, iterations: int = 10, seed: int = 0) -> np.ndarray:
+    """Spherical k-means on unit-normalized rows, returns normalized centroids."""
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), n_lists, replace=False)].copy()
+    for _ in range(iterations):
+        assignment = _assign(vectors, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignment, vectors)
+        empty = np.flatnonzero(np.bincount(assignment, minlength=n_lists) == 0)
+        sums[empty] = vectors[rng.choice(len(vectors), len(empty), replace=False)]
+        centroids = _normalize_rows(sums)
+    return centroids
+
+
+def _assign(vectors: np.ndarray, centroids: np.ndarray, batch_size: int = 8192) -> np.ndarray:
+    assignment = np.empty(len(vectors), dtype=np.int64)
+    for start in range(0, len(vectors), batch_size):
+        block = np.asarray(vectors[start : start + batch_size], dtype=np.float32)
+        assignment[start : start + batch_size] = np.argmax(block @ centroids.T, axis=1)
+    return assignment
+
+
+class LocalVectorIndex:
+    """
+    IVF index over the exported vectors of one Pinecone index, read through memory maps.
+
+    Rows are unit-normalized and stored grouped by their inverted list, so probing a
+    list reads one contiguous slice of the file. The vectors, namespace codes and
+    chunk texts (UTF-8 bytes with row offsets) are memory-mapped, so gunicorn
+    workers that open the same files share the page cache for them; the rest of the
+    per-row metadata (source, source_link, ...) and the ids are unpickled into every
+    worker. Rows can be stored as float32 or int8 with a per-row scale. Every row
+    carries a namespace code, and a query only scores rows of its namespace.
+
+    `query` mirrors `pinecone.Index.query`, so it can be passed to PineconeRetriever
+    in place of the remote index.
+    """
+
+    def __init__(self, path: str, nprobe: int = 16):
+        self.path = path
+        self.nprobe = nprobe
+        with open(os.path.join(path, "meta.pkl"), "rb") as file:
+            meta = pickle.load(file)
+        self.ids: List[str] = meta["ids"]
+        self.metadata: List[dict] = meta["metadata"]
+        self.namespaces: Dict[str, int] = {
+            name: code for code, name in enumerate(meta["namespaces"])
+        }
+        self.quantization: str = meta["quantization"]
+        self.vectors = np.load(os.path.join(path, "vectors.npy"), mmap_mode="r")
+        self.codes = np.load(os.path.join(path, "namespaces.npy"), mmap_mode="r")
+        self.centroids = np.load(os.path.join(path, "centroids.npy"))
+        self.list_offsets = np.load(os.path.join(path, "list_offsets.npy"))
+        self.scales = (
+            np.load(os.path.join(path, "scales.npy"), mmap_mode="r")
+            if self.quantization == "int8"
+            else None
+        )
+        # Exports written before the texts were split out keep them in the metadata.
+        self.texts = self.text_offsets = None
+        if os.path.exists(os.path.join(path, "texts.npy")):
+            self.texts = np.load(os.path.join(path, "texts.npy"), mmap_mode="r")
+            self.text_offsets = np.load(os.path.join(path, "text_offsets.npy"), mmap_mode="r")
+
+    @classmethod
+    def load(cls, path: str, nprobe: int = 16) -> Optional["LocalVectorIndex"]:
+        """Open an index written by `build`, or None if it was not exported."""
+        if not os.path.exists(os.path.join(path, "meta.pkl")):
+            logger.warning(f"Local vector index not found: {path}")
+            return None
+        index = cls(path, nprobe=nprobe)
+        logger.info(
+            f"Opened local vector index {path}: {len(index)} vectors, "
+            f"{len(index.centroids)} lists, {index.quantization}"
+        )
+        return index
+
+    @classmethod
+    def build(
+        cls,
+        path: str,
+        records: Iterable[Tuple[str, str, Sequence[float], dict]],
+        n_lists: Optional[int] = None,
+        quantization: str = "float32",
+        sample_size: int = 100000,
+    ) -> "LocalVectorIndex":
+        """
+        Write an index from (namespace, vector_id, values, metadata) records.
+
+        Args:
+            path (str): Output directory.
+            records: Vectors exported from Pinecone; the chunk `text` of the metadata
+                is stored apart, in texts.npy.
+            n_lists (int): Number of inverted lists, 4 * sqrt(n) by default.
+            quantization (str): "float32" or "int8".
+            sample_size (int): Rows used to train the centroids.
+        """
+        if quantization not in ("float32", "int8"):
+            raise ValueError(f"Unsupported quantization: {quantization}")
+        namespaces: Dict[str, int] = {}
+        ids, metadata, texts, codes, rows = [], [], [], [], []
+        for namespace, vector_id, values, meta in records:
+            code = namespaces.setdefault(namespace or DEFAULT_NAMESPACE, len(namespaces))
+            ids.append(vector_id)
+            meta = dict(meta)
+            texts.append(meta.pop("text", "").encode("utf-8"))
+            metadata.append(meta)
+            codes.append(code)
+            rows.append(np.asarray(values, dtype=np.float32))
+        if not rows:
+            raise ValueError("No vectors to index")
+        if len(namespaces) > 255:
+            raise ValueError("At most 255 namespaces are supported")
+        vectors = _normalize_rows(np.vstack(rows))
+        del rows
+
+        n_lists = min(n_lists or max(1, int(4 * np.sqrt(len(vectors)))), len(vectors))
+        rng = np.random.default_rng(0)
+        sample = vectors[rng.choice(len(vectors), min(sample_size, len(vectors)), replace=False)]
+        centroids = _kmeans(sample, n_lists)
+        assignment = _assign(vectors, centroids)
+        order = np.argsort(assignment, kind="stable")
+        list_offsets = np.zeros(n_lists + 1, dtype=np.int64)
+        list_offsets[1:] = np.cumsum(np.bincount(assignment, minlength=n_lists))
+
+        vectors = vectors[order]
+        os.makedirs(path, exist_ok=True)
+        if quantization == "int8":
+            scales = np.abs(vectors).max(axis=1) / 127
+            scales[scales == 0] = 1.0
+            np.save(os.path.join(path, "scales.npy"), scales.astype(np.float32))
+            vectors = np.round(vectors / scales[:, None]).astype(np.int8)
+        np.save(os.path.join(path, "vectors.npy"), vectors)
+        np.save(os.path.join(path, "namespaces.npy"), np.asarray(codes, dtype=np.uint8)[order])
+        np.save(os.path.join(path, "centroids.npy"), centroids.astype(np.float32))
+        np.save(os.path.join(path, "list_offsets.npy"), list_offsets)
+        texts = [texts[i] for i in order]
+        text_offsets = np.zeros(len(texts) + 1, dtype=np.int64)
+        text_offsets[1:] = np.cumsum([len(text) for text in texts])
+        np.save(os.path.join(path, "texts.npy"), np.frombuffer(b"".join(texts), dtype=np.uint8))
+        np.save(os.path.join(path, "text_offsets.npy"), text_offsets)
+        with open(os.path.join(path, "meta.pkl"), "wb") as file:
+            pickle.dump(
+                {
+                    "ids": [ids[i] for i in order],
+                    "metadata": [metadata[i] for i in order],
+                    "namespaces": sorted(namespaces, key=namespaces.get),
+                    "quantization": quantization,
+                },
+                file,
+                protocol=pickle.HIGHEST_PROTOCOL,
+            )
+        return cls(path)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def row_metadata(self, row: int) -> dict:
+        metadata = dict(self.metadata[row])
+        if self.texts is not None:
+            start, end = int(self.text_offsets[row]), int(self.text_offsets[row + 1])
+            metadata["text"] = self.texts[start:end].tobytes().decode("utf-8")
+        return metadata
+
+    def has_namespace(self, namespace: Optional[str]) -> bool:
+        return (namespace or DEFAULT_NAMESPACE) in self.namespaces
+
+    def search(
+        self, vector, k: int = 10, namespace: Optional[str] = None, nprobe: Optional[int] = None
+    ) -> List[Tuple[int, float]]:
+        """
+        Return up to k (row, cosine score) pairs of the namespace, best first.
+
+        At least `nprobe` lists are probed; more are added, closest first, until k
+        rows of the namespace have been scored.
+        """
+        code = self.namespaces.get(namespace or DEFAULT_NAMESPACE)
+        if code is None:
+            return []
+        query = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm:
+            query = query / norm
+        nprobe = nprobe or self.nprobe
+
+        rows, scores = [], []
+        scored = 0
+        for probed, list_id in enumerate(np.argsort(self.centroids @ query)[::-1]):
+            if probed >= nprobe and scored >= k:
+                break
+            start, end = int(self.list_offsets[list_id]), int(self.list_offsets[list_id + 1])
+            if start == end:
+                continue
+            matches = np.flatnonzero(self.codes[start:end] == code)
+            if len(matches) == 0:
+                continue
+            block = self.vectors[start:end][matches].astype(np.float32) @ query
+            if self.scales is not None:
+                block *= self.scales[start:end][matches]
+            rows.append(matches + start)
+            scores.append(block)
+            scored += len(matches)
+        if not rows:
+            return []
+
+        rows, scores = np.concatenate(rows), np.concatenate(scores)
+        if len(scores) > k:
+            top = np.argpartition(scores, -k)[-k:]
+            rows, scores = rows[top], scores[top]
+        ranked = np.argsort(scores)[::-1]
+        return [(int(rows[i]), float(scores[i])) for i in ranked]
+
+    def query(
+        self,
+        vector,
+        top_k: int = 10,
+        include_metadata: bool = True,
+        namespace: Optional[str] = None,
+        **kwargs,
+    ) -> Dict[str, Any]:
+        start = time.perf_counter()
+        matches = [
+            {
+                "id": self.ids[row],
+                "score": score,
+                "metadata": self.row_metadata(row) if include_metadata else {},
+            }
+            for row, score in self.search(vector, top_k, namespace)
+        ]
+        metrics.observe("vector_index.local_ms", (time.perf_counter() - start) * 1000)
+        return {"matches": matches, "namespace": namespace or DEFAULT_NAMESPACE}
+
+
+class FallbackIndex:
+    """
+    Queries the local index and falls back to Pinecone when the namespace was not
+    exported or the local search fails.
+    """
+
+    def __init__(self, local: LocalVectorIndex, remote: Any):
+        self.local = local
+        self.remote = remote
+
+    def query(self, vector, namespace: Optional[str] = None, **kwargs) -> Dict[str, Any]:
+        if self.local.has_namespace(namespace):
+            try:
+                return self.local.query(vector, namespace=namespace, **kwargs)
+            except Exception as e:
+                logger.warning(f"Local vector search failed, falling back to Pinecone: {e}")
+        metrics.incr("vector_index.fallbacks")
+        return self.remote.query(vector=vector, namespace=namespace, **kwargs)
+
+
+def local_index_path(directory: str, index_name: str) -> str:
+    return os.path.join(directory, index_name)
@@ -0,0 +1,114 @@
+from typing import Any, Callable, Dict, List, Sequence, Tuple
+
+from langchain.memory import ConversationSummaryBufferMemory
+from langchain_core.chat_history import BaseChatMessageHistory
+from langchain_core.messages import BaseMessage
+from langchain_core.prompts import PromptTemplate
+
+from core.executor import run_blocking
+from core.metrics import metrics
+from core.prompt import rolling_summary_prompt_template
+from log_config import configure_logging
+
+# Configure logging
+logger = configure_logging(__name__)
+
+ROLLING_SUMMARY_PROMPT = PromptTemplate(
+    input_variables=["summary", "new_lines"], template=rolling_summary_prompt_template
+)
+
+
+class OffsetChatMessageHistory(BaseChatMessageHistory):
+    """Messages of `history` after the first `offset`, which a summary already covers."""
+
+    def __init__(self, history: BaseChatMessageHistory, offset: int = 0):
+        self.history = history
+        self.offset = offset
+
+    @property
+    def messages(self) -> List[BaseMessage]:
+        return self.history.messages[self.offset :]
+
+    def add_message(self, message: BaseMessage) -> None:
+        self.history.add_message(message)
+
+    def add_messages(self, messages: Sequence[BaseMessage]) -> None:
+        self.history.add_messages(messages)
+
+    def clear(self) -> None:
+        self.history.clear()
+        self.offset = 0
+
+
+class RollingSummaryMemory(ConversationSummaryBufferMemory):
+    """
+    ConversationSummaryBufferMemory whose summary of pruned messages is persisted.
+
+    The stock memory is rebuilt for every request with an empty summary, so a long
+    session gets all of its old messages summarized again on each turn. Here the
+    summary and the number of messages it covers are loaded with `load_summary`
+    and saved with `save_summary`; only messages after them are read into the
+    buffer, and pruning folds just the messages that overflow `max_token_limit`
+    into the summary. The summarization cost per turn therefore stays constant
+    however long the session gets.
+
+    The async chains load and save it on the bounded blocking executor, with the
+    same pruning as the sync path.
+    """
+
+    session_id: str
+    save_summary: Callable[[str, str, int], Any]
+
+    @classmethod
+    def from_store(
+        cls,
+        chat_memory: BaseChatMessageHistory,
+        session_id: str,
+        load_summary: Callable[[str], Tuple[str, int]],
+        save_summary: Callable[[str, str, int], Any],
+        **kwargs,
+    ) -> "RollingSummaryMemory":
+        summary, message_count = load_summary(session_id)
+        kwargs.setdefault("prompt", ROLLING_SUMMARY_PROMPT)
+        return cls(
+            chat_memory=OffsetChatMessageHistory(chat_memory, message_count),
+            moving_summary_buffer=summary,
+            session_id=session_id,
+            save_summary=save_summary,
+            **kwargs,
+        )
+
+    @property
+    def summarized_messages(self) -> int:
+        return self.chat_memory.offset
+
+    def prune(self) -> None:
+        buffer = self.chat_memory.messages
+        curr_buffer_length = self.llm.get_num_tokens_from_messages(buffer)
+        if curr_buffer_length <= self.max_token_limit:
+            return
+        pruned_memory = []
+        while curr_buffer_length > self.max_token_limit:
+            pruned_memory.append(buffer.pop(0))
+            curr_buffer_length = self.llm.get_num_tokens_from_messages(buffer)
+        self.moving_summary_buffer = self.predict_new_summary(
+            pruned_memory, self.moving_summary_buffer
+        )
+        self.chat_memory.offset += len(pruned_memory)
+        metrics.incr("memory.summarized_messages", len(pruned_memory))
+        logger.info(
+            f"Folded {len(pruned_memory)} messages into the rolling summary of "
+            f"session {self.session_id} ({self.chat_memory.offset} summarized)"
+        )
+        self.save_summary(self.session_id, self.moving_summary_buffer, self.chat_memory.offset)
+
+    def load_memory_variables(self, inputs: Dict[str, Any]) -> Dict[str, Any]:
+        # Sessions that grew past the limit without a saved summary catch up here once.
+        self.prune()
+        return super().load_memory_variables(inputs)
+
+    async def aload_memory_variables(self, inputs: Dict[str, Any]) -> Dict[str, Any]:
+        return await run_blocking(self.load_memory_variables, inputs)
+
+    async def asave_context(self, inputs: Dict[str, Any], outputs: Dict[str, str]) -> None:
+        await run_blocking(self.save_context, inputs, outputs)
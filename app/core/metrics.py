@@ -0,0 +1,82 @@
+import threading
+from collections import defaultdict, deque
+from typing import Any, Callable, Dict, List
+
+from log_config import configure_logging
+
+# Configure logging
+logger = configure_logging(__name__)
+
+
+class Metrics:
+    """
+    In-process counters and timing windows for the API workers.
+
+    Timings keep the last `window` observations per name so percentiles reflect
+    recent traffic. Hooks receive every `(kind, name, value)` so the numbers can be
+    forwarded to an external collector, and gauges are callables (cache stats)
+    sampled when `snapshot()` builds the payload of the metrics endpoint.
+    """
+
+    def __init__(self, window: int = 2048):
+        self.window = window
+        self._counters: Dict[str, float] = defaultdict(float)
+        self._timings: Dict[str, deque] = defaultdict(lambda: deque(maxlen=self.window))
+        self._gauges: Dict[str, Callable[[], Any]] = {}
+        self._hooks: List[Callable[[str, str, float], None]] = []
+        self._lock = threading.Lock()
+
+    def add_hook(self, hook: Callable[[str, str, float], None]):
+        self._hooks.append(hook)
+
+    def register_gauge(self, name: str, gauge: Callable[[], Any]):
+        self._gauges[name] = gauge
+
+    def _notify(self, kind: str, name: str, value: float):
+        for hook in self._hooks:
+            try:
+                hook(kind, name, value)
+            except Exception as e:
+                logger.warning(f"Metrics hook failed for {name}: {e}")
+
+    def incr(self, name: str, value: float = 1):
+        with self._lock:
+            self._counters[name] += value
+        self._notify("counter", name, value)
+
+    def observe(self, name: str, value: float):
+        with self._lock:
+            self._timings[name].append(value)
+        self._notify("timing", name, value)
+
+    @staticmethod
+    def _percentile(values, percent: float) -> float:
+        index = min(len(values) - 1, int(round(percent / 100 * (len(values) - 1))))
+        return values[index]
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            counters = dict(self._counters)
+            timings = {name: sorted(values) for name, values in self._timings.items()}
+        return {
+            "counters": counters,
+            "timings": {
+                name: {
+                    "count": len(values),
+                    "p50": self._percentile(values, 50),
+                    "p99": self._percentile(values, 99),
+                    "max": values[-1],
+                }
+                for name, values in timings.items()
+                if values
+            },
+            "gauges": {name: gauge() for name, gauge in list(self._gauges.items())},
+        }
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._timings.clear()
+
+
+metrics = Metrics()
@@ -43,6 +43,14 @@ AI:{answer}
 ============
 CONCISE Summary: """
 
+session_title_prompt_template = """Create a title for a legal chat session that starts with the following question.
+The title should be in Turkish, in title format, and between 5-8 words. Return only the title.
+QUESTION:
+============
+{question}
+============
+TITLE: """
+
 legalcase_classify_prompt_template = """You are an intelligent assistant. Your task is to classify the following question into one of the two categories based on the detailed descriptions provided.
 
 Categories:
@@ -139,3 +147,21 @@ Creativity Score:
 
 """
 
+
+rolling_summary_prompt_template = """Progressively summarize the lines of a legal conversation provided, adding onto the previous summary and returning a new summary in turkish.
+Keep the facts, parties, dates, amounts and legal questions needed to find relevant legal cases.
+
+Current summary:
+{summary}
+
+New lines of conversation:
+{new_lines}
+
+New summary:"""
+
+condense_legal_document_prompt_template = """The following text is one part of a legal case description attached by a user.
+Condense it in turkish so that it can be used to answer the user's question: keep every fact, party, date, amount, court decision and article of law; drop repetitions, headers and boilerplate.
+Do NOT answer the question.
+Question: {question}\n
+Part of the Legal Case Description: {chunk}\n
+Condensed part:"""
@@ -0,0 +1,347 @@
+import threading
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple, Union
+
+import cohere
+import httpx
+from pinecone import Pinecone
+from langchain.prompts import PromptTemplate
+from langchain.retrievers.contextual_compression import ContextualCompressionRetriever
+from langchain_openai import ChatOpenAI, OpenAIEmbeddings
+
+from core.bm25 import BM25Index, bm25_index_path
+from core.cache import TTLCache
+from core.config import settings
+from core.context import ContextPacker
+from core.embedding_cache import CachedEmbeddings
+from core.local_index import FallbackIndex, LocalVectorIndex, local_index_path
+from core.metrics import metrics
+from core.prompt import multi_query_prompt_template
+from core.rerank import AdaptiveRerank, CachedCohereRerank
+from core.retrievers import (
+    FanOutMultiQueryRetriever,
+    HybridRetriever,
+    MultiNamespaceRetriever,
+    PineconeRetriever,
+)
+from log_config import configure_logging
+
+# Configure logging
+logger = configure_logging(__name__)
+
+
+class RetrievalRegistry:
+    """
+    Process-wide holder of the retrieval clients used by crud/rag.py.
+
+    One instance is built per worker at lifespan startup. It owns a single pooled
+    HTTP client pair for OpenAI, one Pinecone client, one Cohere client, and
+    memoizes vector stores, rerankers, retrievers and stateless chains so that a
+    request only pays for a dictionary lookup instead of new clients and TLS
+    handshakes.
+
+    Every client can be injected, which is how the benchmarks run it with fakes.
+    """
+
+    def __init__(
+        self,
+        embeddings: Any = None,
+        pinecone_client: Any = None,
+        cohere_client: Any = None,
+        http_client: Optional[httpx.Client] = None,
+        http_async_client: Optional[httpx.AsyncClient] = None,
+    ):
+        limits = httpx.Limits(
+            max_connections=settings.HTTP_POOL_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.HTTP_POOL_MAX_KEEPALIVE,
+        )
+        self.http_client = http_client or httpx.Client(limits=limits)
+        self.http_async_client = http_async_client or httpx.AsyncClient(limits=limits)
+
+        self.embeddings = CachedEmbeddings(
+            embeddings
+            or OpenAIEmbeddings(
+                model="text-embedding-3-large",
+                http_client=self.http_client,
+                http_async_client=self.http_async_client,
+            ),
+            maxsize=settings.EMBEDDING_CACHE_SIZE,
+            ttl=settings.EMBEDDING_CACHE_TTL_SECONDS,
+        )
+        self.pinecone_client = pinecone_client or Pinecone(
+            api_key=settings.PINECONE_API_KEY, source_tag="langchain"
+        )
+        self.cohere_client = cohere_client or cohere.Client(
+            settings.COHERE_API_KEY, client_name="langchain:partner"
+        )
+        self.rerank_cache = TTLCache(
+            maxsize=settings.RERANK_CACHE_SIZE, ttl=settings.RERANK_CACHE_TTL_SECONDS
+        )
+        metrics.register_gauge("embedding_cache", self.embeddings.stats)
+        metrics.register_gauge("rerank_cache", self.rerank_cache.stats)
+
+        self.llm = self.chat_llm(
+            model_name=settings.LLM_MODEL_NAME, temperature=0, max_tokens=3000
+        )
+        self.question_llm = self.chat_llm(
+            model_name=settings.QUESTION_MODEL_NAME, temperature=0.3, max_tokens=3000
+        )
+        self.multi_query_llm = self.chat_llm(
+            model_name="gpt-4o", temperature=0, max_tokens=3000
+        )
+        self.multi_query_prompt = PromptTemplate(
+            input_variables=["question"],
+            template=multi_query_prompt_template,
+        )
+
+        self._lock = threading.RLock()
+        self._components: Dict[Hashable, Any] = {}
+
+    def chat_llm(self, **kwargs) -> ChatOpenAI:
+        """Build a ChatOpenAI that reuses the pooled OpenAI connections."""
+        return ChatOpenAI(
+            http_client=self.http_client,
+            http_async_client=self.http_async_client,
+            **kwargs,
+        )
+
+    def get_or_create(self, key: Hashable, factory: Callable[[], Any]) -> Any:
+        """Return the component stored under `key`, building it once with `factory`."""
+        component = self._components.get(key)
+        if component is not None:
+            return component
+        with self._lock:
+            component = self._components.get(key)
+            if component is None:
+                logger.info(f"Building retrieval component: {key}")
+                component = factory()
+                self._components[key] = component
+            return component
+
+    def index(self, index_name: str):
+        return self.get_or_create(
+            ("index", index_name), lambda: self.pinecone_client.Index(index_name)
+        )
+
+    def local_index(self, index_name: str) -> Optional[LocalVectorIndex]:
+        """Memory-mapped export of a Pinecone index, or None when it was not built."""
+        path = local_index_path(settings.LOCAL_INDEX_DIR, index_name)
+        index = self.get_or_create(
+            ("local", index_name),
+            lambda: LocalVectorIndex.load(path, nprobe=settings.LOCAL_INDEX_NPROBE) or False,
+        )
+        return index if index is not False else None
+
+    def vector_index(self, index_name: str):
+        """
+        Index queried by the dense retrievers, chosen by VECTOR_BACKEND:
+        "pinecone", "local" or "local_fallback" (local, Pinecone for missing data or errors).
+        """
+        backend = settings.VECTOR_BACKEND
+        if backend == "pinecone":
+            return self.index(index_name)
+        local = self.local_index(index_name)
+        if backend == "local":
+            if local is None:
+                raise FileNotFoundError(
+                    f"No local vector index for {index_name} in {settings.LOCAL_INDEX_DIR}"
+                )
+            return local
+        if backend == "local_fallback":
+            if local is None:
+                return self.index(index_name)
+            return self.get_or_create(
+                ("fallback", index_name), lambda: FallbackIndex(local, self.index(index_name))
+            )
+        raise ValueError(f"Unknown VECTOR_BACKEND: {backend}")
+
+    def dense_retriever(
+        self, index_name: str, namespace: str = None, k: int = 50
+    ) -> PineconeRetriever:
+        return self.get_or_create(
+            ("dense", index_name, namespace, k),
+            lambda: PineconeRetriever(
+                index=self.vector_index(index_name),
+                embeddings=self.embeddings,
+                namespace=namespace,
+                k=k,
+            ),
+        )
+
+    def lexical_index(self, index_name: str, namespace: str = None) -> Optional[BM25Index]:
+        """BM25 index exported for (index, namespace), or None when it was not built."""
+        if not settings.BM25_INDEX_DIR:
+            return None
+        path = bm25_index_path(settings.BM25_INDEX_DIR, index_name, namespace)
+        index = self.get_or_create(
+            ("lexical", index_name, namespace), lambda: BM25Index.load(path) or False
+        )
+        return index if index is not False else None
+
+    def compressor(self, top_n: int, pack: bool = False):
+        """
+        Cohere reranker keeping `top_n` documents, adaptive when RERANK_ADAPTIVE_POOL
+        is set. With `pack` (and CONTEXT_PACKING) overlapping chunks of a decision
+        are merged and the result is fitted into CONTEXT_MAX_TOKENS, which is only
+        wanted where the documents are stuffed into a QA prompt.
+        """
+
+        def build():
+            reranker = CachedCohereRerank(
+                top_n=top_n, client=self.cohere_client, cache=self.rerank_cache
+            )
+            compressor = reranker
+            if settings.RERANK_ADAPTIVE_POOL:
+                compressor = AdaptiveRerank(
+                    reranker=reranker,
+                    min_score=settings.RERANK_MIN_SCORE,
+                    knee_gap=settings.RERANK_KNEE_GAP,
+                    min_candidates=settings.RERANK_MIN_CANDIDATES,
+                    max_tokens=settings.RERANK_MAX_TOKENS,
+                )
+            if pack and settings.CONTEXT_PACKING:
+                compressor = ContextPacker(
+                    compressor=compressor,
+                    max_tokens=settings.CONTEXT_MAX_TOKENS,
+                    min_overlap=settings.CONTEXT_MIN_OVERLAP_CHARS,
+                )
+            return compressor
+
+        return self.get_or_create(("compressor", top_n, pack), build)
+
+    def multi_query_retriever(self, retriever) -> FanOutMultiQueryRetriever:
+        """`retriever` searched with the gpt-4o reformulations of the question."""
+        return FanOutMultiQueryRetriever.from_llm(
+            retriever=retriever,
+            llm=self.multi_query_llm,
+            prompt=self.multi_query_prompt,
+            max_concurrency=settings.MULTI_QUERY_MAX_CONCURRENCY,
+        )
+
+    def base_retriever(
+        self,
+        index_name: str,
+        namespace: str = None,
+        k: int = 50,
+        multi_query: bool = False,
+        lexical: bool = False,
+    ):
+        """Candidate retriever of one namespace, before reranking."""
+
+        def build():
+            base_retriever = self.dense_retriever(index_name, namespace, k)
+            if multi_query:
+                base_retriever = self.multi_query_retriever(base_retriever)
+            lexical_index = self.lexical_index(index_name, namespace) if lexical else None
+            if lexical_index is not None:
+                base_retriever = HybridRetriever(
+                    dense=base_retriever,
+                    lexical=lexical_index,
+                    lexical_k=settings.BM25_TOP_K,
+                )
+            return base_retriever
+
+        return self.get_or_create(
+            ("base", index_name, namespace, k, multi_query, lexical), build
+        )
+
+    def retriever(
+        self,
+        index_name: str,
+        namespace: Union[str, Tuple[str, ...]] = None,
+        k: int = 50,
+        top_n: int = 10,
+        multi_query: bool = False,
+        lexical: bool = False,
+        pack: bool = False,
+    ) -> ContextualCompressionRetriever:
+        """
+        Shared rerank retriever for an (index, namespace, k, top_n) combination.
+
+        Args:
+            index_name (str): Pinecone index name.
+            namespace (str | tuple): Pinecone namespace, None for the default namespace.
+                A tuple of namespaces is searched concurrently and merged before reranking.
+            k (int): Number of candidates fetched from Pinecone per query and namespace.
+            top_n (int): Number of documents kept by the Cohere reranker.
+            multi_query (bool): Expand the question into LLM reformulations that are
+                searched concurrently and merged by vector id. With several
+                namespaces the expansion runs once, above the namespace fan-out.
+            lexical (bool): Fuse with the local BM25 index by reciprocal-rank fusion
+                when one was built for (index, namespace).
+            pack (bool): Pack the reranked documents into the QA context budget,
+                for the chains that stuff them into the prompt.
+        """
+
+        def build():
+            if isinstance(namespace, tuple):
+                # The question is reformulated once and every reformulation searches
+                # all namespaces; the raw question itself is never searched then.
+                base_retriever = MultiNamespaceRetriever(
+                    retrievers={
+                        ns: self.base_retriever(index_name, ns, k, False, lexical)
+                        for ns in namespace
+                    },
+                    embeddings=self.embeddings,
+                )
+                if multi_query:
+                    base_retriever = self.multi_query_retriever(base_retriever)
+            else:
+                base_retriever = self.base_retriever(
+                    index_name, namespace, k, multi_query, lexical
+                )
+            return ContextualCompressionRetriever(
+                base_compressor=self.compressor(top_n, pack),
+                base_retriever=base_retriever,
+            )
+
+        return self.get_or_create(
+            ("retriever", index_name, namespace, k, top_n, multi_query, lexical, pack),
+            build,
+        )
+
+    def warmup(self):
+        """Resolve the Pinecone index hosts, or open the local indexes, before the first request."""
+        for index_name in (settings.INDEX_NAME, settings.LEGAL_CASE_INDEX_NAME):
+            try:
+                self.vector_index(index_name)
+            except Exception as e:
+                logger.warning(f"Could not warm up index {index_name}: {e}")
+
+    async def aclose(self):
+        self.http_client.close()
+        await self.http_async_client.aclose()
+        self._components.clear()
+
+
+_registry: Optional[RetrievalRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def init_registry(**kwargs) -> RetrievalRegistry:
+    """Build the worker registry. Called from the FastAPI lifespan."""
+    global _registry
+    with _registry_lock:
+        _registry = RetrievalRegistry(**kwargs)
+    if settings.RETRIEVAL_WARMUP:
+        _registry.warmup()
+    logger.info("Retrieval registry initialised")
+    return _registry
+
+
+def get_registry() -> RetrievalRegistry:
+    """Return the worker registry, building it lazily outside of the API (scripts, tests)."""
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = RetrievalRegistry()
+    return _registry
+
+
+async def close_registry():
+    global _registry
+    with _registry_lock:
+        registry, _registry = _registry, None
+    if registry is not None:
+        await registry.aclose()
+        logger.info("Retrieval registry closed")
@@ -0,0 +1,189 @@
+import hashlib
+import time
+from typing import Any, Dict, List, Optional, Sequence, Union
+
+from langchain_cohere import CohereRerank
+from langchain_core.callbacks import Callbacks
+from langchain_core.documents import Document
+from langchain_core.documents.compressor import BaseDocumentCompressor
+
+from core.metrics import metrics
+from core.text import normalize_text, truncate_tokens
+from log_config import configure_logging
+
+# Configure logging
+logger = configure_logging(__name__)
+
+
+def document_id(doc: Union[str, Document, dict]) -> str:
+    """Vector id of a candidate, or a content hash when it has none."""
+    if isinstance(doc, Document):
+        if doc.metadata.get("id"):
+            return str(doc.metadata["id"])
+        doc = doc.page_content
+    elif isinstance(doc, dict):
+        if doc.get("id"):
+            return str(doc["id"])
+        doc = doc.get("text", str(doc))
+    return hashlib.sha1(doc.encode("utf-8")).hexdigest()
+
+
+class CachedCohereRerank(CohereRerank):
+    """
+    CohereRerank that remembers the ranking it got for a query and candidate set.
+
+    The key is a hash of the normalized query, the model, top_n and the sorted
+    candidate ids, so retries, regenerated answers and the same question from
+    another session are answered from memory. Only (id, score) pairs are stored.
+    Hits, misses and the Cohere latency avoided are reported through core.metrics
+    as `rerank_cache.hits`, `rerank_cache.misses` and `rerank_cache.saved_ms`.
+    """
+
+    cache: Any = None
+
+    def _cache_key(self, ids: List[str], query: str, model: str, top_n: Optional[int]) -> str:
+        payload = "\x00".join([normalize_text(query), model, str(top_n), *sorted(ids)])
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def rerank(
+        self,
+        documents: Sequence[Union[str, Document, dict]],
+        query: str,
+        *,
+        rank_fields: Optional[Sequence[str]] = None,
+        model: Optional[str] = None,
+        top_n: Optional[int] = -1,
+        max_chunks_per_doc: Optional[int] = None,
+    ) -> List[Dict[str, Any]]:
+        if self.cache is None or len(documents) == 0:
+            return super().rerank(
+                documents,
+                query,
+                rank_fields=rank_fields,
+                model=model,
+                top_n=top_n,
+                max_chunks_per_doc=max_chunks_per_doc,
+            )
+
+        ids = [document_id(doc) for doc in documents]
+        effective_top_n = top_n if (top_n is None or top_n > 0) else self.top_n
+        key = self._cache_key(ids, query, model or self.model, effective_top_n)
+        cached = self.cache.get(key)
+        if cached is not None:
+            ranking, elapsed_ms = cached
+            metrics.incr("rerank_cache.hits")
+            metrics.incr("rerank_cache.saved_ms", elapsed_ms)
+            position = {doc_id: index for index, doc_id in enumerate(ids)}
+            return [
+                {"index": position[doc_id], "relevance_score": score}
+                for doc_id, score in ranking
+            ]
+
+        metrics.incr("rerank_cache.misses")
+        start = time.perf_counter()
+        results = super().rerank(
+            documents,
+            query,
+            rank_fields=rank_fields,
+            model=model,
+            top_n=top_n,
+            max_chunks_per_doc=max_chunks_per_doc,
+        )
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        metrics.observe("rerank.latency_ms", elapsed_ms)
+        ranking = [(ids[res["index"]], res["relevance_score"]) for res in results]
+        self.cache.set(key, (ranking, elapsed_ms))
+        return results
+
+
+class AdaptiveRerank(BaseDocumentCompressor):
+    """
+    Candidate stage in front of the reranker.
+
+    The Pinecone similarity scores (`score` metadata) decide how many of the k
+    candidates are worth sending: candidates under `min_score` are dropped and,
+    past `min_candidates`, the pool is cut at the largest score drop if that drop
+    is at least `knee_gap`. Each remaining candidate is truncated to `max_tokens`
+    for the rerank call only; the full documents are returned with their
+    `relevance_score`.
+
+    BM25 and hybrid candidates only carry `bm25_score` / `rrf_score`, which are
+    on another scale than the thresholds, so a pool where any candidate lacks
+    `score` is sent whole; that bypass is logged and counted as
+    `rerank.adaptive_bypassed`.
+    """
+
+    reranker: CohereRerank
+    min_score: float = 0.0
+    knee_gap: float = 0.05
+    min_candidates: int = 20
+    max_tokens: int = 512
+
+    class Config:
+        arbitrary_types_allowed = True
+
+    def select_candidates(self, documents: Sequence[Document]) -> List[Document]:
+        if not documents:
+            return []
+        scores = [doc.metadata.get("score") for doc in documents]
+        missing = sum(score is None for score in scores)
+        if missing:
+            metrics.incr("rerank.adaptive_bypassed")
+            logger.info(
+                f"Adaptive rerank pool bypassed: {missing}/{len(documents)} candidates "
+                f"have no dense score, sending all of them"
+            )
+            return list(documents)
+
+        floor = max(self.min_candidates, self.reranker.top_n or 0)
+        ranked = sorted(zip(scores, documents), key=lambda pair: pair[0], reverse=True)
+        kept = [pair for pair in ranked if pair[0] >= self.min_score]
+        if len(kept) < floor:
+            kept = ranked[: max(len(kept), min(floor, len(ranked)))]
+
+        cut, gap = len(kept), 0.0
+        for i in range(floor, len(kept)):
+            drop = kept[i - 1][0] - kept[i][0]
+            if drop > gap:
+                cut, gap = i, drop
+        if gap < self.knee_gap:
+            cut = len(kept)
+
+        logger.info(
+            f"Adaptive rerank pool: {len(documents)} -> {cut} candidates "
+            f"(scores {ranked[0][0]:.3f}..{ranked[-1][0]:.3f}, min_score {self.min_score}, "
+            f"largest gap {gap:.3f} after {floor} candidates, knee_gap {self.knee_gap})"
+        )
+        return [doc for _, doc in kept[:cut]]
+
+    def compress_documents(
+        self,
+        documents: Sequence[Document],
+        query: str,
+        callbacks: Optional[Callbacks] = None,
+    ) -> Sequence[Document]:
+        candidates = self.select_candidates(documents)
+        trimmed = [
+            Document(
+                page_content=truncate_tokens(doc.page_content, self.max_tokens),
+                metadata=doc.metadata,
+            )
+            for doc in candidates
+        ]
+        truncated = sum(
+            1
+            for doc, short in zip(candidates, trimmed)
+            if len(short.page_content) < len(doc.page_content)
+        )
+        metrics.incr("rerank.candidates_in", len(documents))
+        metrics.incr("rerank.candidates_sent", len(candidates))
+        metrics.incr("rerank.candidates_truncated", truncated)
+        logger.debug(f"Truncated {truncated}/{len(candidates)} candidates to {self.max_tokens} tokens")
+
+        compressed = []
+        for res in self.reranker.rerank(trimmed, query):
+            doc = candidates[res["index"]]
+            doc_copy = Document(doc.page_content, metadata=dict(doc.metadata))
+            doc_copy.metadata["relevance_score"] = res["relevance_score"]
+            compressed.append(doc_copy)
+        return compressed
@@ -0,0 +1,315 @@
+import asyncio
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, List, Optional
+
+from langchain.retrievers.multi_query import LineListOutputParser
+from langchain_core.callbacks import (
+    AsyncCallbackManagerForRetrieverRun,
+    CallbackManagerForRetrieverRun,
+)
+from langchain_core.documents import Document
+from langchain_core.prompts import BasePromptTemplate
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.runnables import Runnable
+from langchain_core.runnables.config import run_in_executor
+
+from core.metrics import metrics
+from log_config import configure_logging
+
+# Configure logging
+logger = configure_logging(__name__)
+
+
+class PineconeRetriever(BaseRetriever):
+    """
+    Dense retriever over a Pinecone index that keeps the vector `id` and similarity
+    `score` of every match in the document metadata, so later stages can dedup and
+    cut candidates without re-embedding.
+    """
+
+    index: Any
+    embeddings: Any
+    namespace: Optional[str] = None
+    k: int = 50
+    text_key: str = "text"
+
+    def search_by_vector(self, vector, k: Optional[int] = None) -> List[Document]:
+        if hasattr(vector, "tolist"):
+            vector = vector.tolist()
+        results = self.index.query(
+            vector=vector,
+            top_k=k or self.k,
+            include_metadata=True,
+            namespace=self.namespace,
+        )
+        docs = []
+        for match in results["matches"]:
+            metadata = dict(match["metadata"])
+            text = metadata.pop(self.text_key, None)
+            if text is None:
+                logger.warning(f"Found document with no `{self.text_key}` key. Skipping.")
+                continue
+            metadata["id"] = match["id"]
+            metadata["score"] = match["score"]
+            docs.append(Document(page_content=text, metadata=metadata))
+        return docs
+
+    async def asearch_by_vector(self, vector, k: Optional[int] = None) -> List[Document]:
+        return await run_in_executor(None, self.search_by_vector, vector, k)
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        return self.search_by_vector(self.embeddings.embed_query(query))
+
+    async def _aget_relevant_documents(
+        self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        vector = await self.embeddings.aembed_query(query)
+        return await self.asearch_by_vector(vector)
+
+
+def merge_by_id(results: Iterable[List[Document]]) -> List[Document]:
+    """
+    Union of several result lists keyed by vector id, keeping the best score of
+    each chunk, ordered by that score.
+    """
+    merged: Dict[str, Document] = {}
+    for docs in results:
+        for doc in docs:
+            key = doc.metadata.get("id") or doc.page_content
+            current = merged.get(key)
+            if current is None or doc.metadata.get("score", 0) > current.metadata.get("score", 0):
+                merged[key] = doc
+    return sorted(merged.values(), key=lambda doc: doc.metadata.get("score", 0), reverse=True)
+
+
+class FanOutMultiQueryRetriever(BaseRetriever):
+    """
+    Drop-in replacement for MultiQueryRetriever.
+
+    The LLM reformulations are searched concurrently (bounded by `max_concurrency`)
+    and the results are merged by vector id before they reach the reranker, so a
+    chunk found by several sub-queries is only sent to Cohere once. Sub-query
+    latencies are recorded under `retrieval.subquery_ms` and the gap between the
+    slowest and the median sub-query under `retrieval.fanout_tail_ms`.
+    """
+
+    retriever: BaseRetriever
+    llm_chain: Runnable
+    max_concurrency: int = 4
+    include_original: bool = False
+
+    @classmethod
+    def from_llm(
+        cls,
+        retriever: BaseRetriever,
+        llm: Any,
+        prompt: BasePromptTemplate,
+        **kwargs,
+    ) -> "FanOutMultiQueryRetriever":
+        return cls(retriever=retriever, llm_chain=prompt | llm | LineListOutputParser(), **kwargs)
+
+    def _queries(self, query: str, generated: List[str]) -> List[str]:
+        queries = [q.strip() for q in generated if q.strip()]
+        if self.include_original:
+            queries.append(query)
+        return list(dict.fromkeys(queries)) or [query]
+
+    def _record(self, timings: List[float], total_ms: float, candidates: int, unique: int):
+        for elapsed in timings:
+            metrics.observe("retrieval.subquery_ms", elapsed)
+        tail = max(timings) - statistics.median(timings)
+        metrics.observe("retrieval.fanout_ms", total_ms)
+        metrics.observe("retrieval.fanout_tail_ms", tail)
+        metrics.incr("retrieval.candidates", candidates)
+        metrics.incr("retrieval.duplicates", candidates - unique)
+        logger.info(
+            f"Multi-query fan-out: {len(timings)} sub-queries in {total_ms:.0f}ms "
+            f"(sub-query ms {[round(t) for t in timings]}, tail {tail:.0f}ms), "
+            f"{candidates} candidates -> {unique} unique"
+        )
+
+    async def _aget_relevant_documents(
+        self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        generated = await self.llm_chain.ainvoke(
+            {"question": query}, config={"callbacks": run_manager.get_child()}
+        )
+        queries = self._queries(query, generated)
+        logger.debug(f"Generated queries: {queries}")
+
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def search(sub_query: str):
+            async with semaphore:
+                start = time.perf_counter()
+                docs = await self.retriever.ainvoke(
+                    sub_query, config={"callbacks": run_manager.get_child()}
+                )
+                return docs, (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        results = await asyncio.gather(*(search(q) for q in queries))
+        merged = merge_by_id(docs for docs, _ in results)
+        self._record(
+            [elapsed for _, elapsed in results],
+            (time.perf_counter() - start) * 1000,
+            sum(len(docs) for docs, _ in results),
+            len(merged),
+        )
+        return merged
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        generated = self.llm_chain.invoke(
+            {"question": query}, config={"callbacks": run_manager.get_child()}
+        )
+        queries = self._queries(query, generated)
+        logger.debug(f"Generated queries: {queries}")
+
+        def search(sub_query: str):
+            start = time.perf_counter()
+            docs = self.retriever.invoke(
+                sub_query, config={"callbacks": run_manager.get_child()}
+            )
+            return docs, (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+            results = list(executor.map(search, queries))
+        merged = merge_by_id(docs for docs, _ in results)
+        self._record(
+            [elapsed for _, elapsed in results],
+            (time.perf_counter() - start) * 1000,
+            sum(len(docs) for docs, _ in results),
+            len(merged),
+        )
+        return merged
+
+
+def reciprocal_rank_fusion(results: Iterable[List[Document]], k: int = 60) -> List[Document]:
+    """
+    Fuse ranked lists by summing 1 / (k + rank) per vector id. The first copy of a
+    chunk is kept (dense results come first, so their `score` survives) and the
+    fused value is stored as `rrf_score`.
+    """
+    fused: Dict[str, float] = {}
+    documents: Dict[str, Document] = {}
+    for docs in results:
+        for rank, doc in enumerate(docs, start=1):
+            key = doc.metadata.get("id") or doc.page_content
+            fused[key] = fused.get(key, 0.0) + 1.0 / (k + rank)
+            documents.setdefault(key, doc)
+    ranked = sorted(fused, key=fused.get, reverse=True)
+    for key in ranked:
+        documents[key].metadata["rrf_score"] = fused[key]
+    return [documents[key] for key in ranked]
+
+
+class HybridRetriever(BaseRetriever):
+    """
+    Dense retriever fused with the local BM25 index by reciprocal-rank fusion.
+
+    Exact terms (article numbers, statute and chamber names) that dense search
+    misses come in through BM25, which is what the LLM multi-query expansion was
+    compensating for. Both searches run concurrently on the async path.
+    """
+
+    dense: BaseRetriever
+    lexical: Any
+    lexical_k: int = 20
+    rrf_k: int = 60
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        dense_docs = self.dense.invoke(query, config={"callbacks": run_manager.get_child()})
+        lexical_docs = self.lexical.get_documents(query, self.lexical_k)
+        return reciprocal_rank_fusion([dense_docs, lexical_docs], self.rrf_k)
+
+    async def _aget_relevant_documents(
+        self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        start = time.perf_counter()
+        dense_docs, lexical_docs = await asyncio.gather(
+            self.dense.ainvoke(query, config={"callbacks": run_manager.get_child()}),
+            run_in_executor(None, self.lexical.get_documents, query, self.lexical_k),
+        )
+        fused = reciprocal_rank_fusion([dense_docs, lexical_docs], self.rrf_k)
+        metrics.observe("retrieval.hybrid_ms", (time.perf_counter() - start) * 1000)
+        logger.info(
+            f"Hybrid retrieval: {len(dense_docs)} dense + {len(lexical_docs)} BM25 -> {len(fused)} fused"
+        )
+        return fused
+
+
+class MultiNamespaceRetriever(BaseRetriever):
+    """
+    Searches several namespaces of one index concurrently and merges the results
+    by vector id and score, so one combined candidate set reaches the reranker
+    without classifying the question first. Each document gets its `namespace`
+    in the metadata and per-namespace latency is recorded under
+    `retrieval.namespace_ms.<namespace>`.
+    """
+
+    retrievers: Dict[str, BaseRetriever]
+    embeddings: Any = None
+
+    def _merge(self, results: Dict[str, List[Document]], timings: Dict[str, float]) -> List[Document]:
+        for namespace, docs in results.items():
+            for doc in docs:
+                doc.metadata["namespace"] = namespace
+            metrics.observe(f"retrieval.namespace_ms.{namespace}", timings[namespace])
+        merged = merge_by_id(results.values())
+        logger.info(
+            "Multi-namespace retrieval: "
+            + ", ".join(
+                f"{namespace} {len(docs)} docs in {timings[namespace]:.0f}ms"
+                for namespace, docs in results.items()
+            )
+            + f" -> {len(merged)} merged"
+        )
+        return merged
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        def search(namespace: str):
+            start = time.perf_counter()
+            docs = self.retrievers[namespace].invoke(
+                query, config={"callbacks": run_manager.get_child()}
+            )
+            return docs, (time.perf_counter() - start) * 1000
+
+        with ThreadPoolExecutor(max_workers=len(self.retrievers)) as executor:
+            results = dict(zip(self.retrievers, executor.map(search, self.retrievers)))
+        return self._merge(
+            {namespace: docs for namespace, (docs, _) in results.items()},
+            {namespace: elapsed for namespace, (_, elapsed) in results.items()},
+        )
+
+    async def _aget_relevant_documents(
+        self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        if self.embeddings is not None:
+            # Embed once up front so every namespace search hits the embedding cache.
+            await self.embeddings.aembed_query(query)
+
+        async def search(namespace: str):
+            start = time.perf_counter()
+            docs = await self.retrievers[namespace].ainvoke(
+                query, config={"callbacks": run_manager.get_child()}
+            )
+            return docs, (time.perf_counter() - start) * 1000
+
+        results = dict(
+            zip(self.retrievers, await asyncio.gather(*(search(ns) for ns in self.retrievers)))
+        )
+        return self._merge(
+            {namespace: docs for namespace, (docs, _) in results.items()},
+            {namespace: elapsed for namespace, (_, elapsed) in results.items()},
+        )
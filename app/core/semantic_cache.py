@@ -0,0 +1,141 @@
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+
+from log_config import configure_logging
+
+# Configure logging
+logger = configure_logging(__name__)
+
+
+class SemanticCache:
+    """
+    Answer cache looked up by cosine similarity of the question embedding.
+
+    Embeddings live in a single float32 matrix of unit-normalized rows, so a lookup
+    is one matrix-vector product even with tens of thousands of entries. The matrix
+    grows by doubling up to `maxsize`; after that an expired entry is overwritten
+    first, then the least recently used one. Every entry belongs to a `version` (index name, namespace and data
+    version); looking up or adding with a different version drops the whole cache.
+    """
+
+    def __init__(
+        self,
+        threshold: float = 0.95,
+        maxsize: int = 10000,
+        ttl: Optional[float] = None,
+        initial_capacity: int = 256,
+    ):
+        self.threshold = threshold
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.initial_capacity = initial_capacity
+        self.version: Optional[str] = None
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._matrix: Optional[np.ndarray] = None
+        self._expires_at = np.empty(0, dtype=np.float64)
+        self._last_used = np.empty(0, dtype=np.float64)
+        self._answers = []
+        self._questions = []
+        self._size = 0
+
+    def _check_version(self, version: str):
+        if version != self.version:
+            if self.version is not None:
+                logger.info(
+                    f"Semantic cache version changed {self.version} -> {version}, dropping {self._size} entries"
+                )
+            self.version = version
+            self._reset()
+
+    @staticmethod
+    def _normalize(vector) -> np.ndarray:
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def lookup(self, vector, version: str) -> Optional[Tuple[Any, float, str]]:
+        """
+        Return (answer, similarity, cached question) of the closest entry above the threshold.
+        """
+        query = self._normalize(vector)
+        with self._lock:
+            self._check_version(version)
+            if self._size == 0:
+                self.misses += 1
+                return None
+            scores = self._matrix[: self._size] @ query
+            now = time.monotonic()
+            if self.ttl:
+                scores[self._expires_at[: self._size] <= now] = -np.inf
+            best = int(np.argmax(scores))
+            similarity = float(scores[best])
+            if similarity < self.threshold:
+                self.misses += 1
+                return None
+            self._last_used[best] = now
+            self.hits += 1
+            return self._answers[best], similarity, self._questions[best]
+
+    def add(self, vector, answer: Any, version: str, question: str = ""):
+        row = self._normalize(vector)
+        now = time.monotonic()
+        with self._lock:
+            self._check_version(version)
+            if self._matrix is None:
+                self._allocate(min(self.initial_capacity, self.maxsize), row.shape[0])
+            if self._size < self.maxsize:
+                if self._size == self._matrix.shape[0]:
+                    self._allocate(min(self._size * 2, self.maxsize), row.shape[0])
+                slot = self._size
+                self._size += 1
+                self._answers.append(answer)
+                self._questions.append(question)
+            else:
+                slot = self._victim(now)
+                self._answers[slot] = answer
+                self._questions[slot] = question
+            self._matrix[slot] = row
+            self._last_used[slot] = now
+            self._expires_at[slot] = now + self.ttl if self.ttl else np.inf
+
+    def _victim(self, now: float) -> int:
+        """Slot to overwrite in a full cache: an expired entry, else the least recently used."""
+        last_used = self._last_used[: self._size]
+        expired = self._expires_at[: self._size] <= now
+        return int(np.argmin(np.where(expired, -np.inf, last_used)))
+
+    def _allocate(self, capacity: int, dimension: int):
+        matrix = np.zeros((capacity, dimension), dtype=np.float32)
+        expires_at = np.full(capacity, np.inf, dtype=np.float64)
+        last_used = np.zeros(capacity, dtype=np.float64)
+        if self._matrix is not None:
+            matrix[: self._size] = self._matrix[: self._size]
+            expires_at[: self._size] = self._expires_at[: self._size]
+            last_used[: self._size] = self._last_used[: self._size]
+        self._matrix, self._expires_at, self._last_used = matrix, expires_at, last_used
+
+    def clear(self):
+        with self._lock:
+            self._reset()
+
+    def __len__(self) -> int:
+        return self._size
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "version": self.version,
+            "size": self._size,
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
@@ -0,0 +1,101 @@
+import math
+import re
+from typing import List, Sequence
+
+from langchain_core.documents import Document
+
+from core.metrics import metrics
+from core.text import count_tokens, tokenize, truncate_tokens
+from log_config import configure_logging
+
+# Configure logging
+logger = configure_logging(__name__)
+
+# Sentence ends, semicolons and line breaks; court decisions often run one
+# sentence over a whole paragraph, so ";" is a boundary as well.
+_SENTENCE_END = re.compile(r"(?<=[.!?;:])\s+|\n+")
+GAP = " … "
+
+
+def split_sentences(text: str) -> List[str]:
+    return [sentence.strip() for sentence in _SENTENCE_END.split(text or "") if sentence.strip()]
+
+
+def select_snippets(text: str, query: str, max_tokens: int) -> str:
+    """
+    The sentences of `text` that best match `query`, in document order, within
+    `max_tokens` (cl100k tokens).
+
+    Sentences are scored by the query terms they contain (BM25 tokens, weighted
+    by how rare the term is among the sentences of the text) and taken best
+    first while they fit; sentences without a query term are left out and
+    skipped stretches are marked with "…". Text without any query term keeps
+    its opening sentences.
+    """
+    if count_tokens(text) <= max_tokens:
+        return text
+    sentences = split_sentences(text)
+    terms = set(tokenize(query))
+    sentence_terms = [set(tokenize(sentence)) & terms for sentence in sentences]
+    weights = {
+        term: math.log(1 + len(sentences) / sum(term in found for found in sentence_terms))
+        for term in set().union(*sentence_terms)
+    }
+    scores = [sum(weights[term] for term in found) for found in sentence_terms]
+
+    order = sorted(range(len(sentences)), key=lambda i: (-scores[i], i))
+    if scores[order[0]] > 0:
+        order = [i for i in order if scores[i] > 0]
+    chosen, used = set(), 0
+    for i in order:
+        tokens = count_tokens(sentences[i]) + 1
+        if used + tokens > max_tokens:
+            continue
+        chosen.add(i)
+        used += tokens
+    if not chosen:
+        return truncate_tokens(sentences[order[0]], max_tokens)
+
+    parts, previous = [], -1
+    for i in sorted(chosen):
+        if parts and i != previous + 1:
+            parts.append(GAP)
+        elif parts:
+            parts.append(" ")
+        parts.append(sentences[i])
+        previous = i
+    if min(chosen) > 0:
+        parts.insert(0, GAP.lstrip())
+    return "".join(parts)
+
+
+def compact_documents(
+    documents: Sequence[Document], query: str, max_tokens: int, name: str = "tool"
+) -> str:
+    """
+    Tool output for the agent LLM: one block per document with its `source_link`
+    and the snippets of it that match `query`, all within `max_tokens`.
+
+    Documents keep their (rerank) order; each gets an equal share of what is
+    left of the budget, so a short document leaves room for the next ones.
+    """
+    tokens_in = 0
+    blocks, remaining = [], max_tokens
+    for position, doc in enumerate(documents):
+        tokens_in += count_tokens(doc.page_content)
+        header = f"Kaynak: {doc.metadata.get('source_link', '')}\n"
+        share = remaining // (len(documents) - position) - count_tokens(header)
+        if share <= 0:
+            continue
+        block = header + select_snippets(doc.page_content, query, share)
+        remaining -= count_tokens(block)
+        blocks.append(block)
+    output = "\n\n".join(blocks)
+
+    tokens_out = count_tokens(output)
+    metrics.incr(f"tool_output.{name}.tokens_in", tokens_in)
+    metrics.incr(f"tool_output.{name}.tokens_out", tokens_out)
+    logger.debug(
+        f"Compacted {len(documents)} documents for {name}: {tokens_in} -> {tokens_out} tokens"
+    )
+    return output
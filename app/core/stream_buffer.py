@@ -0,0 +1,247 @@
+import asyncio
+import hashlib
+import uuid
+from collections import deque
+from typing import Any, AsyncIterator, Dict, Hashable, Optional, Tuple
+
+from core.cache import TTLCache
+from core.config import settings
+from core.metrics import metrics
+from core.streaming import DELTA, CumulativeTranscoder
+from log_config import configure_logging
+
+# Configure logging
+logger = configure_logging(__name__)
+
+
+class StreamGone(Exception):
+    """The frames a reader needs were dropped from the ring buffer."""
+
+
+class StreamBuffer:
+    """
+    Frames produced by one streamed answer, kept in a ring buffer of at most
+    `max_bytes`.
+
+    Generation runs in its own task and publishes every SSE payload with a
+    sequence number, so readers can come and go: a reader attaching with the last
+    sequence it saw gets the missing frames replayed and then follows the live
+    generation. The generator streams the delta protocol; cumulative readers get
+    the payloads re-encoded from the first frame (see `events`), so the buffer
+    grows linearly with the answer.
+
+    When the last reader leaves before the answer is finished, the generation is
+    cancelled after `grace_seconds` unless a reader comes back; the same timer runs
+    from `start` until the first reader attaches, for a client gone before the
+    response is first read. A disconnect therefore stops the LLM that much later
+    than without resume, and the generator must not use anything scoped to the
+    request it started from.
+
+    The buffer keeps a hash of the question it answers, so a reconnect is only
+    resumed for the same question (see `StreamHub.resume`).
+    """
+
+    def __init__(
+        self,
+        stream_id: str,
+        owner: Hashable,
+        question: str = "",
+        max_bytes: int = 262144,
+        grace_seconds: float = 15,
+    ):
+        self.id = stream_id
+        self.owner = owner
+        self.question_hash = question_hash(question)
+        self.grace_seconds = grace_seconds
+        self.max_bytes = max_bytes
+        self.frames: deque = deque()
+        self.size = 0
+        # Sequence of the last frame evicted to stay within max_bytes.
+        self.dropped = 0
+        self.seq = 0
+        self.done = False
+        self.readers = 0
+        self.task: Optional[asyncio.Task] = None
+        self._changed = asyncio.Event()
+        self._cancel_handle: Optional[asyncio.TimerHandle] = None
+
+    def _notify(self):
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    def publish(self, data: str):
+        self.seq += 1
+        size = len(data.encode("utf-8"))
+        self.frames.append((self.seq, data, size))
+        self.size += size
+        while self.size > self.max_bytes and len(self.frames) > 1:
+            seq, _, size = self.frames.popleft()
+            self.size -= size
+            self.dropped = seq
+        self._notify()
+
+    def holds(self, after: int) -> bool:
+        """Whether every frame after `after` is still in the buffer."""
+        return after >= self.dropped
+
+    def start(self, generator: AsyncIterator[str]):
+        async def run():
+            try:
+                async for data in generator:
+                    self.publish(data)
+            finally:
+                self.done = True
+                self._notify()
+
+        self.task = asyncio.create_task(run())
+        # Cancelled by the first reader (see frames_after).
+        self._cancel_handle = asyncio.get_running_loop().call_later(
+            self.grace_seconds, self._cancel_if_abandoned
+        )
+
+    def _schedule_cancel(self):
+        if self.grace_seconds <= 0:
+            self._cancel_if_abandoned()
+            return
+        self._cancel_handle = asyncio.get_running_loop().call_later(
+            self.grace_seconds, self._cancel_if_abandoned
+        )
+
+    def _cancel_if_abandoned(self):
+        self._cancel_handle = None
+        if self.readers == 0 and not self.done and self.task is not None:
+            logger.info(f"No reader came back for stream {self.id}, cancelling generation")
+            metrics.incr("streaming.abandoned")
+            self.task.cancel()
+
+    async def frames_after(self, after: int = 0) -> AsyncIterator[Tuple[int, str]]:
+        """Yield (seq, data) for every frame after `after`, following the live generation."""
+        self.readers += 1
+        if self._cancel_handle is not None:
+            self._cancel_handle.cancel()
+            self._cancel_handle = None
+        try:
+            while True:
+                changed = self._changed
+                if not self.holds(after):
+                    raise StreamGone(f"Stream {self.id} no longer holds frames after {after}")
+                for seq, data, _ in list(self.frames):
+                    if seq > after:
+                        after = seq
+                        yield seq, data
+                if self.done and after >= self.seq:
+                    return
+                await changed.wait()
+        finally:
+            self.readers -= 1
+            if self.readers == 0 and not self.done:
+                self._schedule_cancel()
+
+    async def events(self, after: int = 0, protocol: int = DELTA) -> AsyncIterator[Dict[str, Any]]:
+        """
+        SSE events after `after` with `<stream id>:<seq>` ids, the format expected
+        back in Last-Event-ID. Cumulative readers get every payload re-encoded, so
+        their replay reads the buffer from the start.
+        """
+        if protocol == DELTA:
+            async for seq, data in self.frames_after(after):
+                yield {"id": f"{self.id}:{seq}", "data": data}
+            return
+        transcoder = CumulativeTranscoder()
+        async for seq, data in self.frames_after(0):
+            payload = transcoder.encode(data)
+            if seq > after and payload is not None:
+                yield {"id": f"{self.id}:{seq}", "data": payload}
+
+
+def question_hash(question: str) -> str:
+    return hashlib.sha256(question.encode("utf-8")).hexdigest()
+
+
+def parse_last_event_id(value: Optional[str]) -> Optional[Tuple[str, int]]:
+    if not value or ":" not in value:
+        return None
+    stream_id, _, seq = value.strip().rpartition(":")
+    if not stream_id or not seq.isdigit():
+        return None
+    return stream_id, int(seq)
+
+
+class StreamHub:
+    """
+    Live and recently finished streams of this worker, looked up by stream id.
+
+    Buffers live in process memory, so a reconnect is only resumed when it reaches
+    the worker that produced the stream (sticky sessions); otherwise the request
+    is served as a new question.
+    """
+
+    def __init__(
+        self,
+        max_streams: int = 1000,
+        ttl: float = 600,
+        max_bytes: int = 262144,
+        grace_seconds: float = 15,
+    ):
+        self.max_bytes = max_bytes
+        self.grace_seconds = grace_seconds
+        self.streams = TTLCache(maxsize=max_streams, ttl=ttl)
+
+    def start(
+        self, generator: AsyncIterator[str], owner: Hashable, question: str
+    ) -> StreamBuffer:
+        stream = StreamBuffer(
+            uuid.uuid4().hex,
+            owner,
+            question,
+            max_bytes=self.max_bytes,
+            grace_seconds=self.grace_seconds,
+        )
+        stream.start(generator)
+        self.streams.set(stream.id, stream)
+        return stream
+
+    def resume(
+        self,
+        last_event_id: Optional[str],
+        owner: Hashable,
+        question: str,
+        protocol: int = DELTA,
+    ) -> Optional[AsyncIterator]:
+        """
+        Events after `last_event_id` of a stream owned by `owner` that answers
+        `question`, encoded for `protocol`, or None when there is nothing to resume
+        (no id, unknown or expired stream, another question, frames dropped).
+        """
+        parsed = parse_last_event_id(last_event_id)
+        if parsed is None:
+            return None
+        stream_id, after = parsed
+        stream = self.streams.get(stream_id)
+        if stream is None or stream.owner != owner:
+            logger.info(f"Cannot resume stream {stream_id}: unknown on this worker")
+            return None
+        if stream.question_hash != question_hash(question):
+            # A new question sent with the id of an earlier answer.
+            logger.info(f"Cannot resume stream {stream_id}: it answers another question")
+            metrics.incr("streaming.resume_question_mismatch")
+            return None
+        if not stream.holds(after if protocol == DELTA else 0):
+            logger.info(f"Cannot resume stream {stream_id}: frames after {after} were dropped")
+            return None
+        metrics.incr("streaming.resumed")
+        metrics.incr("streaming.replayed_frames", max(0, stream.seq - after))
+        logger.info(f"Resuming stream {stream_id} after event {after} (live: {not stream.done})")
+        return stream.events(after, protocol)
+
+    def stats(self) -> Dict[str, Any]:
+        return self.streams.stats()
+
+
+stream_hub = StreamHub(
+    max_streams=settings.STREAM_BUFFER_MAX_STREAMS,
+    ttl=settings.STREAM_BUFFER_TTL_SECONDS,
+    max_bytes=settings.STREAM_BUFFER_MAX_BYTES,
+    grace_seconds=settings.STREAM_RESUME_GRACE_SECONDS,
+)
+metrics.register_gauge("stream_buffers", stream_hub.stats)
@@ -0,0 +1,312 @@
+import asyncio
+import hashlib
+import json
+import statistics
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Awaitable, Dict, Optional, Tuple
+
+import anyio
+from starlette.requests import Request
+
+from core.metrics import metrics
+from core.text import count_tokens
+
+# Streaming protocol versions of the SSE chat endpoints.
+# 1: every event carries the whole text produced so far (default, existing clients).
+# 2: every event carries only the new text with a sequence number, followed by a
+#    final "complete" event with the length and sha256 of each streamed text.
+CUMULATIVE = 1
+DELTA = 2
+
+PROTOCOL_HEADER = "X-Stream-Protocol"
+PROTOCOL_QUERY_PARAM = "stream_protocol"
+_PROTOCOL_NAMES = {
+    "1": CUMULATIVE,
+    "v1": CUMULATIVE,
+    "cumulative": CUMULATIVE,
+    "2": DELTA,
+    "v2": DELTA,
+    "delta": DELTA,
+}
+
+
+def negotiate_protocol(request: Optional[Request]) -> int:
+    """Protocol asked for by the `X-Stream-Protocol` header or `stream_protocol` query param."""
+    if request is None:
+        return CUMULATIVE
+    value = request.headers.get(PROTOCOL_HEADER) or request.query_params.get(
+        PROTOCOL_QUERY_PARAM
+    )
+    return _PROTOCOL_NAMES.get((value or "").strip().lower(), CUMULATIVE)
+
+
+class StreamEncoder:
+    """
+    Builds the SSE payloads of one streamed answer for the negotiated protocol.
+
+    Text streams (answer, session title) are fed token by token with `text`;
+    single values (file name, s3 key, errors) with `value`. In the cumulative
+    protocol the encoder keeps the text so far and resends it; in the delta
+    protocol it only hashes it, so encoding cost stays linear in the answer length.
+    """
+
+    def __init__(self, protocol: int = CUMULATIVE):
+        self.protocol = protocol
+        self.seq = 0
+        self._texts: Dict[int, str] = {}
+        self._lengths: Dict[int, int] = {}
+        self._hashes: Dict[int, Any] = {}
+
+    def _dump(self, message: dict, **fields) -> str:
+        self.seq += 1
+        if self.protocol == DELTA:
+            return json.dumps({"v": DELTA, "seq": self.seq, **fields, "message": message})
+        return json.dumps({"message": message})
+
+    def text(self, data_type: int, delta: str) -> Optional[str]:
+        """Payload for `delta` appended to the text stream `data_type`, None if empty."""
+        if not delta:
+            return None
+        if self.protocol == DELTA:
+            self._lengths[data_type] = self._lengths.get(data_type, 0) + len(delta)
+            self._hashes.setdefault(data_type, hashlib.sha256()).update(delta.encode("utf-8"))
+            return self._dump({"data_type": data_type, "delta": delta})
+        content = self._texts.get(data_type, "") + delta
+        self._texts[data_type] = content
+        return self._dump({"data_type": data_type, "content": content})
+
+    def value(self, data_type: int, content) -> str:
+        """Payload for a message that is sent once as a whole."""
+        return self._dump({"data_type": data_type, "content": content})
+
+    def complete(self) -> Optional[str]:
+        """Final event of the delta protocol; the cumulative protocol has none."""
+        if self.protocol != DELTA:
+            return None
+        self.seq += 1
+        return json.dumps(
+            {
+                "v": DELTA,
+                "seq": self.seq,
+                "event": "complete",
+                "lengths": {str(t): length for t, length in self._lengths.items()},
+                "sha256": {str(t): h.hexdigest() for t, h in self._hashes.items()},
+            }
+        )
+
+
+class CumulativeTranscoder:
+    """
+    Turns the delta protocol payloads of one answer back into cumulative ones.
+
+    Buffered streams (core/stream_buffer.py) keep the delta payloads only, so a
+    resumable answer costs memory linear in its length; cumulative readers get
+    them re-encoded, in order from the first payload.
+    """
+
+    def __init__(self):
+        self.encoder = StreamEncoder(CUMULATIVE)
+
+    def encode(self, data: str) -> Optional[str]:
+        """Cumulative payload for a delta payload, None for the final "complete" event."""
+        message = json.loads(data).get("message")
+        if message is None:
+            return None
+        if "delta" in message:
+            return self.encoder.text(message["data_type"], message["delta"])
+        return self.encoder.value(message["data_type"], message["content"])
+
+
+_END = object()
+
+
+async def coalesce_tokens(
+    tokens: AsyncIterator[str],
+    window_ms: float = 30,
+    max_bytes: int = 512,
+    name: str = "answer",
+) -> AsyncIterator[str]:
+    """
+    Merge streamed LLM tokens into fewer, larger chunks for the SSE response.
+
+    The first token is passed through at once so time to first token does not
+    change. Later tokens are buffered and flushed when `window_ms` has passed since
+    the first buffered token or the buffer reaches `max_bytes`, whichever comes
+    first, even if the LLM pauses. A `window_ms` of 0 disables coalescing.
+
+    The source is consumed by one producer task, which is cancelled when the
+    consumer stops early. The delay of every flush is recorded as
+    `streaming.flush_delay_ms`, events and tokens per stream as
+    `streaming.events_per_<name>` and `streaming.tokens_per_<name>`.
+    """
+    queue: asyncio.Queue = asyncio.Queue()
+
+    async def produce():
+        try:
+            async for token in tokens:
+                if token:
+                    queue.put_nowait(token)
+        except Exception as e:
+            queue.put_nowait((_END, e))
+        else:
+            queue.put_nowait((_END, None))
+
+    producer = asyncio.create_task(produce())
+    window = window_ms / 1000
+    buffer, size, started = [], 0, 0.0
+    events = received = 0
+    # A pending queue.get() kept across flushes: asyncio.wait_for could lose a
+    # cancellation that arrives just as the get completes (Python < 3.12).
+    getter = None
+
+    def flush() -> str:
+        nonlocal buffer, size, events
+        metrics.observe("streaming.flush_delay_ms", (time.perf_counter() - started) * 1000)
+        events += 1
+        chunk, buffer, size = "".join(buffer), [], 0
+        return chunk
+
+    try:
+        while True:
+            if getter is None:
+                getter = asyncio.ensure_future(queue.get())
+            if buffer:
+                timeout = started + window - time.perf_counter()
+                if timeout > 0:
+                    await asyncio.wait({getter}, timeout=timeout)
+                if not getter.done():
+                    yield flush()
+                    continue
+            item = await getter
+            getter = None
+
+            if isinstance(item, tuple):
+                if item[1] is not None:
+                    raise item[1]
+                break
+            received += 1
+            if window <= 0 or events == 0:
+                events += 1
+                yield item
+                continue
+            if not buffer:
+                started = time.perf_counter()
+            buffer.append(item)
+            size += len(item.encode("utf-8"))
+            if size >= max_bytes or time.perf_counter() - started >= window:
+                yield flush()
+
+        if buffer:
+            yield flush()
+    finally:
+        for task in (producer, getter):
+            if task is not None and not task.done():
+                task.cancel()
+        metrics.observe(f"streaming.events_per_{name}", events)
+        metrics.observe(f"streaming.tokens_per_{name}", received)
+
+
+class PrefetchedStream:
+    """
+    Starts consuming a text stream right away, so it is generated while the
+    caller is still busy (e.g. with agent setup); iterating it replays what was
+    buffered and then follows the stream. `cancel` stops it if it is never read.
+    """
+
+    def __init__(self, stream: AsyncIterator[str]):
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._produce(stream))
+
+    async def _produce(self, stream: AsyncIterator[str]):
+        try:
+            async for text in stream:
+                self._queue.put_nowait(text)
+        except Exception as e:
+            self._queue.put_nowait((_END, e))
+        else:
+            self._queue.put_nowait((_END, None))
+
+    async def __aiter__(self):
+        while True:
+            item = await self._queue.get()
+            if isinstance(item, tuple):
+                if item[1] is not None:
+                    raise item[1]
+                return
+            yield item
+
+    def cancel(self):
+        if not self._task.done():
+            self._task.cancel()
+
+
+async def merge_streams(streams: Dict[int, AsyncIterator[str]]) -> AsyncIterator[Tuple[int, str]]:
+    """
+    Interleave several text streams, keyed by their data type, in arrival order.
+
+    Yields (data_type, text) until every stream is exhausted. Each stream is
+    consumed by its own task; an error in one is raised to the consumer, and
+    the remaining tasks are cancelled when the consumer stops early.
+    """
+    queue: asyncio.Queue = asyncio.Queue()
+
+    async def produce(data_type: int, stream: AsyncIterator[str]):
+        try:
+            async for text in stream:
+                queue.put_nowait((data_type, text))
+        except Exception as e:
+            queue.put_nowait((_END, e))
+        else:
+            queue.put_nowait((_END, None))
+
+    producers = [
+        asyncio.create_task(produce(data_type, stream)) for data_type, stream in streams.items()
+    ]
+    try:
+        running = len(producers)
+        while running:
+            data_type, item = await queue.get()
+            if data_type is _END:
+                if item is not None:
+                    raise item
+                running -= 1
+                continue
+            yield data_type, item
+    finally:
+        for producer in producers:
+            if not producer.done():
+                producer.cancel()
+
+
+# Appended to a partial answer persisted after the client disconnected.
+TRUNCATED_MARKER = "\n\n[truncated]"
+
+_answer_tokens: deque = deque(maxlen=512)
+
+
+def record_completion(answer: str):
+    """Remember the length of a fully streamed answer for the tokens saved estimate."""
+    _answer_tokens.append(count_tokens(answer))
+
+
+def record_cancellation(answer: str, max_tokens: int):
+    """
+    Count a generation cancelled because the client went away. Tokens saved are
+    estimated as the median length of recently completed answers (capped at
+    `max_tokens`) minus what was generated before the cancel.
+    """
+    generated = count_tokens(answer)
+    expected = statistics.median(_answer_tokens) if _answer_tokens else max_tokens
+    metrics.incr("streaming.cancelled")
+    metrics.incr("streaming.cancelled_generated_tokens", generated)
+    metrics.incr("streaming.tokens_saved", max(0, min(expected, max_tokens) - generated))
+
+
+async def run_shielded(awaitable: Awaitable) -> Any:
+    """
+    Await cleanup work from a stream cancelled by the SSE response (client
+    disconnect), which would otherwise be cancelled again at its first await.
+    """
+    with anyio.CancelScope(shield=True):
+        return await awaitable
@@ -0,0 +1,84 @@
+import re
+import unicodedata
+from functools import lru_cache
+
+import tiktoken
+
+from log_config import configure_logging
+
+# Configure logging
+logger = configure_logging(__name__)
+
+# Rough size of a cl100k token in Turkish text, used when tiktoken is unavailable
+CHARS_PER_TOKEN = 4
+
+_TURKISH_UPPER_TO_LOWER = str.maketrans({"I": "ı", "İ": "i"})
+_WHITESPACE = re.compile(r"\s+")
+
+
+def turkish_lower(text: str) -> str:
+    """Lowercase with Turkish dotted/dotless i rules (İ -> i, I -> ı)."""
+    return text.translate(_TURKISH_UPPER_TO_LOWER).lower()
+
+
+def normalize_text(text: str) -> str:
+    """Canonical form of a question used as a cache key."""
+    text = unicodedata.normalize("NFC", text or "")
+    return _WHITESPACE.sub(" ", turkish_lower(text)).strip()
+
+
+@lru_cache(maxsize=1)
+def token_encoder():
+    """cl100k encoder, or None when its BPE file cannot be loaded (offline hosts)."""
+    try:
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        logger.warning(f"tiktoken unavailable, estimating token counts: {e}")
+        return None
+
+
+def count_tokens(text: str) -> int:
+    encoder = token_encoder()
+    if encoder is None:
+        return -(-len(text) // CHARS_PER_TOKEN)
+    return len(encoder.encode(text, disallowed_special=()))
+
+
+def truncate_tokens(text: str, max_tokens: int) -> str:
+    """Cut `text` to at most `max_tokens` cl100k tokens."""
+    if len(text) <= max_tokens:
+        return text
+    encoder = token_encoder()
+    if encoder is None:
+        return text[: max_tokens * CHARS_PER_TOKEN]
+    tokens = encoder.encode(text, disallowed_special=())
+    if len(tokens) <= max_tokens:
+        return text
+    return encoder.decode(tokens[:max_tokens])
+
+
+_WORD = re.compile(r"\w+", re.UNICODE)
+TURKISH_STOPWORDS = frozenset(
+    """
+    acaba ama ancak bazı belki ben bile bir biri birkaç biz bu buna bunu bunun
+    çok çünkü da daha de değil diye en gibi göre hem hep hepsi her hiç için ile
+    ise işte ki kim mi mu mü mı na ne neden nasıl o olan olarak oldu olduğu olup
+    on ona onu onun sen siz şey şu tüm ve veya ya yani yine
+    """.split()
+)
+
+
+def tokenize(text: str, stem_length: int = 5):
+    """
+    Lexical tokens for BM25: Turkish lowercasing, stopword removal and prefix
+    stemming (words cut to their first `stem_length` letters, which works well for
+    agglutinative Turkish). Numbers such as article numbers are kept whole.
+    """
+    tokens = []
+    for word in _WORD.findall(turkish_lower(unicodedata.normalize("NFC", text or ""))):
+        if word in TURKISH_STOPWORDS:
+            continue
+        if not word.isdigit():
+            word = word[:stem_length]
+        tokens.append(word)
+    return tokens
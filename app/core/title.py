@@ -0,0 +1,39 @@
+import re
+import unicodedata
+
+from core.text import TURKISH_STOPWORDS, turkish_lower
+
+_WORD = re.compile(r"[^\W_]+(?:['’][^\W_]+)?", re.UNICODE)
+
+# Question words and fillers that say nothing about the topic of a session.
+TITLE_STOPWORDS = TURKISH_STOPWORDS | frozenset(
+    """
+    nedir neler nelerdir nasıl nasil midir mıdır mudur müdür mi mı mu mü misin
+    mısın musun müsün var yok olur olursa olabilir yapabilirim yapmalıyım
+    yapılır edilir gerekir gerekiyor lazım merhaba selam lütfen teşekkürler
+    benim bana beni bizim hakkında ilgili konusunda konusu acaba kadar zaman
+    """.split()
+)
+
+
+def _title_case(word: str) -> str:
+    first = word[0]
+    first = {"i": "İ", "ı": "I"}.get(first, first.upper())
+    return first + word[1:]
+
+
+def local_title(question: str, max_words: int = 6) -> str:
+    """
+    Session title from the question alone, without an LLM: its first
+    `max_words` content words (stopwords, question words and single letters
+    dropped) in title case. Falls back to the start of the question.
+    """
+    text = unicodedata.normalize("NFC", question or "")
+    words = _WORD.findall(text)
+    keywords = [
+        word
+        for word in words
+        if len(word) > 1 and turkish_lower(word) not in TITLE_STOPWORDS
+    ]
+    chosen = (keywords or words)[:max_words]
+    return " ".join(_title_case(turkish_lower(word)) if not word.isupper() else word for word in chosen)
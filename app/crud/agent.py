@@ -1,38 +1,136 @@
 import asyncio
-import json
-from typing import Any
+import time
 
 from sqlalchemy.orm import Session
-from langchain.agents import AgentExecutor, create_openai_functions_agent
+from langchain.agents import AgentExecutor
+from langchain.agents.format_scratchpad.openai_functions import (
+    format_to_openai_function_messages,
+)
+from langchain.agents.output_parsers.openai_functions import (
+    OpenAIFunctionsAgentOutputParser,
+)
 from langchain.chat_models import ChatOpenAI
-from langchain.memory import ConversationSummaryBufferMemory
 from langchain.prompts import ChatPromptTemplate
-from langchain.callbacks import AsyncIteratorCallbackHandler
+from langchain_core.runnables import Runnable, RunnablePassthrough
+from langchain_core.utils.function_calling import convert_to_openai_function
 
 from core.config import settings
+from core.executor import run_blocking
+from core.metrics import metrics
 from core.prompt import main_agent_prompt
-from crud.rag import add_chat_history
+from core.registry import get_registry
+from core.streaming import (
+    CUMULATIVE,
+    DELTA,
+    TRUNCATED_MARKER,
+    PrefetchedStream,
+    StreamEncoder,
+    coalesce_tokens,
+    merge_streams,
+    record_cancellation,
+    record_completion,
+    run_shielded,
+)
+from core.text import count_tokens
+from crud.rag import add_chat_history, schedule_legal_cases
 from crud.chat import (
     add_legal_session_summary,
-    init_postgres_chat_memory,
+    init_legal_session_memory,
     legal_session_exist,
-    summarize_session_streaming,
+    schedule_title_refinement,
+    session_title_tokens,
 )
 from crud.user import calculate_llm_token
+from database.session import SessionLocal
 from log_config import configure_logging
 from tools.rag_legal_tool import rag_legal_tool
 from tools.rag_regulation_tool import rag_regulation_tool
+from tools.cache import SessionCachedTool
 from langchain_community.tools.tavily_search import TavilySearchResults
 from langchain.callbacks import get_openai_callback  # Ensure this is from langchain, not langchain_community
-from core.creativity_grader import get_llm_parameter
+from core.creativity_grader import aget_llm_parameter
 
 # Configure logging
 logger = configure_logging(__name__)
 
-class QueueCallbackHandler(AsyncIteratorCallbackHandler):
-    def on_llm_end(self, *args, **kwargs) -> Any:
-        logger.info("Ended LLM streaming")
-        self.done.set()
+# Tags the runs of the agent LLM itself among the events of the tools' chains.
+AGENT_LLM_TAG = "agent_llm"
+
+
+class PrebuiltAgent:
+    """
+    The immutable part of the legal agent: prompt, tools, their OpenAI function
+    definitions and the streaming agent LLM, built once per worker.
+
+    A request only binds its temperature, max_tokens and user id to the shared
+    LLM and wraps the agent in an AgentExecutor with its own memory. The chain is
+    the one create_openai_functions_agent builds.
+    """
+
+    def __init__(self, llm: Runnable, tools: list):
+        self.llm = llm
+        self.tools = tools
+        self.functions = [convert_to_openai_function(tool) for tool in tools]
+        self.prompt = ChatPromptTemplate.from_messages([
+            ("system", main_agent_prompt),
+            ("placeholder", "{chat_history}"),
+            ("human", "{input}"),
+            ("placeholder", "{agent_scratchpad}"),
+        ])
+        self.head = (
+            RunnablePassthrough.assign(
+                agent_scratchpad=lambda x: format_to_openai_function_messages(
+                    x["intermediate_steps"]
+                )
+            )
+            | self.prompt
+        )
+        self.output_parser = OpenAIFunctionsAgentOutputParser()
+
+    def agent(self, temperature: float, max_tokens: int, user_id: int) -> Runnable:
+        llm = self.llm.bind(
+            functions=self.functions,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            user=str(user_id),
+        )
+        return self.head | llm.with_config(tags=[AGENT_LLM_TAG]) | self.output_parser
+
+    def executor(
+        self, memory, temperature: float, max_tokens: int, user_id: int
+    ) -> AgentExecutor:
+        return AgentExecutor(
+            agent=self.agent(temperature, max_tokens, user_id),
+            tools=self.tools,
+            verbose=True,
+            memory=memory,
+        )
+
+
+def build_agent(registry) -> PrebuiltAgent:
+    tools = [
+        rag_regulation_tool(),
+        rag_legal_tool(),
+        TavilySearchResults(max_results=1),
+    ]
+    if settings.TOOL_CACHE_ENABLED:
+        tools = [SessionCachedTool.wrap(tool) for tool in tools]
+    return PrebuiltAgent(
+        llm=registry.chat_llm(
+            model_name=settings.LLM_MODEL_NAME,  # Ensure the model supports function calling
+            temperature=0,
+            max_tokens=3000,
+            streaming=True,
+        ),
+        tools=tools,
+    )
+
+
+def get_agent() -> PrebuiltAgent:
+    """Return the worker's prebuilt agent, building it on first use."""
+    registry = get_registry()
+    return registry.get_or_create(("agent",), lambda: build_agent(registry))
+
 
 async def agent_run(
     standalone_question: str,
@@ -43,6 +141,7 @@ async def agent_run(
     legal_s3_key: str,
     legal_file_name: str,
     db_session: Session,
+    stream_protocol: int = CUMULATIVE,
 ):
     """
     Orchestrates the agent execution flow.
@@ -56,72 +155,43 @@ async def agent_run(
         legal_s3_key (str): S3 key for the legal document.
         legal_file_name (str): Filename of the legal document.
         db_session (Session): Database session object.
+        stream_protocol (int): SSE payload format negotiated with the client,
+            cumulative (1) or delta (2), see core/streaming.py.
 
     Yields:
         Any: JSON-formatted data to be sent to the user.
     """
     logger.info(f"Starting agent_run for user_id: {user_id}, session_id: {session_id}")
-    
+    encoder = StreamEncoder(stream_protocol)
+    answer = ""
+    answer_done = False
+    title_stream = None
+    history_saved = False
+    grade_task = None
+    max_tokens = 3000
+    prompt_tokens = 0
+    started = time.perf_counter()
+
     try:
-        
-        # Getting llm parameter(temperature , and  max_tokens)  based on creativity score from standalone_question
-        llm_parameters = get_llm_parameter(question=standalone_question)
-        temperature = llm_parameters.get("temperature", 1)
-        max_tokens  = llm_parameters.get("max_tokens", 3000) 
-        print("llm parameter(temperature and max_tokens):", temperature, max_tokens)
-        
-        # Initialize Agent LLM with function calling support
-        llm = ChatOpenAI(
-            model_name=settings.LLM_MODEL_NAME,  # Ensure the model supports function calling
-            temperature = temperature,
-            max_tokens = max_tokens,
-            openai_api_key=settings.OPENAI_API_KEY,
-            streaming=True,
-            model_kwargs={"user": str(user_id)},
-        )
-        logger.debug("Initialized ChatOpenAI with function calling support")
+        # The creativity grade (temperature and max_tokens of the agent LLM) is
+        # computed while memory is set up.
+        grade_task = asyncio.create_task(aget_llm_parameter(question=standalone_question))
 
-        # Initialize summary LLM
-        summary_streaming_callback = QueueCallbackHandler()
-        summary_streaming_llm = ChatOpenAI(
-            streaming=True,
-            callbacks=[summary_streaming_callback],
-            temperature=0,
-            max_tokens=3000,
-            model_name="gpt-3.5-turbo",
-            openai_api_key=settings.OPENAI_API_KEY,
-            model_kwargs={"user": str(user_id)},
+        # A new session gets its title from the question, generated alongside the answer
+        new_session = not await run_blocking(
+            legal_session_exist, session_id=session_id, session=db_session
         )
-        logger.debug("Initialized summary LLM")
+        if new_session:
+            logger.info(f"Session {session_id} does not exist. Generating title.")
+            title_stream = PrefetchedStream(session_title_tokens(question, user_id))
 
-        # Create prompt template
-        prompt = ChatPromptTemplate.from_messages([
-            ("system", main_agent_prompt),
-            ("placeholder", "{chat_history}"),
-            ("human", "{input}"),
-            ("placeholder", "{agent_scratchpad}"),
-        ])
-        logger.debug("Created prompt template")
-
-        # Initialize tools
-        tools = [
-            rag_regulation_tool(),
-            rag_legal_tool(),
-            TavilySearchResults(max_results=1),
-        ]
-        logger.debug("Initialized tools")
-
-        # Create agent with function calling support
-        agent = create_openai_functions_agent(
-            llm=llm,
-            tools=tools,
-            prompt=prompt,
-        )
-        logger.debug("Created agent with function calling support")
+        # Prompt, tools and function definitions are shared by every request
+        prebuilt_agent = get_agent()
 
         # Initialize memory
-        chat_memory = init_postgres_chat_memory(session_id=session_id)
-        memory = ConversationSummaryBufferMemory(
+        memory = await run_blocking(
+            init_legal_session_memory,
+            session_id=session_id,
             llm=ChatOpenAI(
                 model_name=settings.QUESTION_MODEL_NAME,
                 temperature=0,
@@ -130,7 +200,6 @@ async def agent_run(
             ),
             memory_key="chat_history",
             return_messages=True,
-            chat_memory=chat_memory,
             max_token_limit=3000,
             ai_prefix="Question",
             human_prefix="Answer",
@@ -138,87 +207,103 @@ async def agent_run(
         )
         logger.debug("Initialized conversation memory")
 
-        # Create agent executor
-        agent_executor = AgentExecutor(
-            agent=agent, tools=tools, verbose=True, memory=memory
+        llm_parameters = await grade_task
+        temperature = llm_parameters.get("temperature", 1)
+        max_tokens = llm_parameters.get("max_tokens", 3000)
+        logger.info(f"LLM parameters: temperature {temperature}, max_tokens {max_tokens}")
+
+        # Bind the per-request sampling parameters and memory to the shared agent
+        agent_executor = prebuilt_agent.executor(
+            memory, temperature=temperature, max_tokens=max_tokens, user_id=user_id
         )
         logger.debug("Created agent executor")
 
         # Execute agent and stream responses
-        answer = ""
         logger.info("Starting agent execution")
-        with get_openai_callback() as cb:
+
+        async def answer_tokens():
+            nonlocal prompt_tokens
+            # The session id in the run metadata scopes the tool result cache.
             async for event in agent_executor.astream_events(
-                {"input": standalone_question}, version="v1"
+                {"input": standalone_question},
+                config={"metadata": {"session_id": session_id}},
+                version="v2",
             ):
                 kind = event.get("event")
                 if kind == "on_chat_model_stream":
                     content = event["data"]["chunk"].content
                     if content:
-                        answer += content
-                        data = json.dumps({
-                            "message": {
-                                "data_type": 0,
-                                "content": answer,
-                            }
-                        })
-                        yield data
+                        yield content
+                elif kind == "on_chat_model_start" and AGENT_LLM_TAG in event.get("tags", []):
+                    # Counted locally: streamed answers carry no usage from OpenAI.
+                    prompt_tokens += sum(
+                        count_tokens(str(message.content))
+                        for messages in event["data"]["input"]["messages"]
+                        for message in messages
+                    )
                 elif kind == "on_tool_start":
                     logger.info(f"Starting tool: {event['name']}")
                 elif kind == "on_tool_end":
                     logger.info(f"Finished tool: {event['name']}")
+                elif kind == "on_custom_event" and event["name"] == "tool_cache_hit":
+                    logger.info(f"Tool result reused from the session cache: {event['data']['tool']}")
+
+        with get_openai_callback() as cb:
+            # Tokens are merged into fewer SSE frames; the first one is sent at once.
+            # Title tokens are interleaved as they arrive.
+            streams = {
+                0: coalesce_tokens(
+                    answer_tokens(),
+                    settings.STREAM_COALESCE_WINDOW_MS,
+                    settings.STREAM_COALESCE_MAX_BYTES,
+                )
+            }
+            if title_stream is not None:
+                streams[1] = title_stream
+            title = ""
+            async for data_type, content in merge_streams(streams):
+                if data_type == 1:
+                    title += content
+                    data_title = encoder.text(1, content)
+                    if data_title:
+                        yield data_title
+                    continue
+                if not answer:
+                    metrics.observe("agent.ttft_ms", (time.perf_counter() - started) * 1000)
+                answer += content
+                yield encoder.text(0, content)
+            answer_done = True
 
             logger.info("Agent execution completed")
             logger.info(f"Final answer: {answer}")
             logger.info(f"Total Tokens: {cb.total_tokens}")
+            metrics.observe("agent.prompt_tokens", prompt_tokens)
             logger.info(f"Total Cost (USD): ${cb.total_cost}")
 
-            # Process session summary if needed
-            if not legal_session_exist(session_id=session_id, session=db_session):
-                logger.info(f"Session {session_id} does not exist. Generating summary.")
-                summary_task = asyncio.create_task(
-                    summarize_session_streaming(
-                        question=question, answer=answer, llm=summary_streaming_llm
-                    )
-                )
-                summary = ""
-                async for summary_token in summary_streaming_callback.aiter():
-                    summary += summary_token
-                    data_summary = json.dumps({
-                        "message": {
-                            "data_type": 1,
-                            "content": summary,
-                        }
-                    })
-                    yield data_summary
-                await summary_task
-                logger.info(f"Final summary: {summary}")
+            if new_session:
+                logger.info(f"Final title: {title}")
                 await add_legal_session_summary(
                     user_id=user_id,
                     session_id=session_id,
-                    summary=summary,
+                    summary=title.strip(),
                     session=db_session,
                 )
+                schedule_title_refinement(session_id, question, user_id)
                 logger.info(f"Added legal session summary for session_id: {session_id}")
 
             # Yield legal file data
-            yield json.dumps({
-                "message": {
-                    "data_type": 2,
-                    "content": legal_file_name,
-                }
-            })
+            yield encoder.value(2, legal_file_name)
             logger.debug(f"Yielded legal file data: {legal_file_name}")
 
-            yield json.dumps({
-                "message": {
-                    "data_type": 3,
-                    "content": legal_s3_key,
-                }
-            })
+            yield encoder.value(3, legal_s3_key)
             logger.debug(f"Yielded legal S3 key data: {legal_s3_key}")
 
+            complete_data = encoder.complete()
+            if complete_data:
+                yield complete_data
+
             # Update database
+            record_completion(answer)
             await add_chat_history(
                 user_id=user_id,
                 session_id=session_id,
@@ -229,7 +314,9 @@ async def agent_run(
                 legal_s3_key=legal_s3_key,
                 db_session=db_session,
             )
+            history_saved = True
             logger.info("Chat history added successfully")
+            schedule_legal_cases(session_id)
 
             await calculate_llm_token(
                 user_id=user_id,
@@ -238,12 +325,52 @@ async def agent_run(
             )
             logger.info("LLM token usage calculated and updated")
 
+    except (asyncio.CancelledError, GeneratorExit):
+        # The SSE response cancels this generator when the client disconnects:
+        # the agent and title streams are stopped with it, the partial answer is kept.
+        logger.info(f"Client disconnected from session {session_id}, cancelling agent run")
+        if grade_task is not None and not grade_task.done():
+            grade_task.cancel()
+        if title_stream is not None:
+            title_stream.cancel()
+        if not answer_done:
+            record_cancellation(answer, max_tokens=max_tokens)
+        if answer and not history_saved:
+            await run_shielded(
+                add_chat_history(
+                    user_id=user_id,
+                    session_id=session_id,
+                    question=question,
+                    answer=answer if answer_done else answer + TRUNCATED_MARKER,
+                    legal_attached=legal_attached,
+                    legal_file_name=legal_file_name,
+                    legal_s3_key=legal_s3_key,
+                    db_session=db_session,
+                )
+            )
+        raise
     except Exception as e:
         logger.exception("An error occurred during agent execution.")
-        error_data = json.dumps({
-            "message": {
-                "data_type": -1,
-                "content": "An internal error occurred. Please try again later."
-            }
-        })
+        if grade_task is not None and not grade_task.done():
+            grade_task.cancel()
+        if title_stream is not None:
+            title_stream.cancel()
+        error_data = encoder.value(
+            -1, "An internal error occurred. Please try again later."
+        )
         yield error_data
+
+
+async def buffered_agent_run(**kwargs):
+    """
+    agent_run for a resumable stream (core/stream_buffer.py). The run outlives
+    the request by up to STREAM_RESUME_GRACE_SECONDS after a disconnect, so it
+    gets its own database session instead of the request's, and streams the
+    delta protocol the buffer keeps.
+    """
+    db_session = SessionLocal()
+    try:
+        async for data in agent_run(db_session=db_session, stream_protocol=DELTA, **kwargs):
+            yield data
+    finally:
+        db_session.close()
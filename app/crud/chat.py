@@ -2,12 +2,13 @@ import os
 from fastapi import HTTPException
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import SQLAlchemyError
-from typing import List
+from typing import AsyncIterator, List, Set
 from langchain_openai import ChatOpenAI
 from langchain.chains.llm import LLMChain
 from langchain_core.prompts import PromptTemplate
 from langchain_core.output_parsers import StrOutputParser
 from models.session_summary_legal import LegalSessionSummary
+from models.session_memory_legal import LegalSessionMemory
 from models import LegalChatHistory
 from datetime import datetime
 from langchain_postgres import PostgresChatMessageHistory
@@ -25,10 +26,18 @@ from schemas.message import (
     SharedSessionSummary,
     ArchivedSessionSummary,
 )
+from core.condense import amap_condense, map_condense
 from core.config import settings
+from core.executor import run_blocking
+from core.memory import RollingSummaryMemory
+from core.title import local_title
+from core.registry import get_registry
+from database.session import SessionLocal
 from core.prompt import (
+    condense_legal_document_prompt_template,
     summary_legal_session_prompt_template,
     summary_session_prompt_template,
+    session_title_prompt_template,
 )
 from langsmith import traceable
 import uuid
@@ -198,11 +207,7 @@ def remove_messages_by_session_id(user_id: int, session_id: str, session: Sessio
         session.rollback()
         return {"message": "Failed to delete session."}
 
-def summarize_session(question: str, answer: str):
-    logger.info("Summarizing session")
-    try:
-        llm = ChatOpenAI(temperature=0.5, model_name="gpt-4-1106-preview")
-        prompt_template = """
+SUMMARY_PROMPT_TEMPLATE = """
             I want you to make concise summary using following conversation.
             You must write concise summary as title format with a 5-8 words in turkish
             CONVERSATION:
@@ -212,7 +217,12 @@ def summarize_session(question: str, answer: str):
             ============
             CONCISE Summary:
         """
-        prompt = PromptTemplate.from_template(prompt_template)
+
+def summarize_session(question: str, answer: str):
+    logger.info("Summarizing session")
+    try:
+        llm = ChatOpenAI(temperature=0.5, model_name="gpt-4-1106-preview")
+        prompt = PromptTemplate.from_template(SUMMARY_PROMPT_TEMPLATE)
         llm_chain = LLMChain(llm=llm, prompt=prompt)
         response = llm_chain.invoke({"question": question, "answer": answer})
         logger.debug(f"Session summary: {response['text']}")
@@ -221,6 +231,20 @@ def summarize_session(question: str, answer: str):
         logger.error(f"Error during session summarization: {e}")
         return ""
 
+async def asummarize_session(question: str, answer: str):
+    """Async version of summarize_session on the pooled OpenAI clients."""
+    logger.info("Summarizing session")
+    try:
+        llm = get_registry().chat_llm(temperature=0.5, model_name="gpt-4-1106-preview")
+        prompt = PromptTemplate.from_template(SUMMARY_PROMPT_TEMPLATE)
+        llm_chain = prompt | llm | StrOutputParser()
+        result = await llm_chain.ainvoke({"question": question, "answer": answer})
+        logger.debug(f"Session summary: {result}")
+        return result
+    except Exception as e:
+        logger.error(f"Error during session summarization: {e}")
+        return ""
+
 async def summarize_session_streaming(question: str, answer: str, llm):
     logger.info("Summarizing session with streaming")
     try:
@@ -233,8 +257,94 @@ async def summarize_session_streaming(question: str, answer: str, llm):
         logger.error(f"Error during streaming summarization: {e}")
         return ""
 
+def _session_title_chain(user_id: int):
+    registry = get_registry()
+    prompt = registry.get_or_create(
+        ("prompt", "session_title"),
+        lambda: PromptTemplate.from_template(session_title_prompt_template),
+    )
+    llm = registry.get_or_create(
+        ("llm", "session_title"),
+        lambda: registry.chat_llm(
+            model_name=settings.SESSION_TITLE_MODEL_NAME,
+            temperature=0,
+            max_tokens=40,
+            streaming=True,
+        ),
+    )
+    return prompt | llm.bind(user=str(user_id)) | StrOutputParser()
+
+async def astream_session_title(question: str, user_id: int) -> AsyncIterator[str]:
+    """
+    Title tokens of a new session generated from its first question, so they can
+    be streamed while the answer is still being generated. An LLM error ends the
+    stream early instead of failing the answer.
+    """
+    try:
+        async for token in _session_title_chain(user_id).astream({"question": question}):
+            yield token
+    except Exception as e:
+        logger.error(f"Error during session title generation: {e}")
+
+async def agenerate_session_title(question: str, user_id: int) -> str:
+    title = ""
+    async for token in astream_session_title(question, user_id):
+        title += token
+    return title.strip()
+
+async def session_title_tokens(question: str, user_id: int) -> AsyncIterator[str]:
+    """
+    Title stream of a new session according to SESSION_TITLE_MODE: the LLM title
+    tokens ("llm", the keyword title if the LLM returns nothing), or the keyword
+    title of core.title.local_title at once ("local" and "local_refine").
+    """
+    if settings.SESSION_TITLE_MODE == "llm":
+        streamed = False
+        async for token in astream_session_title(question, user_id):
+            streamed = streamed or bool(token.strip())
+            yield token
+        if streamed:
+            return
+    yield local_title(question)
+
+def update_legal_session_summary(session_id: str, summary: str):
+    logger.info(f"Updating legal session summary for session_id: {session_id}")
+    session = SessionLocal()
+    try:
+        session.query(LegalSessionSummary).filter(
+            LegalSessionSummary.session_id == session_id
+        ).update({LegalSessionSummary.summary: summary})
+        session.commit()
+    except SQLAlchemyError as e:
+        logger.error(f"Error updating legal session summary: {e}")
+        session.rollback()
+    finally:
+        session.close()
+
+_title_tasks: Set[asyncio.Task] = set()
+
+async def _refine_session_title(session_id: str, question: str, user_id: int):
+    title = await agenerate_session_title(question, user_id)
+    if title:
+        await run_blocking(update_legal_session_summary, session_id, title)
+        logger.debug(f"Refined title of session {session_id}: {title}")
+
+def schedule_title_refinement(session_id: str, question: str, user_id: int):
+    """Replace the keyword title of a new session with the LLM title in the background ("local_refine")."""
+    if settings.SESSION_TITLE_MODE != "local_refine":
+        return
+    task = asyncio.create_task(_refine_session_title(session_id, question, user_id))
+    _title_tasks.add(task)
+    task.add_done_callback(_title_tasks.discard)
+
 async def add_legal_session_summary(
     session_id: str, user_id: int, summary: str, session: Session
+):
+    return await run_blocking(_add_legal_session_summary, session_id, user_id, summary, session)
+
+
+def _add_legal_session_summary(
+    session_id: str, user_id: int, summary: str, session: Session
 ):
     logger.info(f"Adding legal session summary for user_id: {user_id}, session_id: {session_id}")
     try:
@@ -257,6 +367,9 @@ def remove_session_summary(session_id: str, session: Session):
         session.query(LegalSessionSummary).filter(
             LegalSessionSummary.session_id == session_id
         ).delete()
+        session.query(LegalSessionMemory).filter(
+            LegalSessionMemory.session_id == session_id
+        ).delete()
         session.commit()
         logger.debug("Session summary removed successfully")
     except SQLAlchemyError as e:
@@ -345,6 +458,66 @@ def init_postgres_chat_memory(session_id: str):
         logger.error(f"Error initializing Postgres chat memory: {e}")
         return None
 
+def load_legal_session_memory(session_id: str):
+    """Rolling summary of a session and the number of messages it covers."""
+    session = SessionLocal()
+    try:
+        memory = (
+            session.query(LegalSessionMemory)
+            .filter(LegalSessionMemory.session_id == session_id)
+            .first()
+        )
+        if memory is None:
+            return "", 0
+        return memory.summary, memory.message_count
+    except SQLAlchemyError as e:
+        logger.error(f"Error loading rolling summary: {e}")
+        return "", 0
+    finally:
+        session.close()
+
+def save_legal_session_memory(session_id: str, summary: str, message_count: int):
+    logger.info(f"Saving rolling summary of {message_count} messages for session_id: {session_id}")
+    session = SessionLocal()
+    try:
+        memory = (
+            session.query(LegalSessionMemory)
+            .filter(LegalSessionMemory.session_id == session_id)
+            .with_for_update()
+            .first()
+        )
+        if memory is None:
+            session.add(
+                LegalSessionMemory(
+                    session_id=session_id, summary=summary, message_count=message_count
+                )
+            )
+        elif memory.message_count < message_count:
+            # A concurrent request may already have saved a summary covering more messages.
+            memory.summary = summary
+            memory.message_count = message_count
+            memory.updated_date = datetime.now()
+        session.commit()
+    except SQLAlchemyError as e:
+        logger.error(f"Error saving rolling summary: {e}")
+        session.rollback()
+    finally:
+        session.close()
+
+def init_legal_session_memory(session_id: str, llm, **kwargs):
+    """
+    Conversation memory of a legal session: the persisted rolling summary plus
+    the messages after it, see core.memory.RollingSummaryMemory.
+    """
+    return RollingSummaryMemory.from_store(
+        chat_memory=init_postgres_chat_memory(session_id=session_id),
+        session_id=session_id,
+        load_summary=load_legal_session_memory,
+        save_summary=save_legal_session_memory,
+        llm=llm,
+        **kwargs,
+    )
+
 def upload_legal_description(file_content, user_id, session_id, legal_s3_key):
     logger.info(f"Uploading legal description for user_id: {user_id}, session_id: {session_id}")
     try:
@@ -354,6 +527,12 @@ def upload_legal_description(file_content, user_id, session_id, legal_s3_key):
     except Exception as e:
         logger.error(f"Error uploading legal description: {e}")
 
+async def aupload_legal_description(file_content, user_id, session_id, legal_s3_key):
+    """upload_legal_description on the bounded blocking executor."""
+    await run_blocking(
+        upload_legal_description, file_content, user_id, session_id, legal_s3_key
+    )
+
 def download_legal_description(user_id, session_id, legal_s3_key):
     logger.info(f"Downloading legal description for user_id: {user_id}, session_id: {session_id}")
     try:
@@ -393,6 +572,21 @@ def read_pdf(file_contents):
         logger.error(f"Error reading PDF: {e}")
     return "\n".join(pages)
 
+async def aread_pdf(file_contents):
+    """read_pdf (pdf2image + tesseract OCR) on the bounded blocking executor."""
+    return await run_blocking(read_pdf, file_contents)
+
+def _pdf_map_chain(question: str):
+    """
+    Map step for attachments over PDF_MAP_REDUCE_THRESHOLD_TOKENS: each chunk is
+    condensed with the cheaper PDF_MAP_MODEL_NAME before the question is generated.
+    """
+    llm = get_registry().chat_llm(
+        temperature=0, model_name=settings.PDF_MAP_MODEL_NAME, max_tokens=400
+    )
+    prompt = PromptTemplate.from_template(condense_legal_document_prompt_template)
+    return prompt.partial(question=question) | llm | StrOutputParser()
+
 @traceable(
     run_type="llm",
     name="Generate question with legal pdf and question",
@@ -401,6 +595,13 @@ def read_pdf(file_contents):
 def generate_question(pdf_contents, question):
     logger.info("Generating question with legal PDF and question")
     try:
+        pdf_contents = map_condense(
+            pdf_contents,
+            _pdf_map_chain(question),
+            max_tokens=settings.PDF_MAP_REDUCE_THRESHOLD_TOKENS,
+            chunk_tokens=settings.PDF_CHUNK_TOKENS,
+            max_concurrency=settings.PDF_MAP_MAX_CONCURRENCY,
+        )
         llm = ChatOpenAI(temperature=0.5, model_name=settings.LLM_MODEL_NAME)
         prompt = PromptTemplate.from_template(summary_legal_session_prompt_template)
         llm_chain = LLMChain(llm=llm, prompt=prompt)
@@ -411,9 +612,42 @@ def generate_question(pdf_contents, question):
         logger.error(f"Error generating question: {e}")
         return ""
 
+@traceable(
+    run_type="llm",
+    name="Generate question with legal pdf and question",
+    project_name="adaletgpt",
+)
+async def agenerate_question(pdf_contents, question):
+    """Async version of generate_question on the pooled OpenAI clients."""
+    logger.info("Generating question with legal PDF and question")
+    try:
+        pdf_contents = await amap_condense(
+            pdf_contents,
+            _pdf_map_chain(question),
+            max_tokens=settings.PDF_MAP_REDUCE_THRESHOLD_TOKENS,
+            chunk_tokens=settings.PDF_CHUNK_TOKENS,
+            max_concurrency=settings.PDF_MAP_MAX_CONCURRENCY,
+        )
+        llm = get_registry().chat_llm(temperature=0.5, model_name=settings.LLM_MODEL_NAME)
+        prompt = PromptTemplate.from_template(summary_legal_session_prompt_template)
+        llm_chain = prompt | llm | StrOutputParser()
+        result = await llm_chain.ainvoke({"question": question, "pdf_contents": pdf_contents})
+        logger.debug(f"Generated question: {result}")
+        return result
+    except Exception as e:
+        logger.error(f"Error generating question: {e}")
+        return ""
+
 def remove_sessions_by_user_id(user_id: int, db_session: Session):
     logger.info(f"Removing sessions for user_id: {user_id}")
     try:
+        user_session_ids = db_session.query(LegalSessionSummary.session_id).filter(
+            LegalSessionSummary.user_id == user_id
+        )
+        db_session.query(LegalSessionMemory).filter(
+            LegalSessionMemory.session_id.in_(user_session_ids.scalar_subquery())
+        ).delete(synchronize_session=False)
+
         db_session.query(LegalSessionSummary).filter(
             LegalSessionSummary.user_id == user_id
         ).delete()
@@ -1,7 +1,44 @@
+import json
+import math
+import os
+import time
+from typing import Dict, Iterable, Optional, Tuple
+
+import numpy as np
 from pydantic import BaseModel, Field
 from langchain.prompts import PromptTemplate
 from langchain_openai import ChatOpenAI
+from core.cache import TTLCache
+from core.config import settings
+from core.metrics import metrics
 from core.prompt import legalcase_classify_prompt_template
+from core.text import normalize_text, tokenize
+from log_config import configure_logging
+
+# Configure logging
+logger = configure_logging(__name__)
+
+YARGITAY = "YARGITAY"
+DANISTAY = "DANISTAY"
+
+# Stemmed keyword weights (core.text.tokenize), positive towards DANISTAY
+# (administrative and tax jurisdiction), negative towards YARGITAY (civil and
+# criminal jurisdiction). Used until a model is trained on LLM labels with
+# benchmarks/classifier_accuracy.py --save.
+DEFAULT_WEIGHTS = {
+    "danış": 4.0, "idari": 3.0, "idare": 3.0, "beled": 2.5, "bakan": 2.0,
+    "valil": 2.5, "kayma": 2.0, "vergi": 2.5, "imar": 2.5, "ruhsa": 2.0,
+    "memur": 2.5, "kamu": 1.5, "disip": 2.0, "atama": 2.0, "öğret": 1.5,
+    "ihale": 2.0, "yürüt": 2.0, "durdu": 1.0, "kamul": 1.0, "yönet": 1.0,
+    "yargı": -1.0, "ceza": -1.0, "tck": -3.0, "cmk": -3.0, "sanık": -3.0,
+    "hırsı": -3.0, "dolan": -3.0, "boşan": -3.5, "nafak": -3.5, "velay": -3.5,
+    "miras": -3.0, "kira": -2.5, "tahli": -2.5, "işçi": -3.0,
+    "işver": -2.5, "kıdem": -3.0, "ihbar": -2.0, "icra": -3.0, "iflas": -3.0,
+    "iik": -3.0, "hmk": -2.5, "tmk": -3.0, "tbk": -3.0, "tapu": -2.0,
+    "tesci": -1.5, "çek": -2.0, "senet": -2.0, "alaca": -1.5, "trafi": -2.0,
+    "kaza": -1.5, "sigor": -1.0, "tazmi": -0.5, "sözle": -1.0, "ortak": -1.0,
+}
+DEFAULT_BIAS = -0.5
 
 
 class CategoryQuestion(BaseModel):
@@ -12,8 +49,83 @@ class CategoryQuestion(BaseModel):
     )
 
 
+class KeywordClassifier:
+    """
+    Logistic model over stemmed question tokens: P(DANISTAY) is the sigmoid of
+    the bias plus the weights of the tokens present in the question.
+    """
+
+    def __init__(self, weights: Dict[str, float], bias: float = 0.0):
+        self.weights = weights
+        self.bias = bias
+
+    def predict(self, question: str) -> Tuple[str, float]:
+        """Return (category, confidence in [0.5, 1])."""
+        score = self.bias + sum(self.weights.get(token, 0.0) for token in set(tokenize(question)))
+        probability = 1 / (1 + math.exp(-max(-30.0, min(30.0, score))))
+        if probability >= 0.5:
+            return DANISTAY, probability
+        return YARGITAY, 1 - probability
+
+    @classmethod
+    def fit(
+        cls,
+        questions: Iterable[str],
+        labels: Iterable[str],
+        epochs: int = 300,
+        learning_rate: float = 0.5,
+        l2: float = 1e-3,
+        min_count: int = 2,
+    ) -> "KeywordClassifier":
+        """Train on questions labelled YARGITAY/DANISTAY (e.g. by the LLM)."""
+        token_sets = [set(tokenize(question)) for question in questions]
+        targets = np.array([label == DANISTAY for label in labels], dtype=np.float32)
+        counts: Dict[str, int] = {}
+        for tokens in token_sets:
+            for token in tokens:
+                counts[token] = counts.get(token, 0) + 1
+        vocabulary = sorted(token for token, count in counts.items() if count >= min_count)
+        columns = {token: i for i, token in enumerate(vocabulary)}
+        features = np.zeros((len(token_sets), len(vocabulary)), dtype=np.float32)
+        for row, tokens in enumerate(token_sets):
+            for token in tokens:
+                if token in columns:
+                    features[row, columns[token]] = 1.0
+
+        weights = np.zeros(len(vocabulary), dtype=np.float32)
+        bias = 0.0
+        for _ in range(epochs):
+            predictions = 1 / (1 + np.exp(-(features @ weights + bias)))
+            error = predictions - targets
+            weights -= learning_rate * (features.T @ error / len(targets) + l2 * weights)
+            bias -= learning_rate * float(error.mean())
+        return cls({token: float(weights[i]) for token, i in columns.items()}, bias)
+
+    def save(self, path: str):
+        with open(path, "w", encoding="utf-8") as file:
+            json.dump({"weights": self.weights, "bias": self.bias}, file, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, path: Optional[str]) -> "KeywordClassifier":
+        """Load trained weights from `path`, or the built-in keyword weights."""
+        if path and os.path.exists(path):
+            with open(path, encoding="utf-8") as file:
+                data = json.load(file)
+            logger.info(f"Loaded namespace classifier weights from {path}")
+            return cls(data["weights"], data["bias"])
+        return cls(dict(DEFAULT_WEIGHTS), DEFAULT_BIAS)
+
+
 class Classifier:
-    def __init__(self, model_name="gpt-4o", temperature=0):
+    """
+    Chooses the legal case namespace (YARGITAY or DANISTAY) of a question.
+
+    The local keyword model answers when its confidence reaches
+    CLASSIFIER_CONFIDENCE; only ambiguous questions go to the gpt-4o structured
+    output call. Decisions are memoized per normalized question.
+    """
+
+    def __init__(self, model_name="gpt-4o", temperature=0, local_model=None):
         self.llm = ChatOpenAI(model=model_name, temperature=temperature)
         self.structured_llm_classifier = self.llm.with_structured_output(
             CategoryQuestion
@@ -22,8 +134,51 @@ class Classifier:
         self.classify_prompt = PromptTemplate(
             template=self.template, input_variables=["question"]
         )
+        self.classify_chain = self.classify_prompt | self.structured_llm_classifier
+        self.local_model = local_model or KeywordClassifier.load(
+            settings.CLASSIFIER_WEIGHTS_PATH
+        )
+        self.confidence = settings.CLASSIFIER_CONFIDENCE
+        self.cache = TTLCache(
+            maxsize=settings.CLASSIFIER_CACHE_SIZE, ttl=settings.CLASSIFIER_CACHE_TTL_SECONDS
+        )
+        metrics.register_gauge("classifier_cache", self.cache.stats)
+
+    def _local(self, key: str) -> Optional[str]:
+        category = self.cache.get(key)
+        if category is not None:
+            metrics.incr("classifier.cache_hits")
+            return category
+        category, confidence = self.local_model.predict(key)
+        if confidence >= self.confidence:
+            metrics.incr("classifier.local")
+            logger.debug(f"Local classifier: {category} ({confidence:.2f})")
+            self.cache.set(key, category)
+            return category
+        logger.debug(f"Local classifier not confident ({category}, {confidence:.2f}), asking LLM")
+        return None
+
+    def _store_llm(self, key: str, result, start: float) -> str:
+        metrics.incr("classifier.llm")
+        metrics.observe("classifier.llm_ms", (time.perf_counter() - start) * 1000)
+        category = result["category"]
+        self.cache.set(key, category)
+        return category
 
     def classify(self, question: str):
-        classify_chain = self.classify_prompt | self.structured_llm_classifier
-        result = classify_chain.invoke({"question": question})
-        return result["category"]
+        key = normalize_text(question)
+        category = self._local(key)
+        if category is not None:
+            return category
+        start = time.perf_counter()
+        result = self.classify_chain.invoke({"question": question})
+        return self._store_llm(key, result, start)
+
+    async def aclassify(self, question: str):
+        key = normalize_text(question)
+        category = self._local(key)
+        if category is not None:
+            return category
+        start = time.perf_counter()
+        result = await self.classify_chain.ainvoke({"question": question})
+        return self._store_llm(key, result, start)
@@ -1,34 +1,45 @@
 import os
 import sys
 import asyncio
+import contextlib
+import time
 from dotenv import load_dotenv
-import json
 
 load_dotenv()
 from sqlalchemy.orm import Session
 from typing import Any
 from datetime import datetime
 from langchain.prompts import PromptTemplate, ChatPromptTemplate, MessagesPlaceholder
-from langchain_openai import ChatOpenAI, OpenAIEmbeddings
 from langchain.chains.conversational_retrieval.base import ConversationalRetrievalChain
 from langchain.chains.llm import LLMChain
 from langchain.chains.combine_documents import create_stuff_documents_chain
 from langchain.chains.retrieval import create_retrieval_chain
-from langchain.retrievers.multi_query import MultiQueryRetriever
 from langchain.chains.history_aware_retriever import create_history_aware_retriever
-from langchain_pinecone import PineconeVectorStore
 from langchain.chains.combine_documents.stuff import StuffDocumentsChain
-from langchain.memory import ConversationSummaryBufferMemory
-from langchain.retrievers.contextual_compression import ContextualCompressionRetriever
-from langchain_cohere import CohereRerank
+from core.cache import TTLCache
+from core.chains import SpeculativeConversationalRetrievalChain
 from core.config import settings
+from core.executor import run_blocking
+from core.metrics import metrics
+from core.registry import get_registry
+from core.semantic_cache import SemanticCache
+from core.streaming import (
+    CUMULATIVE,
+    TRUNCATED_MARKER,
+    PrefetchedStream,
+    StreamEncoder,
+    coalesce_tokens,
+    merge_streams,
+    record_cancellation,
+    record_completion,
+    run_shielded,
+)
 from langsmith import traceable
 from langchain.callbacks import AsyncIteratorCallbackHandler
-from typing import List
+from typing import Dict, List, Tuple
 from schemas.message import LegalChatAdd
 from core.prompt import (
     general_chat_qa_prompt_template,
-    multi_query_prompt_template,
     condense_question_prompt_template,
     summary_legal_conversation_prompt_template,
     legal_chat_qa_prompt_template,
@@ -40,8 +51,9 @@ from crud.chat import (
     add_legal_chat_message,
     add_legal_session_summary,
     legal_session_exist,
-    init_postgres_chat_memory,
-    summarize_session_streaming,
+    init_legal_session_memory,
+    schedule_title_refinement,
+    session_title_tokens,
 )
 
 from log_config import configure_logging
@@ -56,19 +68,17 @@ os.environ["LANGCHAIN_API_KEY"] = "lsv2_pt_1fa51f9686224ee4acca7a6c15076099_9aae
 
 session_store = {}
 
-llm = ChatOpenAI(
-    model_name=settings.LLM_MODEL_NAME,
-    temperature=0,
-    max_tokens=3000,
-)
-question_llm = ChatOpenAI(
-    model_name=settings.QUESTION_MODEL_NAME,
-    temperature=0.3,
-    max_tokens=3000,
-)
-embeddings = OpenAIEmbeddings(model="text-embedding-3-large")
-
 namespace_classifier = Classifier()
+LEGAL_CASE_NAMESPACES = ("YARGITAY", "DANISTAY")
+
+# /rag/get-legal-cases results per (session_id, number of stored messages), with
+# whether they were precomputed after the answer. Kept in process memory: a request
+# served by another worker computes them on demand.
+legal_cases_cache = TTLCache(
+    maxsize=settings.LEGAL_CASES_CACHE_SIZE, ttl=settings.LEGAL_CASES_CACHE_TTL_SECONDS
+)
+_legal_cases_tasks: Dict[str, asyncio.Task] = {}
+metrics.register_gauge("legal_cases_cache", legal_cases_cache.stats)
 
 
 class QueueCallbackHandler(AsyncIteratorCallbackHandler):
@@ -77,54 +87,90 @@ class QueueCallbackHandler(AsyncIteratorCallbackHandler):
         return self.done.set()
 
 
-@traceable(run_type="llm", name="RAG with Legal Cases", project_name="adaletgpt")
-def rag_chat(question: str, session_id: str = None):
-    logger.info(f"Starting rag_chat for session_id: {session_id}")
-    logger.debug(f"Question received: {question}")
-
-    QA_CHAIN_PROMPT = PromptTemplate.from_template(
-        legal_chat_qa_prompt_template
-    )
-
-    embeddings = OpenAIEmbeddings(model="text-embedding-3-large")
+def _conversational_retrieval_chain(registry, **kwargs):
+    """
+    ConversationalRetrievalChain.from_llm, with retrieval for the raw question
+    started alongside the question condensation when SPECULATIVE_RETRIEVAL is on.
+    """
+    if settings.SPECULATIVE_RETRIEVAL:
+        return SpeculativeConversationalRetrievalChain.from_llm(
+            embeddings=registry.embeddings,
+            similarity_threshold=settings.SPECULATIVE_SIMILARITY_THRESHOLD,
+            **kwargs,
+        )
+    return ConversationalRetrievalChain.from_llm(**kwargs)
 
-    docsearch = PineconeVectorStore(
-        pinecone_api_key=settings.PINECONE_API_KEY,
-        embedding=embeddings,
-        index_name=settings.LEGAL_CASE_INDEX_NAME,
-    )
 
-    compressor = CohereRerank(top_n=10, cohere_api_key=settings.COHERE_API_KEY)
-    compression_retriever = ContextualCompressionRetriever(
-        base_compressor=compressor,
-        base_retriever=docsearch.as_retriever(search_kwargs={"k": 50}),
-    )
-    chat_memory = init_postgres_chat_memory(session_id=session_id)
-    memory = ConversationSummaryBufferMemory(
-        llm=llm,
+def _rag_chat_memory(registry, session_id: str):
+    return init_legal_session_memory(
+        session_id=session_id,
+        llm=registry.llm,
         memory_key="chat_history",
         return_messages="on",
-        chat_memory=chat_memory,
         max_token_limit=3000,
         output_key="answer",
         ai_prefix="Question",
         human_prefix="Answer",
     )
 
-    qa = ConversationalRetrievalChain.from_llm(
-        llm=llm,
+
+def _build_rag_chat_chain(registry, memory):
+    QA_CHAIN_PROMPT = PromptTemplate.from_template(
+        legal_chat_qa_prompt_template
+    )
+
+    compression_retriever = registry.retriever(
+        settings.LEGAL_CASE_INDEX_NAME, k=50, top_n=10, pack=True
+    )
+
+    return _conversational_retrieval_chain(
+        registry,
+        llm=registry.llm,
         retriever=compression_retriever,
         return_source_documents=True,
-        condense_question_llm=question_llm,
+        condense_question_llm=registry.question_llm,
         combine_docs_chain_kwargs={"prompt": QA_CHAIN_PROMPT},
         memory=memory,
     )
+
+
+@traceable(run_type="llm", name="RAG with Legal Cases", project_name="adaletgpt")
+def rag_chat(question: str, session_id: str = None):
+    """
+    Sync RAG chat. Safe to call through run_blocking: the speculative retrieval
+    it waits on runs on the separate speculation executor.
+    """
+    logger.info(f"Starting rag_chat for session_id: {session_id}")
+    logger.debug(f"Question received: {question}")
+
+    registry = get_registry()
+    memory = _rag_chat_memory(registry, session_id)
+    qa = _build_rag_chat_chain(registry, memory)
     logger.debug("Initialized ConversationalRetrievalChain in rag_chat")
     result = qa.invoke({"question": question, "chat_history": []})
     logger.info("rag_chat completed successfully")
     return result
 
 
+@traceable(run_type="llm", name="RAG with Legal Cases", project_name="adaletgpt")
+async def arag_chat(question: str, session_id: str = None):
+    """
+    Async version of rag_chat. The chain runs with ainvoke; the Postgres
+    connection, the rolling summary and the memory load and save during the
+    chain all run on the bounded blocking executor (see core/memory.py).
+    """
+    logger.info(f"Starting arag_chat for session_id: {session_id}")
+    logger.debug(f"Question received: {question}")
+
+    registry = get_registry()
+    memory = await run_blocking(_rag_chat_memory, registry, session_id)
+    qa = _build_rag_chat_chain(registry, memory)
+    logger.debug("Initialized ConversationalRetrievalChain in arag_chat")
+    result = await qa.ainvoke({"question": question, "chat_history": []})
+    logger.info("arag_chat completed successfully")
+    return result
+
+
 @traceable(
     run_type="llm", name="RAG streaming with Legal Cases", project_name="adaletgpt"
 )
@@ -138,51 +184,36 @@ async def rag_streaming_chat(
     legal_file_name: str,
     chat_history: Any = [],
     db_session: Session = None,
+    stream_protocol: int = CUMULATIVE,
 ):
     logger.info(f"Starting rag_streaming_chat for session_id: {session_id}, user_id: {user_id}")
     logger.debug(f"Standalone question: {standalone_question}")
     logger.debug(f"Question: {question}")
     logger.debug(f"Legal attached: {legal_attached}, legal_file_name: {legal_file_name}, legal_s3_key: {legal_s3_key}")
 
+    registry = get_registry()
     answer_streaming_callback = QueueCallbackHandler()
-    summary_streaming_callback = QueueCallbackHandler()
-    streaming_llm = ChatOpenAI(
+    streaming_llm = registry.chat_llm(
         streaming=True,
         callbacks=[answer_streaming_callback],
         temperature=0,
         max_tokens=3000,
         model_name=settings.LLM_MODEL_NAME,
     )
-    summary_streaming_llm = ChatOpenAI(
-        streaming=True,
-        callbacks=[summary_streaming_callback],
-        temperature=0,
-        max_tokens=3000,
-        model_name=settings.LLM_MODEL_NAME,
-    )
     QA_CHAIN_PROMPT = PromptTemplate.from_template(
         legal_chat_qa_prompt_template
     )
 
-    embeddings = OpenAIEmbeddings(model="text-embedding-3-large")
-
-    docsearch = PineconeVectorStore(
-        pinecone_api_key=settings.PINECONE_API_KEY,
-        embedding=embeddings,
-        index_name=settings.LEGAL_CASE_INDEX_NAME,
-    )
-
-    compressor = CohereRerank(top_n=10, cohere_api_key=settings.COHERE_API_KEY)
-    compression_retriever = ContextualCompressionRetriever(
-        base_compressor=compressor,
-        base_retriever=docsearch.as_retriever(search_kwargs={"k": 50}),
+    compression_retriever = registry.retriever(
+        settings.LEGAL_CASE_INDEX_NAME, k=50, top_n=10, pack=True
     )
 
-    qa = ConversationalRetrievalChain.from_llm(
+    qa = _conversational_retrieval_chain(
+        registry,
         llm=streaming_llm,
         retriever=compression_retriever,
         return_source_documents=True,
-        condense_question_llm=question_llm,
+        condense_question_llm=registry.question_llm,
         combine_docs_chain_kwargs={"prompt": QA_CHAIN_PROMPT},
     )
     logger.debug("Initialized ConversationalRetrievalChain in rag_streaming_chat")
@@ -190,73 +221,87 @@ async def rag_streaming_chat(
     answer_task = asyncio.create_task(
         qa.ainvoke({"question": standalone_question, "chat_history": chat_history})
     )
+    # A new session gets its title from the question, generated alongside the answer
+    title_stream = None
+    new_session = not await run_blocking(
+        legal_session_exist, session_id=session_id, session=db_session
+    )
+    if new_session:
+        logger.info(f"Session {session_id} does not exist. Generating title.")
+        title_stream = PrefetchedStream(session_title_tokens(question, user_id))
+    encoder = StreamEncoder(stream_protocol)
     answer = ""
-    async for answer_token in answer_streaming_callback.aiter():
-        logger.debug(f"Streaming answer token: {answer_token}")
-        answer += answer_token
-        data = json.dumps(
-            {
-                "message": {
-                    "data_type": 0,
-                    "content": answer,
-                }
-            }
-        )
-        yield data
-
-    await answer_task
-
-    if legal_session_exist(session_id=session_id, session=db_session) == False:
-        logger.info(f"Session {session_id} does not exist. Generating summary.")
-        summary_task = asyncio.create_task(
-            summarize_session_streaming(
-                question=question, answer=answer, llm=summary_streaming_llm
-            )
-        )
-        summary = ""
-        async for summary_token in summary_streaming_callback.aiter():
-            summary += summary_token
-            logger.debug(f"Streaming summary token: {summary_token}")
-            data_summary = json.dumps(
-                {
-                    "message": {
-                        "data_type": 1,
-                        "content": summary,
-                    }
-                }
+    answer_done = False
+    try:
+        streams = {
+            0: coalesce_tokens(
+                answer_streaming_callback.aiter(),
+                settings.STREAM_COALESCE_WINDOW_MS,
+                settings.STREAM_COALESCE_MAX_BYTES,
             )
-            yield data_summary
-        await summary_task
-
-        add_legal_session_summary(
-            user_id=user_id, session_id=session_id, summary=summary, session=db_session
-        )
-        logger.info(f"Added legal session summary for session_id: {session_id}")
-
-    legal_file_data = json.dumps(
-        {
-            "message": {
-                "data_type": 2,
-                "content": legal_file_name,
-            }
-        }
-    )
-
-    yield legal_file_data
-    logger.debug(f"Yielded legal file name: {legal_file_name}")
-
-    s3_key_data = json.dumps(
-        {
-            "message": {
-                "data_type": 3,
-                "content": legal_s3_key,
-            }
         }
-    )
-
-    yield s3_key_data
-    logger.debug(f"Yielded legal S3 key: {legal_s3_key}")
+        if title_stream is not None:
+            streams[1] = title_stream
+        title = ""
+        async for data_type, token in merge_streams(streams):
+            if data_type == 1:
+                title += token
+            else:
+                logger.debug(f"Streaming answer token: {token}")
+                answer += token
+            data = encoder.text(data_type, token)
+            if data:
+                yield data
+
+        await answer_task
+        answer_done = True
+
+        if new_session:
+            await add_legal_session_summary(
+                user_id=user_id, session_id=session_id, summary=title.strip(), session=db_session
+            )
+            schedule_title_refinement(session_id, question, user_id)
+            logger.info(f"Added legal session summary for session_id: {session_id}")
+
+        legal_file_data = encoder.value(2, legal_file_name)
+
+        yield legal_file_data
+        logger.debug(f"Yielded legal file name: {legal_file_name}")
+
+        s3_key_data = encoder.value(3, legal_s3_key)
+
+        yield s3_key_data
+        logger.debug(f"Yielded legal S3 key: {legal_s3_key}")
+
+        complete_data = encoder.complete()
+        if complete_data:
+            yield complete_data
+    except (asyncio.CancelledError, GeneratorExit):
+        # The SSE response cancels this generator when the client disconnects:
+        # stop paying for tokens nobody reads and keep what was already streamed.
+        logger.info(f"Client disconnected from session {session_id}, cancelling generation")
+        if not answer_task.done():
+            answer_task.cancel()
+        if title_stream is not None:
+            title_stream.cancel()
+        if not answer_done:
+            record_cancellation(answer, max_tokens=3000)
+        if answer:
+            await run_shielded(
+                add_chat_history(
+                    user_id=user_id,
+                    session_id=session_id,
+                    question=question,
+                    answer=answer if answer_done else answer + TRUNCATED_MARKER,
+                    legal_attached=legal_attached,
+                    legal_file_name=legal_file_name,
+                    legal_s3_key=legal_s3_key,
+                    db_session=db_session,
+                )
+            )
+        raise
 
+    record_completion(answer)
     logger.debug("Adding chat history")
     await add_chat_history(
         user_id=user_id,
@@ -268,6 +313,7 @@ async def rag_streaming_chat(
         legal_s3_key=legal_s3_key,
         db_session=db_session,
     )
+    schedule_legal_cases(session_id)
     logger.info("rag_streaming_chat completed successfully")
 
 
@@ -280,6 +326,30 @@ async def add_chat_history(
     legal_file_name: str,
     legal_s3_key: str,
     db_session: Session,
+):
+    """Store the question and answer of a turn; the commits run on the blocking executor."""
+    await run_blocking(
+        _add_chat_history,
+        user_id,
+        session_id,
+        question,
+        answer,
+        legal_attached,
+        legal_file_name,
+        legal_s3_key,
+        db_session,
+    )
+
+
+def _add_chat_history(
+    user_id: int,
+    session_id: str,
+    question: str,
+    answer: str,
+    legal_attached: bool,
+    legal_file_name: str,
+    legal_s3_key: str,
+    db_session: Session,
 ):
     logger.info(f"Adding chat history for user_id: {user_id}, session_id: {session_id}")
     logger.debug(f"Question: {question}")
@@ -312,48 +382,50 @@ async def add_chat_history(
     logger.info("Chat history added successfully")
 
 
-@traceable(run_type="llm", name="Get Relevant Legal Cases", project_name="adaletgpt")
-def get_relevant_legal_cases(session_id: str):
-    logger.info(f"Retrieving relevant legal cases for session_id: {session_id}")
-    chat_memory = init_postgres_chat_memory(session_id=session_id)
-    memory = ConversationSummaryBufferMemory(
-        llm=llm,
+def _load_conversation(session_id: str) -> Tuple[str, int]:
+    """
+    The conversation of a session as its rolling summary followed by the recent
+    "Human:/AI:" lines, and its number of messages, which identifies the turn the
+    legal cases are computed for.
+    """
+    memory = init_legal_session_memory(
+        session_id=session_id,
+        llm=get_registry().llm,
         memory_key="chat_history",
-        chat_memory=chat_memory,
         max_token_limit=3000,
         return_messages=False,
         output_key="answer",
         ai_prefix="AI",
         human_prefix="Human",
     )
-    messages = memory.load_memory_variables({})
-    if messages["chat_history"] == "":
-        logger.info("No chat history found")
-        return []
-    logger.debug(f"Chat history: {messages['chat_history']}")
+    conversation = memory.load_memory_variables({})["chat_history"]
+    return conversation, memory.summarized_messages + len(memory.chat_memory.messages)
+
 
+def _legal_cases_chain(registry):
     prompt = PromptTemplate(
         input_variables=["conversation"],
         template=summary_legal_conversation_prompt_template,
     )
+    return LLMChain(llm=registry.llm, prompt=prompt)
 
-    llm_chain = LLMChain(llm=llm, prompt=prompt)
-    response = llm_chain.invoke({"conversation": messages["chat_history"]})
-    conversation_summary = response["text"]
-    logger.debug(f"Conversation summary: {conversation_summary}")
 
-    embeddings = OpenAIEmbeddings(model="text-embedding-3-large")
+@traceable(run_type="llm", name="Get Relevant Legal Cases", project_name="adaletgpt")
+def get_relevant_legal_cases(session_id: str):
+    logger.info(f"Retrieving relevant legal cases for session_id: {session_id}")
+    registry = get_registry()
+    conversation, _ = _load_conversation(session_id)
+    if conversation == "":
+        logger.info("No chat history found")
+        return []
+    logger.debug(f"Chat history: {conversation}")
 
-    docsearch = PineconeVectorStore(
-        pinecone_api_key=settings.PINECONE_API_KEY,
-        embedding=embeddings,
-        index_name=settings.LEGAL_CASE_INDEX_NAME,
-    )
+    response = _legal_cases_chain(registry).invoke({"conversation": conversation})
+    conversation_summary = response["text"]
+    logger.debug(f"Conversation summary: {conversation_summary}")
 
-    compressor = CohereRerank(top_n=5, cohere_api_key=settings.COHERE_API_KEY)
-    compression_retriever = ContextualCompressionRetriever(
-        base_compressor=compressor,
-        base_retriever=docsearch.as_retriever(search_kwargs={"k": 50}),
+    compression_retriever = registry.retriever(
+        settings.LEGAL_CASE_INDEX_NAME, k=50, top_n=5
     )
 
     reranked_docs = compression_retriever.get_relevant_documents(
@@ -367,24 +439,99 @@ def get_relevant_legal_cases(session_id: str):
     return legal_cases_docs
 
 
-@traceable(
-    run_type="llm",
-    name="RAG regulation chat",
-    project_name="adaletgpt",
-)
-def rag_regulation(question: str):
-    logger.info("Starting rag_regulation")
-    logger.debug(f"Question: {question}")
+async def _compute_legal_cases(conversation: str) -> List[str]:
+    registry = get_registry()
+    response = await _legal_cases_chain(registry).ainvoke({"conversation": conversation})
+    conversation_summary = response["text"]
+    logger.debug(f"Conversation summary: {conversation_summary}")
+
+    compression_retriever = registry.retriever(
+        settings.LEGAL_CASE_INDEX_NAME, k=50, top_n=5
+    )
+    reranked_docs = await compression_retriever.ainvoke(conversation_summary)
+    logger.debug("Retrieved and reranked documents")
+    return [doc.page_content for doc in reranked_docs]
+
 
+@traceable(run_type="llm", name="Get Relevant Legal Cases", project_name="adaletgpt")
+async def aget_relevant_legal_cases(session_id: str):
+    """
+    Async version of get_relevant_legal_cases. Loading the chat history runs on the
+    blocking executor. Results are kept per (session, turn): a result precomputed
+    after the last answer is returned at once, and a precomputation still running
+    for the session is awaited instead of started again.
+    """
+    logger.info(f"Retrieving relevant legal cases for session_id: {session_id}")
+    conversation, turn = await run_blocking(_load_conversation, session_id)
+    if conversation == "":
+        logger.info("No chat history found")
+        return []
+    logger.debug(f"Chat history: {conversation}")
+
+    key = (session_id, turn)
+    cached = legal_cases_cache.get(key)
+    running = _legal_cases_tasks.get(session_id)
+    if cached is None and running is not None:
+        with contextlib.suppress(Exception):
+            await asyncio.shield(running)
+        cached = legal_cases_cache.get(key)
+    if cached is not None:
+        legal_cases, precomputed = cached
+        if precomputed:
+            metrics.incr("legal_cases.precomputed")
+            logger.info(f"Returning precomputed legal cases for turn {turn}")
+        else:
+            metrics.incr("legal_cases.cache_hits")
+            logger.info(f"Returning cached legal cases for turn {turn}")
+        return legal_cases
+
+    metrics.incr("legal_cases.on_demand")
+    legal_cases = await _compute_legal_cases(conversation)
+    legal_cases_cache.set(key, (legal_cases, False))
+    logger.info("Relevant legal cases retrieved successfully")
+    return legal_cases
+
+
+async def _precompute_legal_cases(session_id: str):
+    start = time.perf_counter()
+    conversation, turn = await run_blocking(_load_conversation, session_id)
+    if conversation == "" or legal_cases_cache.get((session_id, turn)) is not None:
+        return
+    legal_cases_cache.set((session_id, turn), (await _compute_legal_cases(conversation), True))
+    metrics.observe("legal_cases.precompute_ms", (time.perf_counter() - start) * 1000)
+    logger.info(f"Precomputed legal cases for session_id: {session_id}, turn {turn}")
+
+
+def _forget_legal_cases_task(session_id: str, task: asyncio.Task):
+    if _legal_cases_tasks.get(session_id) is task:
+        del _legal_cases_tasks[session_id]
+    if not task.cancelled() and task.exception() is not None:
+        logger.warning(f"Legal cases precomputation failed for {session_id}: {task.exception()}")
+
+
+def schedule_legal_cases(session_id: str):
+    """
+    Start computing the legal cases of the session's latest turn in the background,
+    when LEGAL_CASES_PRECOMPUTE is on. A precomputation still running for an older
+    turn of the session is cancelled.
+    """
+    if not settings.LEGAL_CASES_PRECOMPUTE:
+        return
+    previous = _legal_cases_tasks.get(session_id)
+    if previous is not None and not previous.done():
+        previous.cancel()
+    task = asyncio.create_task(_precompute_legal_cases(session_id))
+    _legal_cases_tasks[session_id] = task
+    task.add_done_callback(lambda done: _forget_legal_cases_task(session_id, done))
+
+
+def _build_regulation_chain(registry):
     QA_CHAIN_PROMPT = PromptTemplate.from_template(
         general_chat_qa_prompt_template
     )
-
-    QUERY_PROMPT = PromptTemplate(
-        input_variables=["question"],
-        template=multi_query_prompt_template,
+    document_llm_chain = LLMChain(
+        llm=registry.llm, prompt=QA_CHAIN_PROMPT, verbose=False
     )
-    document_llm_chain = LLMChain(llm=llm, prompt=QA_CHAIN_PROMPT, verbose=False)
     document_prompt = PromptTemplate(
         input_variables=["page_content", "source"],
         template="Context:\n \tContent:{page_content}\n \t Source Link:{source}",
@@ -398,93 +545,116 @@ def rag_regulation(question: str):
         condense_question_prompt_template
     )
     question_generator_chain = LLMChain(
-        llm=question_llm, prompt=condense_question_prompt
+        llm=registry.question_llm, prompt=condense_question_prompt
     )
-
-    docsearch = PineconeVectorStore(
-        pinecone_api_key=settings.PINECONE_API_KEY,
-        embedding=embeddings,
-        index_name=settings.INDEX_NAME,
+    compression_retriever = registry.retriever(
+        settings.INDEX_NAME,
         namespace="YONETMELIK",
+        k=50,
+        top_n=10,
+        multi_query=True,
+        pack=True,
     )
-
-    base_retriever = MultiQueryRetriever.from_llm(
-        retriever=docsearch.as_retriever(search_kwargs={"k": 50}),
-        llm=ChatOpenAI(model_name="gpt-4o", temperature=0, max_tokens=3000),
-        prompt=QUERY_PROMPT,
-    )
-    logger.debug("Initialized MultiQueryRetriever in rag_regulation")
-
-    compressor = CohereRerank(top_n=10, cohere_api_key=settings.COHERE_API_KEY)
-    compression_retriever = ContextualCompressionRetriever(
-        base_compressor=compressor, base_retriever=base_retriever
-    )
-
-    qa = ConversationalRetrievalChain(
+    return ConversationalRetrievalChain(
         combine_docs_chain=combine_documents_chain,
         question_generator=question_generator_chain,
         verbose=False,
         retriever=compression_retriever,
         return_source_documents=False,
     )
-    logger.debug("Initialized ConversationalRetrievalChain in rag_regulation")
-    result = qa.invoke({"question": question, "chat_history": []})
-    logger.info("rag_regulation completed successfully")
-    return result
 
 
 @traceable(
     run_type="llm",
-    name="RAG regulation chat without source",
+    name="RAG regulation chat",
     project_name="adaletgpt",
 )
-async def rag_regulation_without_source(question: str):
-    logger.info("Starting rag_regulation_without_source")
+def rag_regulation(question: str):
+    logger.info("Starting rag_regulation")
     logger.debug(f"Question: {question}")
 
-    QA_CHAIN_PROMPT = PromptTemplate.from_template(
-        general_chat_without_source_qa_prompt_template
+    registry = get_registry()
+    qa = registry.get_or_create(
+        ("chain", "rag_regulation"), lambda: _build_regulation_chain(registry)
     )
+    logger.debug("Loaded ConversationalRetrievalChain in rag_regulation")
+    result = qa.invoke({"question": question, "chat_history": []})
+    logger.info("rag_regulation completed successfully")
+    return result
+
 
-    QUERY_PROMPT = PromptTemplate(
-        input_variables=["question"],
-        template=multi_query_prompt_template,
+def _build_regulation_answer_cache():
+    answer_cache = SemanticCache(
+        threshold=settings.SEMANTIC_CACHE_THRESHOLD,
+        maxsize=settings.SEMANTIC_CACHE_SIZE,
+        ttl=settings.SEMANTIC_CACHE_TTL_SECONDS,
     )
+    metrics.register_gauge("regulation_answer_cache", answer_cache.stats)
+    return answer_cache
 
+
+def _build_regulation_without_source_chain(registry):
+    QA_CHAIN_PROMPT = PromptTemplate.from_template(
+        general_chat_without_source_qa_prompt_template
+    )
     condense_question_prompt = PromptTemplate.from_template(
         condense_question_prompt_template
     )
-
-    docsearch = PineconeVectorStore(
-        pinecone_api_key=settings.PINECONE_API_KEY,
-        embedding=embeddings,
-        index_name=settings.INDEX_NAME,
+    compression_retriever = registry.retriever(
+        settings.INDEX_NAME,
         namespace="YONETMELIK",
+        k=50,
+        top_n=10,
+        multi_query=True,
+        pack=True,
     )
-
-    base_retriever = MultiQueryRetriever.from_llm(
-        retriever=docsearch.as_retriever(search_kwargs={"k": 50}),
-        llm=ChatOpenAI(model_name="gpt-4o", temperature=0, max_tokens=3000),
-        prompt=QUERY_PROMPT,
-    )
-    logger.debug("Initialized MultiQueryRetriever in rag_regulation_without_source")
-
-    compressor = CohereRerank(top_n=10, cohere_api_key=settings.COHERE_API_KEY)
-    compression_retriever = ContextualCompressionRetriever(
-        base_compressor=compressor, base_retriever=base_retriever
-    )
-
-    qa = ConversationalRetrievalChain.from_llm(
-        llm=llm,
+    return ConversationalRetrievalChain.from_llm(
+        llm=registry.llm,
         retriever=compression_retriever,
         return_source_documents=False,
         condense_question_prompt=condense_question_prompt,
-        condense_question_llm=question_llm,
+        condense_question_llm=registry.question_llm,
         verbose=False,
         combine_docs_chain_kwargs={"prompt": QA_CHAIN_PROMPT},
     )
-    logger.debug("Initialized ConversationalRetrievalChain in rag_regulation_without_source")
+
+
+@traceable(
+    run_type="llm",
+    name="RAG regulation chat without source",
+    project_name="adaletgpt",
+)
+async def rag_regulation_without_source(question: str):
+    logger.info("Starting rag_regulation_without_source")
+    logger.debug(f"Question: {question}")
+
+    registry = get_registry()
+    if settings.SEMANTIC_CACHE_ENABLED:
+        answer_cache = registry.get_or_create(
+            ("semantic_cache", "rag_regulation_without_source"),
+            _build_regulation_answer_cache,
+        )
+        cache_version = f"{settings.INDEX_NAME}:YONETMELIK:{settings.REGULATION_INDEX_VERSION}"
+        question_vector = await registry.embeddings.aembed_query_array(question)
+        cached = answer_cache.lookup(question_vector, cache_version)
+        if cached is not None:
+            answer, similarity, cached_question = cached
+            logger.info(
+                f"rag_regulation_without_source served from semantic cache (similarity {similarity:.3f})"
+            )
+            logger.debug(f"Cached question: {cached_question}")
+            return {"question": question, "chat_history": [], "answer": answer}
+
+    qa = registry.get_or_create(
+        ("chain", "rag_regulation_without_source"),
+        lambda: _build_regulation_without_source_chain(registry),
+    )
+    logger.debug("Loaded ConversationalRetrievalChain in rag_regulation_without_source")
     result = await qa.ainvoke({"question": question, "chat_history": []})
+    if settings.SEMANTIC_CACHE_ENABLED:
+        answer_cache.add(
+            question_vector, result["answer"], cache_version, question=question
+        )
     logger.info("rag_regulation_without_source completed successfully")
     return result
 
@@ -498,52 +668,39 @@ async def rag_legal_source(question: str):
     logger.info("Starting rag_legal_source")
     logger.debug(f"Question: {question}")
 
-    namespace = namespace_classifier.classify(question=question)
-    logger.debug(f"Classified namespace: {namespace}")
-
-    docsearch = PineconeVectorStore(
-        pinecone_api_key=settings.PINECONE_API_KEY,
-        embedding=embeddings,
-        index_name=settings.LEGAL_CASE_INDEX_NAME,
+    # "parallel" searches every legal case namespace concurrently and lets the
+    # reranker choose, instead of waiting for the namespace classifier.
+    if settings.LEGAL_NAMESPACE_MODE == "parallel":
+        namespace = LEGAL_CASE_NAMESPACES
+        namespaces = LEGAL_CASE_NAMESPACES
+    else:
+        namespace = await namespace_classifier.aclassify(question=question)
+        namespaces = (namespace,)
+    logger.debug(f"Legal case namespace: {namespace}")
+
+    # With a BM25 index for the namespace, lexical fusion covers the exact terms
+    # the LLM multi-query expansion was added for, so the expansion is skipped.
+    registry = get_registry()
+    has_lexical = all(
+        registry.lexical_index(settings.LEGAL_CASE_INDEX_NAME, ns) is not None
+        for ns in namespaces
+    )
+    compression_retriever = registry.retriever(
+        settings.LEGAL_CASE_INDEX_NAME,
         namespace=namespace,
+        k=10,
+        top_n=6,
+        multi_query=settings.LEGAL_SOURCE_MULTI_QUERY or not has_lexical,
+        lexical=has_lexical,
     )
-
-    retriever_sim = docsearch.as_retriever(
-        search_type="similarity", search_kwargs={"k": 10}
-    )
-    logger.debug("Initialized similarity retriever in rag_legal_source")
-
-    MULTI_QUERY_PROMPT = PromptTemplate(
-        input_variables=["question"],
-        template=multi_query_prompt_template,
-    )
-    multi_retriever = MultiQueryRetriever.from_llm(
-        retriever=retriever_sim,
-        llm=ChatOpenAI(model_name="gpt-4o", temperature=0, max_tokens=3000),
-        prompt=MULTI_QUERY_PROMPT,
-    )
-    logger.debug("Initialized MultiQueryRetriever in rag_legal_source")
-
-    compressor = CohereRerank(top_n=6, cohere_api_key=settings.COHERE_API_KEY)
-    compression_retriever = ContextualCompressionRetriever(
-        base_compressor=compressor, base_retriever=multi_retriever
-    )
-    logger.debug("Initialized ContextualCompressionRetriever in rag_legal_source")
+    logger.debug("Loaded ContextualCompressionRetriever in rag_legal_source")
 
     result = await compression_retriever.ainvoke(question)
     logger.info("rag_legal_source completed successfully")
     return result
 
 
-@traceable(
-    run_type="llm",
-    name="RAG with Legal Cases with source link",
-    project_name="adaletgpt",
-)
-async def rag_legal_source_v2(question: str):
-    logger.info("Starting rag_legal_source_v2")
-    logger.debug(f"Question: {question}")
-
+def _build_legal_source_v2_chain(registry):
     contextualize_q_system_prompt = (
         "Given a chat history and the latest user question "
         "which might reference context in the chat history, "
@@ -558,16 +715,10 @@ async def rag_legal_source_v2(question: str):
             ("human", "{input}"),
         ]
     )
-    docsearch = PineconeVectorStore(
-        pinecone_api_key=settings.PINECONE_API_KEY,
-        embedding=embeddings,
-        index_name=settings.LEGAL_CASE_INDEX_NAME,
-    )
-    retriever = docsearch.as_retriever(search_kwargs={"k": 6})
+    retriever = registry.dense_retriever(settings.LEGAL_CASE_INDEX_NAME, k=6)
     history_aware_retriever = create_history_aware_retriever(
-        llm, retriever, contextualize_q_prompt
+        registry.llm, retriever, contextualize_q_prompt
     )
-    logger.debug("Initialized history-aware retriever in rag_legal_source_v2")
 
     qa_prompt = ChatPromptTemplate.from_messages(
         [
@@ -581,12 +732,26 @@ async def rag_legal_source_v2(question: str):
         template="Context:\n \tContent:{page_content}\n \tSource Link:{source_link}\n\t",
     )
     question_answer_chain = create_stuff_documents_chain(
-        llm=llm, prompt=qa_prompt, document_prompt=document_prompt
+        llm=registry.llm, prompt=qa_prompt, document_prompt=document_prompt
     )
-    logger.debug("Initialized question-answer chain in rag_legal_source_v2")
+    return create_retrieval_chain(history_aware_retriever, question_answer_chain)
 
-    rag_chain = create_retrieval_chain(history_aware_retriever, question_answer_chain)
-    logger.debug("Initialized retrieval chain in rag_legal_source_v2")
+
+@traceable(
+    run_type="llm",
+    name="RAG with Legal Cases with source link",
+    project_name="adaletgpt",
+)
+async def rag_legal_source_v2(question: str):
+    logger.info("Starting rag_legal_source_v2")
+    logger.debug(f"Question: {question}")
+
+    registry = get_registry()
+    rag_chain = registry.get_or_create(
+        ("chain", "rag_legal_source_v2"),
+        lambda: _build_legal_source_v2_chain(registry),
+    )
+    logger.debug("Loaded retrieval chain in rag_legal_source_v2")
 
     result = await rag_chain.ainvoke({"input": question, "chat_history": []})
     logger.info("rag_legal_source_v2 completed successfully")
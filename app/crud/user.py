@@ -15,6 +15,7 @@ from datetime import datetime, timezone, timedelta
 import jwt
 from jwt import ExpiredSignatureError, InvalidTokenError
 from core import settings
+from core.executor import run_blocking
 import secrets
 from crud.notify import send_reset_password_mail, send_verify_email
 import asyncio
@@ -370,6 +371,10 @@ def export_data(user_id: int, db_session: Session):
 
 
 async def calculate_llm_token(user_id: int, db_session: Session, total_llm_tokens: int):
+    await run_blocking(_calculate_llm_token, user_id, db_session, total_llm_tokens)
+
+
+def _calculate_llm_token(user_id: int, db_session: Session, total_llm_tokens: int):
     logger.info(f"Calculating LLM token for user {user_id}")
     try:
         update_user = db_session.query(User).filter(User.id == user_id).first()
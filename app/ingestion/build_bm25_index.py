@@ -0,0 +1,48 @@
+import argparse
+import os
+
+from pinecone import Pinecone
+from dotenv import load_dotenv
+
+from core.bm25 import BM25Index, bm25_index_path
+from ingestion.pinecone_export import iter_vectors
+
+"""script for building the local BM25 index of a legal case namespace from the chunks already pushed to pinecone.
+The vector ids are kept so that BM25 hits can be fused with pinecone hits.
+run from the app directory: python -m ingestion.build_bm25_index --namespace YARGITAY"""
+
+load_dotenv()
+
+INDEX_NAME = os.environ.get("LEGAL_CASE_INDEX_NAME", "adaletgpt-legalcase-data-v1")
+OUTPUT_DIR = os.environ.get("BM25_INDEX_DIR", "bm25")
+
+
+def records(index, namespace):
+    count = 0
+    for id, _, metadata in iter_vectors(index, namespace):
+        text = metadata.pop("text", None)
+        if text is None:
+            continue
+        count += 1
+        if count % 1000 == 0:
+            print("read chunks:", count)
+        yield id, text, metadata
+
+
+def build(index_name, namespace, output_dir):
+    pc = Pinecone(api_key=os.environ.get("PINECONE_API_KEY"))
+    index = pc.Index(index_name)
+    bm25 = BM25Index.build(records(index, namespace))
+    path = bm25_index_path(output_dir, index_name, namespace)
+    bm25.save(path)
+    print(f"saved {len(bm25)} chunks, {len(bm25.terms)} terms to {path}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--index", default=INDEX_NAME)
+    parser.add_argument("--namespace", action="append", default=None)
+    parser.add_argument("--output-dir", default=OUTPUT_DIR)
+    args = parser.parse_args()
+    for namespace in args.namespace or ["YARGITAY", "DANISTAY"]:
+        build(args.index, namespace, args.output_dir)
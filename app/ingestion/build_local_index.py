@@ -0,0 +1,48 @@
+import argparse
+import os
+
+from pinecone import Pinecone
+from dotenv import load_dotenv
+
+from core.local_index import LocalVectorIndex, local_index_path
+from ingestion.pinecone_export import iter_vectors
+
+"""script for exporting pinecone namespaces into the memory-mapped local vector index used when VECTOR_BACKEND is local or local_fallback.
+run from the app directory:
+python -m ingestion.build_local_index --index adaletgpt-legalcase-data-v1 --namespace YARGITAY --namespace DANISTAY --namespace ""
+"""
+
+load_dotenv()
+
+OUTPUT_DIR = os.environ.get("LOCAL_INDEX_DIR", "vectors")
+
+
+def records(index, namespaces):
+    for namespace in namespaces:
+        count = 0
+        for id, values, metadata in iter_vectors(index, namespace):
+            count += 1
+            if count % 1000 == 0:
+                print(f"{namespace or 'default'}: read vectors:", count)
+            yield namespace, id, values, metadata
+        print(f"{namespace or 'default'}: {count} vectors")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--index", required=True)
+    parser.add_argument("--namespace", action="append", required=True)
+    parser.add_argument("--output-dir", default=OUTPUT_DIR)
+    parser.add_argument("--lists", type=int, default=None)
+    parser.add_argument("--quantization", choices=["float32", "int8"], default="float32")
+    args = parser.parse_args()
+
+    pc = Pinecone(api_key=os.environ.get("PINECONE_API_KEY"))
+    path = local_index_path(args.output_dir, args.index)
+    local = LocalVectorIndex.build(
+        path,
+        records(pc.Index(args.index), args.namespace),
+        n_lists=args.lists,
+        quantization=args.quantization,
+    )
+    print(f"saved {len(local)} vectors in {len(local.centroids)} lists to {path}")
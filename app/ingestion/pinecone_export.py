@@ -0,0 +1,29 @@
+"""helpers for reading the ingested chunks back out of a pinecone namespace"""
+
+
+def iter_ids(index, namespace):
+    for id_array in index.list(namespace=namespace):
+        for id in id_array:
+            yield id
+
+
+def iter_vectors(index, namespace, batch_size=100):
+    """
+    Yields (vector_id, values, metadata) for every vector of the namespace.
+    """
+    batch = []
+    for id in iter_ids(index, namespace):
+        batch.append(id)
+        if len(batch) == batch_size:
+            yield from _fetch(index, namespace, batch)
+            batch = []
+    if batch:
+        yield from _fetch(index, namespace, batch)
+
+
+def _fetch(index, namespace, ids):
+    vectors = index.fetch(ids=ids, namespace=namespace)["vectors"]
+    for id in ids:
+        vector = vectors.get(id)
+        if vector is not None:
+            yield id, vector["values"], dict(vector.get("metadata") or {})
@@ -4,6 +4,9 @@ from contextlib import asynccontextmanager
 
 from api.v1 import api_router
 from core import settings
+from core.executor import blocking_executor, speculation_executor
+from core.registry import init_registry, close_registry
+from crud.agent import get_agent
 from log_config import configure_logging
 
 # FastAPI lifespan manager
@@ -14,8 +17,18 @@ async def lifespan(app: FastAPI):
 
     # Startup event
     logger.info("Application startup")
+    # Build the shared retrieval clients once per worker
+    init_registry()
+    # Compile the agent prompt, tools and function definitions before the first request
+    try:
+        get_agent()
+    except Exception as e:
+        logger.warning(f"Could not prebuild the agent: {e}")
     yield
     # Shutdown event
+    await close_registry()
+    blocking_executor.shutdown()
+    speculation_executor.shutdown()
     logger.info("Application shutdown")
 
 # Pass the lifespan context manager to FastAPI
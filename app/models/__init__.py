@@ -3,4 +3,5 @@ from models.token import TokenTable
 from models.chat import ChatHistory
 from models.chat_legal import LegalChatHistory
 from models.session_summary import SessionSummary
-from models.session_summary_legal import LegalSessionSummary
\ No newline at end of file
+from models.session_summary_legal import LegalSessionSummary
+from models.session_memory_legal import LegalSessionMemory
\ No newline at end of file
@@ -0,0 +1,12 @@
+from sqlalchemy import Column, Integer, String, DateTime
+from database.session import Base
+import datetime
+
+
+class LegalSessionMemory(Base):
+    __tablename__ = "legal_session_memory"
+    id = Column(Integer, primary_key=True, index=True)
+    session_id = Column(String(100), nullable=False, unique=True, index=True)
+    summary = Column(String, nullable=False, default="")
+    message_count = Column(Integer, nullable=False, default=0)
+    updated_date = Column(DateTime, default=datetime.datetime.now)
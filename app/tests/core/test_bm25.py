@@ -0,0 +1,67 @@
+import asyncio
+
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+from app.core.bm25 import BM25Index
+from app.core.retrievers import HybridRetriever, reciprocal_rank_fusion
+from app.core.text import tokenize
+
+RECORDS = [
+    ("yargitay-1", "Türk Borçlar Kanunu 344. madde kira bedelinin belirlenmesi", {"source": "a"}),
+    ("yargitay-2", "İşçinin kıdem tazminatı hakkı İş Kanunu 25. madde", {"source": "b"}),
+    ("yargitay-3", "Kira sözleşmesinin feshi ve tahliye davası", {"source": "c"}),
+]
+
+
+class StaticRetriever(BaseRetriever):
+    docs: list
+
+    def _get_relevant_documents(self, query, *, run_manager):
+        return self.docs
+
+
+def test_tokenize_folds_turkish_case_and_stems() -> None:
+    assert tokenize("İşçinin KIDEM tazminatı ve 344. madde") == [
+        "işçin",
+        "kıdem",
+        "tazmi",
+        "344",
+        "madde",
+    ]
+
+
+def test_bm25_ranks_exact_article_match_first(tmp_path) -> None:
+    index = BM25Index.build(RECORDS)
+    docs = index.get_documents("TBK 344. madde kira", k=2)
+    assert [doc.metadata["id"] for doc in docs] == ["yargitay-1", "yargitay-3"]
+    assert docs[0].metadata["source"] == "a"
+
+    path = str(tmp_path / "index.bm25.pkl")
+    index.save(path)
+    loaded = BM25Index.load(path)
+    assert loaded.search("kıdem tazminatı") == index.search("kıdem tazminatı")
+    assert BM25Index.load(str(tmp_path / "missing.pkl")) is None
+
+
+def test_hybrid_retriever_fuses_by_vector_id() -> None:
+    dense = StaticRetriever(
+        docs=[
+            Document(page_content="dense only", metadata={"id": "dense-1", "score": 0.9}),
+            Document(page_content=RECORDS[2][1], metadata={"id": "yargitay-3", "score": 0.8}),
+        ]
+    )
+    retriever = HybridRetriever(dense=dense, lexical=BM25Index.build(RECORDS), lexical_k=2)
+    docs = asyncio.run(retriever.ainvoke("kira sözleşmesi tahliye"))
+    ids = [doc.metadata["id"] for doc in docs]
+    assert ids[0] == "yargitay-3"
+    assert sorted(ids) == ["dense-1", "yargitay-1", "yargitay-3"]
+    assert docs[0].metadata["score"] == 0.8
+
+
+def test_reciprocal_rank_fusion_keeps_first_copy() -> None:
+    first = Document(page_content="x", metadata={"id": "1", "score": 0.5})
+    second = Document(page_content="x", metadata={"id": "1", "bm25_score": 3.0})
+    fused = reciprocal_rank_fusion([[first], [second]], k=60)
+    assert fused == [first]
+    assert fused[0].metadata["rrf_score"] == 2 / 61
@@ -0,0 +1,57 @@
+import time
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from app.core.cache import TTLCache
+from app.core.embedding_cache import CachedEmbeddings
+from app.core.text import normalize_text
+
+
+class CountingEmbeddings(Embeddings):
+    def __init__(self):
+        self.calls = 0
+
+    def embed_documents(self, texts):
+        return [self.embed_query(text) for text in texts]
+
+    def embed_query(self, text):
+        self.calls += 1
+        return [float(len(text)), 0.5, 0.25]
+
+
+def test_ttl_cache_evicts_least_recently_used() -> None:
+    cache = TTLCache(maxsize=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+    assert "b" not in cache
+    assert cache.get("a") == 1
+    assert cache.stats()["evictions"] == 1
+
+
+def test_ttl_cache_expires_entries() -> None:
+    cache = TTLCache(maxsize=10, ttl=0.01)
+    cache.set("a", 1)
+    time.sleep(0.02)
+    assert cache.get("a") is None
+    stats = cache.stats()
+    assert stats["expirations"] == 1
+    assert stats["misses"] == 1
+
+
+def test_normalize_text_uses_turkish_casing() -> None:
+    assert normalize_text("  İŞÇİ   HAKLARI  ") == "işçi hakları"
+    assert normalize_text("Kıdem\nTazminatı") == normalize_text("KIDEM TAZMİNATI")
+
+
+def test_cached_embeddings_reuses_normalized_queries() -> None:
+    underlying = CountingEmbeddings()
+    embeddings = CachedEmbeddings(underlying, maxsize=10)
+    first = embeddings.embed_query("Kıdem tazminatı")
+    second = embeddings.embed_query("KIDEM  TAZMİNATI")
+    assert first == second
+    assert underlying.calls == 1
+    assert embeddings.embed_query_array("kıdem tazminatı").dtype == np.float32
+    assert embeddings.stats()["hits"] == 2
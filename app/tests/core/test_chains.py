@@ -0,0 +1,94 @@
+import asyncio
+import threading
+
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models import FakeListLLM
+from langchain_core.retrievers import BaseRetriever
+
+from app.core import chains
+from app.core.chains import SpeculativeConversationalRetrievalChain
+from app.core.embedding_cache import CachedEmbeddings
+
+
+class TopicEmbeddings(Embeddings):
+    def embed_documents(self, texts):
+        return [self.embed_query(text) for text in texts]
+
+    def embed_query(self, text):
+        return [1.0, 0.0] if "kira" in text.lower() else [0.0, 1.0]
+
+
+class RecordingRetriever(BaseRetriever):
+    queries: list
+    threads: list = []
+
+    def _get_relevant_documents(self, query, *, run_manager):
+        self.queries.append(query)
+        self.threads.append(threading.current_thread().name)
+        return [Document(page_content=f"about {query}")]
+
+
+def build_chain(condensed: str, retriever: RecordingRetriever):
+    return SpeculativeConversationalRetrievalChain.from_llm(
+        llm=FakeListLLM(responses=["cevap"]),
+        condense_question_llm=FakeListLLM(responses=[condensed]),
+        retriever=retriever,
+        return_source_documents=True,
+        embeddings=CachedEmbeddings(TopicEmbeddings()),
+        similarity_threshold=0.9,
+    )
+
+
+HISTORY = [("Kira artışı ne kadar?", "Yüzde 25.")]
+
+
+def test_speculative_results_are_reused_only_for_a_similar_condensed_question() -> None:
+    def wasted():
+        return chains.metrics.snapshot()["counters"].get("pipeline.speculative_wasted_retrievals", 0)
+
+    retriever = RecordingRetriever(queries=[])
+    chain = build_chain("Kira artışı sınırı nedir?", retriever)
+    wasted_before = wasted()
+    result = asyncio.run(chain.ainvoke({"question": "Sınır nedir?", "chat_history": HISTORY}))
+    # "Sınır nedir?" has no topic word, so it lands on the other axis: miss.
+    assert retriever.queries == ["Sınır nedir?", "Kira artışı sınırı nedir?"]
+    assert result["source_documents"][0].page_content == "about Kira artışı sınırı nedir?"
+    assert wasted() == wasted_before + 1
+
+    retriever = RecordingRetriever(queries=[])
+    chain = build_chain("Kira artışı sınırı nedir?", retriever)
+    result = chain.invoke({"question": "Kira sınırı nedir?", "chat_history": HISTORY})
+    assert retriever.queries == ["Kira sınırı nedir?"]
+    assert result["answer"] == "cevap"
+
+
+def test_without_history_there_is_no_speculation() -> None:
+    retriever = RecordingRetriever(queries=[])
+    chain = build_chain("unused", retriever)
+    asyncio.run(chain.ainvoke({"question": "Kira nedir?", "chat_history": []}))
+    assert retriever.queries == ["Kira nedir?"]
+
+
+def test_sync_speculation_does_not_wait_on_the_blocking_executor() -> None:
+    retriever = RecordingRetriever(queries=[], threads=[])
+    chain = build_chain("Kira sınırı nedir?", retriever)
+    # The chain module imports the executor without the app. prefix.
+    from core.executor import blocking_executor
+
+    # Hold every other blocking executor thread while the chain runs on the last one.
+    release = threading.Event()
+    holders = [
+        blocking_executor.submit(release.wait, 5)
+        for _ in range(blocking_executor.max_workers - 1)
+    ]
+    try:
+        future = blocking_executor.submit(
+            chain.invoke, {"question": "Kira sınırı nedir?", "chat_history": HISTORY}
+        )
+        assert future.result(timeout=5)["answer"] == "cevap"
+    finally:
+        release.set()
+        for holder in holders:
+            holder.result()
+    assert retriever.threads[0].startswith("speculation")
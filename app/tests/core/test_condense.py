@@ -0,0 +1,44 @@
+import asyncio
+
+from langchain_core.runnables import RunnableLambda
+
+from app.core.condense import amap_condense, map_condense, split_by_tokens
+from app.core.text import count_tokens
+
+DOCUMENT = "\n\n".join(
+    f"Paragraf {i}. Davacı kira bedelinin tespitini talep etmiş, mahkeme emsal bedelleri incelemiştir."
+    for i in range(200)
+)
+
+
+def test_split_by_tokens_respects_the_chunk_size() -> None:
+    chunks = split_by_tokens(DOCUMENT, 300)
+    assert len(chunks) > 1
+    assert all(count_tokens(chunk) <= 300 for chunk in chunks)
+    assert chunks[0].startswith("Paragraf 0.") and "Paragraf 199." in chunks[-1]
+
+
+def test_map_condense_runs_chunks_concurrently_and_keeps_order() -> None:
+    running, peak, calls = 0, 0, []
+
+    async def condense(inputs):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+        calls.append(inputs["chunk"])
+        return inputs["chunk"].split(".")[0]
+
+    chain = RunnableLambda(lambda inputs: inputs["chunk"].split(".")[0], afunc=condense)
+    condensed = asyncio.run(
+        amap_condense(DOCUMENT, chain, max_tokens=1000, chunk_tokens=300, max_concurrency=3)
+    )
+    assert peak == 3
+    assert condensed.split("\n\n") == [chunk.split(".")[0] for chunk in split_by_tokens(DOCUMENT, 300)]
+
+    # Text that already fits goes to the single call untouched.
+    calls.clear()
+    assert asyncio.run(amap_condense("Kısa metin.", chain, 1000, 300)) == "Kısa metin."
+    assert calls == []
+    assert map_condense(DOCUMENT, chain, 1000, 300) == condensed
@@ -0,0 +1,58 @@
+from langchain_core.documents import Document
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from app.core.context import merge_overlapping, pack_documents
+from app.core.text import count_tokens
+
+CASE = " ".join(
+    f"Daire {i}. bentte kira bedelinin tespiti için emsal kira bedelleri incelenmiştir."
+    for i in range(60)
+)
+
+
+def chunks(source: str, text: str = CASE):
+    splitter = RecursiveCharacterTextSplitter(chunk_size=800, chunk_overlap=300)
+    return splitter.split_documents(
+        [Document(page_content=text, metadata={"source": source, "source_link": source})]
+    )
+
+
+def test_merge_overlapping() -> None:
+    assert merge_overlapping("abcdefgh", "efghijkl", min_overlap=4) == "abcdefghijkl"
+    assert merge_overlapping("efghijkl", "abcdefgh", min_overlap=4) == "abcdefghijkl"
+    assert merge_overlapping("abcdefgh", "cdef", min_overlap=4) == "abcdefgh"
+    assert merge_overlapping("abcdefgh", "ghijkl", min_overlap=4) is None
+
+
+def test_adjacent_chunks_of_a_case_are_merged_once() -> None:
+    case_chunks = chunks("case-1")[:3]
+    other = Document(page_content="Danıştay kararı.", metadata={"source_link": "case-2"})
+    ranked = [case_chunks[1], other, case_chunks[0], case_chunks[2]]
+    for score, doc in zip((0.9, 0.8, 0.7, 0.6), ranked):
+        doc.metadata["relevance_score"] = score
+
+    packed = pack_documents(ranked, max_tokens=10000)
+    assert [doc.metadata["source_link"] for doc in packed] == ["case-1", "case-2"]
+    assert packed[0].metadata["relevance_score"] == 0.9
+    assert packed[0].metadata["merged_chunks"] == 3
+    assert CASE.startswith(packed[0].page_content)
+    assert count_tokens(packed[0].page_content) < sum(
+        count_tokens(doc.page_content) for doc in case_chunks
+    )
+
+
+def test_budget_is_filled_by_score() -> None:
+    def doc(text, source, score):
+        return Document(page_content=text, metadata={"source_link": source, "relevance_score": score})
+
+    big, mid, small = CASE, CASE[:2000], "Kısa karar."
+    budget = count_tokens(mid) + count_tokens(small)
+
+    # A span that does not fit is skipped; a smaller, lower ranked one still does.
+    packed = pack_documents([doc(small, "c", 0.1), doc(big, "a", 0.5), doc(mid, "b", 0.9)], budget)
+    assert [d.metadata["source_link"] for d in packed] == ["b", "c"]
+
+    # The best span alone is over budget and is truncated to it.
+    packed = pack_documents([doc(big, "a", 0.9), doc(small, "c", 0.1)], budget)
+    assert [d.metadata["source_link"] for d in packed] == ["a"]
+    assert count_tokens(packed[0].page_content) <= budget
@@ -0,0 +1,46 @@
+import asyncio
+
+from langchain_core.runnables import RunnableLambda
+
+from app.core.creativity_grader import CreativityGrader, LocalCreativityGrader, llm_parameters
+
+
+def test_local_grader_separates_drafting_from_fact_questions() -> None:
+    local = LocalCreativityGrader()
+    score, confidence = local.predict("Kiracı için tahliye davasına karşı bir dilekçe yazar mısın?")
+    assert score >= 8 and confidence >= 0.8
+    score, confidence = local.predict("İşe iade davasında zamanaşımı süresi nedir?")
+    assert score <= 3 and confidence >= 0.8
+    _, confidence = local.predict("Komşumla sorun yaşıyorum")
+    assert confidence < 0.8
+    assert llm_parameters(5) == {"temperature": 0.5, "max_tokens": 5500}
+
+
+def test_llm_is_only_asked_when_unsure_and_scores_are_cached() -> None:
+    calls = []
+
+    def grade(inputs):
+        calls.append(inputs["question"])
+        return {"creativity_score": 7}
+
+    async def agrade(inputs):
+        return grade(inputs)
+
+    grader = CreativityGrader(grade_chain=RunnableLambda(grade, afunc=agrade))
+
+    assert grader.grade("Kıdem tazminatı ne kadar?") <= 3
+    assert calls == []
+
+    assert grader.grade("Komşumla sorun yaşıyorum") == 7
+    assert asyncio.run(grader.agrade("  KOMŞUMLA sorun yaşıyorum ")) == 7
+    assert calls == ["Komşumla sorun yaşıyorum"]
+
+
+def test_llm_failure_falls_back_to_the_local_score() -> None:
+    def fail(inputs):
+        raise RuntimeError("rate limited")
+
+    grader = CreativityGrader(grade_chain=RunnableLambda(fail))
+    assert grader.grade("Komşumla sorun yaşıyorum") == LocalCreativityGrader().predict(
+        "Komşumla sorun yaşıyorum"
+    )[0]
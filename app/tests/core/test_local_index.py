@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+
+from app.core.local_index import FallbackIndex, LocalVectorIndex
+
+
+class RemoteIndex:
+    def __init__(self):
+        self.calls = []
+
+    def query(self, vector=None, namespace=None, **kwargs):
+        self.calls.append(namespace)
+        return {"matches": [], "namespace": namespace}
+
+
+def build(path, quantization="float32"):
+    rng = np.random.default_rng(1)
+    vectors = rng.normal(size=(400, 16)).astype(np.float32)
+    records = [
+        ("YARGITAY" if i % 2 == 0 else "DANISTAY", f"id-{i}", vectors[i], {"text": f"chunk {i}"})
+        for i in range(len(vectors))
+    ]
+    index = LocalVectorIndex.build(str(path), records, n_lists=8, quantization=quantization)
+    return index, vectors
+
+
+@pytest.mark.parametrize("quantization", ["float32", "int8"])
+def test_local_index_matches_exact_search_within_namespace(tmp_path, quantization) -> None:
+    index, vectors = build(tmp_path, quantization)
+    query = vectors[10] + 0.01
+    normalized = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    scores = normalized[::2] @ (query / np.linalg.norm(query))
+    expected = [f"id-{2 * i}" for i in np.argsort(scores)[::-1][:5]]
+
+    results = index.query(vector=query, top_k=5, namespace="YARGITAY")
+    ids = [match["id"] for match in results["matches"]]
+    if quantization == "float32":
+        index.nprobe = 8
+        exhaustive = index.query(vector=query, top_k=5, namespace="YARGITAY")
+        assert [match["id"] for match in exhaustive["matches"]] == expected
+    assert ids[0] == "id-10"
+    assert all(int(id.split("-")[1]) % 2 == 0 for id in ids)
+    assert results["matches"][0]["metadata"]["text"] == "chunk 10"
+
+
+def test_local_index_reopens_from_memory_maps(tmp_path) -> None:
+    build(tmp_path)
+    index = LocalVectorIndex.load(str(tmp_path))
+    assert isinstance(index.vectors, np.memmap)
+    assert isinstance(index.texts, np.memmap)
+    assert all("text" not in meta for meta in index.metadata)
+    assert index.row_metadata(index.ids.index("id-7")) == {"text": "chunk 7"}
+    assert len(index) == 400
+    assert index.search(np.ones(16), k=3, namespace="YONETMELIK") == []
+    assert LocalVectorIndex.load(str(tmp_path / "missing")) is None
+
+
+def test_fallback_index_uses_remote_for_missing_namespace(tmp_path) -> None:
+    index, vectors = build(tmp_path)
+    remote = RemoteIndex()
+    fallback = FallbackIndex(index, remote)
+    assert fallback.query(vector=vectors[0], top_k=3, namespace="YARGITAY")["matches"]
+    fallback.query(vector=vectors[0], top_k=3, namespace="YONETMELIK")
+    assert remote.calls == ["YONETMELIK"]
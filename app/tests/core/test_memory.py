@@ -0,0 +1,79 @@
+import asyncio
+import threading
+
+from langchain_community.chat_message_histories import ChatMessageHistory
+from langchain_core.language_models import FakeListLLM
+
+from app.core.memory import RollingSummaryMemory
+
+
+class WordCountLLM(FakeListLLM):
+    prompts: list = []
+
+    def _call(self, prompt, stop=None, run_manager=None, **kwargs):
+        self.prompts.append(prompt)
+        return f"özet {len(self.prompts)}"
+
+    def get_num_tokens(self, text: str) -> int:
+        return len(text.split())
+
+
+def test_rolling_summary_only_folds_new_messages() -> None:
+    history = ChatMessageHistory()
+    store = {}
+    llm = WordCountLLM(responses=[""], prompts=[])
+
+    def memory():
+        return RollingSummaryMemory.from_store(
+            chat_memory=history,
+            session_id="s1",
+            load_summary=lambda session_id: store.get(session_id, ("", 0)),
+            save_summary=lambda session_id, summary, count: store.update({session_id: (summary, count)}),
+            llm=llm,
+            memory_key="chat_history",
+            max_token_limit=12,
+            return_messages=False,
+        )
+
+    for turn in range(6):
+        memory().save_context({"input": f"soru {turn} kira artışı"}, {"output": f"cevap {turn} yüzde"})
+
+    summary, count = store["s1"]
+    assert count >= 6
+    # Every summarization call saw only the messages pruned at that turn, not the whole session.
+    assert all("soru 0" not in prompt for prompt in llm.prompts[1:])
+
+    loaded = memory()
+    variables = loaded.load_memory_variables({})["chat_history"]
+    assert variables.startswith(f"System: {summary}")
+    assert "soru 5" in variables and "soru 0" not in variables
+    assert loaded.summarized_messages + len(loaded.chat_memory.messages) == 12
+
+
+def test_async_save_and_load_run_on_the_blocking_executor() -> None:
+    threads = []
+    llm = WordCountLLM(responses=[""], prompts=[])
+
+    def save_summary(session_id, summary, count):
+        threads.append(threading.current_thread().name)
+
+    memory = RollingSummaryMemory.from_store(
+        chat_memory=ChatMessageHistory(),
+        session_id="s1",
+        load_summary=lambda session_id: ("", 0),
+        save_summary=save_summary,
+        llm=llm,
+        memory_key="chat_history",
+        max_token_limit=6,
+        return_messages=False,
+    )
+
+    async def turns():
+        for turn in range(3):
+            await memory.asave_context({"input": f"soru {turn} kira"}, {"output": f"cevap {turn}"})
+        return await memory.aload_memory_variables({})
+
+    variables = asyncio.run(turns())["chat_history"]
+    # The async save prunes like the sync one, on the bounded executor's threads.
+    assert threads and all(name.startswith("blocking") for name in threads)
+    assert variables.startswith("System: özet")
@@ -0,0 +1,74 @@
+import asyncio
+
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.runnables import RunnableLambda
+
+from app.core.retrievers import FanOutMultiQueryRetriever, MultiNamespaceRetriever
+
+
+class StaticRetriever(BaseRetriever):
+    docs: list
+
+    def _get_relevant_documents(self, query, *, run_manager):
+        return [Document(page_content=d.page_content, metadata=dict(d.metadata)) for d in self.docs]
+
+
+def test_multi_namespace_retriever_merges_by_score_and_id() -> None:
+    retriever = MultiNamespaceRetriever(
+        retrievers={
+            "YARGITAY": StaticRetriever(
+                docs=[
+                    Document(page_content="a", metadata={"id": "1", "score": 0.7}),
+                    Document(page_content="b", metadata={"id": "2", "score": 0.5}),
+                ]
+            ),
+            "DANISTAY": StaticRetriever(
+                docs=[
+                    Document(page_content="c", metadata={"id": "3", "score": 0.9}),
+                    Document(page_content="a", metadata={"id": "1", "score": 0.6}),
+                ]
+            ),
+        }
+    )
+    for docs in (retriever.invoke("q"), asyncio.run(retriever.ainvoke("q"))):
+        assert [doc.metadata["id"] for doc in docs] == ["3", "1", "2"]
+        assert docs[0].metadata["namespace"] == "DANISTAY"
+        assert docs[1].metadata["namespace"] == "YARGITAY"
+
+
+class RecordingEmbeddings:
+    def __init__(self):
+        self.queries = []
+
+    async def aembed_query(self, text):
+        self.queries.append(text)
+        return [0.0]
+
+
+def test_multi_query_expands_once_above_the_namespace_fan_out() -> None:
+    expansions = []
+
+    def expand(inputs):
+        expansions.append(inputs["question"])
+        return ["q1", "q2"]
+
+    embeddings = RecordingEmbeddings()
+    retriever = FanOutMultiQueryRetriever(
+        retriever=MultiNamespaceRetriever(
+            retrievers={
+                "YARGITAY": StaticRetriever(
+                    docs=[Document(page_content="a", metadata={"id": "1", "score": 0.7})]
+                ),
+                "DANISTAY": StaticRetriever(
+                    docs=[Document(page_content="b", metadata={"id": "2", "score": 0.9})]
+                ),
+            },
+            embeddings=embeddings,
+        ),
+        llm_chain=RunnableLambda(expand),
+    )
+    docs = asyncio.run(retriever.ainvoke("question"))
+    assert [doc.metadata["id"] for doc in docs] == ["2", "1"]
+    assert expansions == ["question"]
+    assert sorted(embeddings.queries) == ["q1", "q2"]
@@ -0,0 +1,50 @@
+import numpy as np
+
+from app.core.semantic_cache import SemanticCache
+
+
+def test_semantic_cache_returns_answer_above_threshold() -> None:
+    cache = SemanticCache(threshold=0.9, maxsize=10)
+    cache.add([1.0, 0.0, 0.0], "answer", version="v1", question="q")
+    answer, similarity, question = cache.lookup([0.99, 0.05, 0.0], version="v1")
+    assert answer == "answer"
+    assert question == "q"
+    assert similarity > 0.9
+    assert cache.lookup([0.0, 1.0, 0.0], version="v1") is None
+
+
+def test_semantic_cache_drops_entries_on_version_change() -> None:
+    cache = SemanticCache(threshold=0.9, maxsize=10)
+    cache.add([1.0, 0.0], "answer", version="v1")
+    assert cache.lookup([1.0, 0.0], version="v2") is None
+    assert len(cache) == 0
+
+
+def test_semantic_cache_grows_and_evicts_least_recently_used() -> None:
+    cache = SemanticCache(threshold=0.99, maxsize=3, initial_capacity=1)
+    vectors = np.eye(4, dtype=np.float32)
+    for i in range(3):
+        cache.add(vectors[i], f"answer-{i}", version="v1")
+    assert cache.lookup(vectors[0], version="v1")[0] == "answer-0"
+    cache.add(vectors[3], "answer-3", version="v1")
+    assert len(cache) == 3
+    assert cache.lookup(vectors[1], version="v1") is None
+    assert cache.lookup(vectors[0], version="v1")[0] == "answer-0"
+    assert cache.lookup(vectors[3], version="v1")[0] == "answer-3"
+
+
+def test_semantic_cache_evicts_expired_entries_before_least_recently_used(monkeypatch) -> None:
+    clock = [0.0]
+    monkeypatch.setattr("app.core.semantic_cache.time.monotonic", lambda: clock[0])
+    cache = SemanticCache(threshold=0.99, maxsize=2, ttl=10)
+    vectors = np.eye(3, dtype=np.float32)
+    cache.add(vectors[0], "answer-0", version="v1")
+    clock[0] = 4.0
+    cache.add(vectors[1], "answer-1", version="v1")
+    clock[0] = 5.0
+    assert cache.lookup(vectors[0], version="v1")[0] == "answer-0"
+    # answer-0 was used last but has expired; answer-1 is still valid.
+    clock[0] = 12.0
+    cache.add(vectors[2], "answer-2", version="v1")
+    assert cache.lookup(vectors[1], version="v1")[0] == "answer-1"
+    assert cache.lookup(vectors[2], version="v1")[0] == "answer-2"
@@ -0,0 +1,32 @@
+from langchain_core.documents import Document
+
+from app.core.snippets import compact_documents, select_snippets
+from app.core.text import count_tokens
+
+FILLER = "Dosya kapsamındaki tanık beyanları ve bilirkişi raporu incelenmiştir. " * 30
+DECISION = (
+    FILLER
+    + "Kira bedelinin tespiti davasında hak ve nesafet indirimi yapılması gerekir. "
+    + FILLER
+    + "Mahkemece kira artış oranı üzerinden karar verilmesi bozmayı gerektirmiştir."
+)
+
+
+def test_select_snippets_keeps_the_matching_sentences_in_order() -> None:
+    snippet = select_snippets(DECISION, "kira bedeli tespiti artış oranı", 60)
+    assert count_tokens(snippet) <= 60
+    assert snippet.index("hak ve nesafet") < snippet.index("kira artış oranı")
+    assert snippet.startswith("…") and " … " in snippet
+
+    assert select_snippets("Kısa karar.", "kira", 60) == "Kısa karar."
+
+
+def test_compact_documents_keeps_sources_within_the_budget() -> None:
+    documents = [
+        Document(page_content=DECISION, metadata={"source_link": f"https://karar/{i}", "id": i})
+        for i in range(6)
+    ]
+    output = compact_documents(documents, "kira artış oranı", 400)
+    assert count_tokens(output) <= 400
+    assert all(f"Kaynak: https://karar/{i}" in output for i in range(6))
+    assert output.count("kira artış oranı") == 6
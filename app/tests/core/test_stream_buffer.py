@@ -0,0 +1,126 @@
+import asyncio
+
+import json
+
+from app.core.stream_buffer import StreamHub, parse_last_event_id
+from app.core.streaming import CUMULATIVE, DELTA, StreamEncoder
+
+
+async def answer(frames, delay, state):
+    try:
+        for frame in frames:
+            await asyncio.sleep(delay)
+            yield frame
+        state["finished"] = True
+    except asyncio.CancelledError:
+        state["cancelled"] = True
+        raise
+
+
+def test_parse_last_event_id() -> None:
+    assert parse_last_event_id("abc:12") == ("abc", 12)
+    assert parse_last_event_id("abc") is None
+    assert parse_last_event_id("abc:x") is None
+    assert parse_last_event_id(None) is None
+
+
+def test_reconnect_reattaches_to_live_generation_and_replays_finished() -> None:
+    async def main():
+        state = {}
+        hub = StreamHub(grace_seconds=1)
+        stream = hub.start(
+            answer(["a", "b", "c", "d"], 0.01, state), owner=(1, "s"), question="q"
+        )
+        first = []
+        async for event in stream.events():
+            first.append(event)
+            if len(first) == 2:
+                break
+        assert [e["data"] for e in first] == ["a", "b"]
+
+        assert hub.resume(first[-1]["id"], owner=(2, "s"), question="q") is None
+        resumed = [e async for e in hub.resume(first[-1]["id"], owner=(1, "s"), question="q")]
+        assert [e["data"] for e in resumed] == ["c", "d"]
+        assert resumed[-1]["id"] == f"{stream.id}:4"
+
+        replayed = [e async for e in hub.resume(f"{stream.id}:1", owner=(1, "s"), question="q")]
+        assert [e["data"] for e in replayed] == ["b", "c", "d"]
+        assert state == {"finished": True}
+
+    asyncio.run(main())
+
+
+def test_generation_is_cancelled_after_grace_period_without_readers() -> None:
+    async def main():
+        state = {}
+        hub = StreamHub(grace_seconds=0.02)
+        stream = hub.start(answer(["a"] * 100, 0.005, state), owner=1, question="q")
+        async for _ in stream.events():
+            break
+        await asyncio.sleep(0.1)
+        assert state == {"cancelled": True}
+        assert stream.done
+
+    asyncio.run(main())
+
+
+def test_generation_is_cancelled_when_no_reader_ever_attaches() -> None:
+    async def main():
+        state = {}
+        hub = StreamHub(grace_seconds=0.02)
+        stream = hub.start(answer(["a"] * 100, 0.005, state), owner=1, question="q")
+        await asyncio.sleep(0.1)
+        assert state == {"cancelled": True}
+        assert stream.done
+
+    asyncio.run(main())
+
+
+def test_a_new_question_with_a_stale_id_is_not_resumed() -> None:
+    async def main():
+        hub = StreamHub()
+        stream = hub.start(answer(["a", "b"], 0, {}), owner=1, question="Kira artışı ne kadar?")
+        await stream.task
+        stale_id = f"{stream.id}:2"
+        assert hub.resume(stale_id, owner=1, question="Tahliye süresi nedir?") is None
+        resumed = hub.resume(stale_id, owner=1, question="Kira artışı ne kadar?")
+        assert resumed is not None and [e async for e in resumed] == []
+
+    asyncio.run(main())
+
+
+def test_resume_refuses_dropped_frames() -> None:
+    async def main():
+        hub = StreamHub(max_bytes=2)
+        stream = hub.start(answer(["a", "b", "c"], 0, {}), owner=1, question="q")
+        await stream.task
+        assert hub.resume(f"{stream.id}:0", owner=1, question="q") is None
+        resumed = hub.resume(f"{stream.id}:1", owner=1, question="q")
+        assert [e["data"] async for e in resumed] == ["b", "c"]
+
+    asyncio.run(main())
+
+
+def test_cumulative_readers_get_the_buffered_deltas_re_encoded() -> None:
+    async def main():
+        encoder = StreamEncoder(DELTA)
+        frames = [encoder.text(0, token) for token in ("Kira ", "artışı ", "yüzde 25.")]
+        frames += [encoder.value(2, "dosya.pdf"), encoder.complete()]
+        hub = StreamHub()
+        stream = hub.start(answer(frames, 0, {}), owner=1, question="q")
+        await stream.task
+        # The buffer holds each token once, whatever protocol the readers use.
+        assert stream.size == sum(len(frame.encode("utf-8")) for frame in frames)
+
+        resumed = hub.resume(f"{stream.id}:1", owner=1, question="q", protocol=CUMULATIVE)
+        resumed = [e async for e in resumed]
+        assert [json.loads(e["data"])["message"] for e in resumed] == [
+            {"data_type": 0, "content": "Kira artışı "},
+            {"data_type": 0, "content": "Kira artışı yüzde 25."},
+            {"data_type": 2, "content": "dosya.pdf"},
+        ]
+        assert resumed[0]["id"] == f"{stream.id}:2"
+        delta = [e["data"] async for e in hub.resume(f"{stream.id}:3", owner=1, question="q")]
+        assert delta == frames[3:]
+
+    asyncio.run(main())
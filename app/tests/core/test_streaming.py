@@ -0,0 +1,165 @@
+import asyncio
+import hashlib
+import json
+
+import anyio
+import pytest
+from starlette.requests import Request
+
+from app.core.streaming import (
+    CUMULATIVE,
+    DELTA,
+    PrefetchedStream,
+    StreamEncoder,
+    coalesce_tokens,
+    merge_streams,
+    negotiate_protocol,
+    run_shielded,
+)
+
+
+def make_request(headers=(), query_string=b"") -> Request:
+    return Request(
+        {
+            "type": "http",
+            "method": "POST",
+            "path": "/",
+            "headers": [(k.lower().encode(), v.encode()) for k, v in headers],
+            "query_string": query_string,
+        }
+    )
+
+
+def test_negotiate_protocol() -> None:
+    assert negotiate_protocol(make_request()) == CUMULATIVE
+    assert negotiate_protocol(make_request([("X-Stream-Protocol", "delta")])) == DELTA
+    assert negotiate_protocol(make_request(query_string=b"stream_protocol=2")) == DELTA
+    assert negotiate_protocol(make_request([("X-Stream-Protocol", "unknown")])) == CUMULATIVE
+
+
+def test_cumulative_encoder_keeps_legacy_payloads() -> None:
+    encoder = StreamEncoder(CUMULATIVE)
+    encoder.text(0, "Mer")
+    assert json.loads(encoder.text(0, "haba")) == {"message": {"data_type": 0, "content": "Merhaba"}}
+    assert encoder.text(0, "") is None
+    assert encoder.complete() is None
+
+
+def test_delta_encoder_reconstructs_text_and_checksum() -> None:
+    encoder = StreamEncoder(DELTA)
+    payloads = [encoder.text(0, token) for token in ("Kıdem ", "tazminatı")]
+    payloads.append(encoder.value(2, "dava.pdf"))
+    payloads.append(encoder.complete())
+    events = [json.loads(p) for p in payloads]
+
+    assert [event["seq"] for event in events] == [1, 2, 3, 4]
+    answer = "".join(e["message"]["delta"] for e in events if e.get("message", {}).get("data_type") == 0)
+    assert answer == "Kıdem tazminatı"
+    assert events[2]["message"] == {"data_type": 2, "content": "dava.pdf"}
+    assert events[-1]["event"] == "complete"
+    assert events[-1]["lengths"] == {"0": len(answer)}
+    assert events[-1]["sha256"]["0"] == hashlib.sha256(answer.encode()).hexdigest()
+
+
+async def tokens_with_pause(tokens, pause_after, pause_s):
+    for i, token in enumerate(tokens):
+        if i == pause_after:
+            await asyncio.sleep(pause_s)
+        yield token
+
+
+async def collect(iterator):
+    return [chunk async for chunk in iterator]
+
+
+def test_coalesce_sends_first_token_alone_and_merges_the_rest() -> None:
+    tokens = ["Mer", "ha", "ba", " dün", "ya"]
+    chunks = asyncio.run(collect(coalesce_tokens(tokens_with_pause(tokens, 99, 0), window_ms=50)))
+    assert chunks == ["Mer", "haba dünya"]
+
+
+def test_coalesce_flushes_on_window_and_size() -> None:
+    tokens = ["a", "b", "c", "d", "e"]
+    chunks = asyncio.run(
+        collect(coalesce_tokens(tokens_with_pause(tokens, 3, 0.05), window_ms=10, max_bytes=100))
+    )
+    assert chunks == ["a", "bc", "de"]
+    chunks = asyncio.run(collect(coalesce_tokens(tokens_with_pause(tokens, 99, 0), window_ms=50, max_bytes=2)))
+    assert chunks == ["a", "bc", "de"]
+    chunks = asyncio.run(collect(coalesce_tokens(tokens_with_pause(tokens, 99, 0), window_ms=0)))
+    assert chunks == tokens
+
+
+def test_coalesce_cancels_source_when_consumer_is_cancelled() -> None:
+    state = {"closed": False}
+
+    async def endless():
+        try:
+            while True:
+                await asyncio.sleep(0.001)
+                yield "x"
+        finally:
+            state["closed"] = True
+
+    async def consume():
+        async for _ in coalesce_tokens(endless(), window_ms=5):
+            pass
+
+    async def main():
+        task = asyncio.create_task(consume())
+        await asyncio.sleep(0.02)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        await asyncio.sleep(0.01)
+
+    asyncio.run(main())
+    assert state["closed"]
+
+
+def test_run_shielded_finishes_cleanup_inside_a_cancelled_scope() -> None:
+    done = []
+
+    async def persist():
+        await asyncio.sleep(0.001)
+        done.append(True)
+
+    async def main():
+        with anyio.CancelScope() as scope:
+            scope.cancel()
+            try:
+                await anyio.sleep(1)
+            except anyio.get_cancelled_exc_class():
+                await run_shielded(persist())
+                raise
+
+    anyio.run(main)
+    assert done == [True]
+
+
+def test_title_is_prefetched_and_interleaved_with_the_answer() -> None:
+    events = []
+
+    async def answer():
+        for token in ("Kira ", "artışı ", "yüzde 25'tir."):
+            await asyncio.sleep(0.02)
+            yield token
+
+    async def title():
+        events.append("title started")
+        yield "Kira "
+        await asyncio.sleep(0.03)
+        yield "Artışı"
+
+    async def run():
+        prefetched = PrefetchedStream(title())
+        await asyncio.sleep(0.01)  # agent setup
+        assert events == ["title started"]
+        return [item async for item in merge_streams({0: answer(), 1: prefetched})]
+
+    merged = asyncio.run(run())
+    assert [text for data_type, text in merged if data_type == 0] == ["Kira ", "artışı ", "yüzde 25'tir."]
+    assert [text for data_type, text in merged if data_type == 1] == ["Kira ", "Artışı"]
+    # The title finished before the answer did.
+    assert merged[-1][0] == 0 and merged.index((1, "Artışı")) < len(merged) - 1
+
@@ -0,0 +1,11 @@
+from app.core.title import local_title
+
+
+def test_local_title_keeps_the_topic_words() -> None:
+    assert local_title("Kiracının tahliye davasında ihtarname süresi nedir?") == (
+        "Kiracının Tahliye Davasında İhtarname Süresi"
+    )
+    assert local_title("TBK 344. maddesine göre kira artışı ne kadar olabilir?") == (
+        "TBK 344 Maddesine Kira Artışı"
+    )
+    assert local_title("merhaba") == "Merhaba"
@@ -0,0 +1,67 @@
+import asyncio
+
+from langchain.memory import ConversationBufferMemory
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.tools import StructuredTool
+
+from app.crud.agent import AGENT_LLM_TAG, PrebuiltAgent
+
+
+class RecordingChatModel(BaseChatModel):
+    calls: list = []
+
+    @property
+    def _llm_type(self) -> str:
+        return "recording"
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        self.calls.append((messages, kwargs))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content="Yüzde 25."))])
+
+
+def rag_regulation(question: str) -> str:
+    """useful when user's question is related with laws and regulations"""
+    return "TBK 344"
+
+
+def test_requests_share_the_prebuilt_agent_and_bind_their_own_parameters() -> None:
+    llm = RecordingChatModel(calls=[])
+    prebuilt = PrebuiltAgent(llm=llm, tools=[StructuredTool.from_function(rag_regulation)])
+    assert [f["name"] for f in prebuilt.functions] == ["rag_regulation"]
+
+    for user_id, temperature in ((1, 0.2), (2, 0.9)):
+        memory = ConversationBufferMemory(
+            memory_key="chat_history", return_messages=True, output_key="output"
+        )
+        executor = prebuilt.executor(memory, temperature=temperature, max_tokens=4000, user_id=user_id)
+        assert executor.invoke({"input": "Kira artış oranı nedir?"})["output"] == "Yüzde 25."
+        assert len(memory.chat_memory.messages) == 2
+
+    (_, first), (messages, second) = llm.calls
+    assert first["temperature"] == 0.2 and first["user"] == "1"
+    assert second["temperature"] == 0.9 and second["user"] == "2"
+    assert second["functions"] is prebuilt.functions and second["max_tokens"] == 4000
+    assert messages[-1].content == "Kira artış oranı nedir?"
+
+
+def test_agent_llm_runs_are_tagged_for_the_prompt_token_count() -> None:
+    prebuilt = PrebuiltAgent(
+        llm=RecordingChatModel(calls=[]), tools=[StructuredTool.from_function(rag_regulation)]
+    )
+    memory = ConversationBufferMemory(
+        memory_key="chat_history", return_messages=True, output_key="output"
+    )
+    executor = prebuilt.executor(memory, temperature=0, max_tokens=100, user_id=1)
+
+    async def starts():
+        return [
+            event
+            async for event in executor.astream_events({"input": "Kira nedir?"}, version="v2")
+            if event["event"] == "on_chat_model_start"
+        ]
+
+    (start,) = asyncio.run(starts())
+    assert AGENT_LLM_TAG in start["tags"]
+    assert start["data"]["input"]["messages"][0][-1].content == "Kira nedir?"
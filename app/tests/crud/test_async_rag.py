@@ -0,0 +1,158 @@
+import asyncio
+import json
+import time
+from types import SimpleNamespace
+
+from langchain_community.chat_message_histories import ChatMessageHistory
+from langchain_core.documents import Document
+from langchain_core.embeddings import FakeEmbeddings
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.retrievers import BaseRetriever
+
+import app.api.v1.rag as rag_api
+import app.crud.chat as chat
+import app.crud.rag as rag
+from app.core.embedding_cache import CachedEmbeddings
+from app.core.memory import RollingSummaryMemory
+
+BLOCKING_SECONDS = 0.2
+MAX_LAG_SECONDS = 0.1
+
+
+class SlowChatModel(BaseChatModel):
+    """Chat model whose only implementation is a blocking call."""
+
+    answer: str = "cevap"
+
+    @property
+    def _llm_type(self) -> str:
+        return "slow-fake"
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        time.sleep(BLOCKING_SECONDS)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self.answer))])
+
+    def get_num_tokens(self, text: str) -> int:
+        return len(text.split())
+
+
+class SlowRetriever(BaseRetriever):
+    def _get_relevant_documents(self, query, *, run_manager):
+        time.sleep(BLOCKING_SECONDS)
+        return [Document(page_content=f"karar: {query}")]
+
+
+def slow_history(session_id=None):
+    time.sleep(BLOCKING_SECONDS)
+    history = ChatMessageHistory()
+    history.add_user_message("Kira artışı ne kadar?")
+    history.add_ai_message("Yüzde 25.")
+    return history
+
+
+def slow_session_memory(session_id, **kwargs):
+    return RollingSummaryMemory.from_store(
+        chat_memory=slow_history(session_id),
+        session_id=session_id,
+        load_summary=lambda session_id: ("", 0),
+        save_summary=lambda *args: None,
+        **kwargs,
+    )
+
+
+def use_fake_history(monkeypatch):
+    monkeypatch.setattr(rag, "init_legal_session_memory", slow_session_memory)
+
+
+def fake_registry():
+    return SimpleNamespace(
+        llm=SlowChatModel(),
+        question_llm=SlowChatModel(answer="Kira artışı sınırı nedir?"),
+        embeddings=CachedEmbeddings(FakeEmbeddings(size=8)),
+        retriever=lambda *args, **kwargs: SlowRetriever(),
+        chat_llm=lambda **kwargs: SlowChatModel(answer="Kira artışı"),
+    )
+
+
+async def max_event_loop_lag(awaitable):
+    """Run `awaitable` while a heartbeat measures the longest stall of the loop."""
+    lag = 0.0
+    done = False
+
+    async def heartbeat():
+        nonlocal lag
+        while not done:
+            start = time.perf_counter()
+            await asyncio.sleep(0.005)
+            lag = max(lag, time.perf_counter() - start - 0.005)
+
+    beat = asyncio.create_task(heartbeat())
+    await asyncio.sleep(0)
+    try:
+        result = await awaitable
+    finally:
+        done = True
+        await beat
+    return result, lag
+
+
+def test_async_rag_path_does_not_block_the_event_loop(monkeypatch) -> None:
+    registry = fake_registry()
+    monkeypatch.setattr(rag, "get_registry", lambda: registry)
+    monkeypatch.setattr(chat, "get_registry", lambda: registry)
+    use_fake_history(monkeypatch)
+    monkeypatch.setattr(chat, "read_pdf", lambda contents: time.sleep(BLOCKING_SECONDS) or "metin")
+
+    calls = [
+        rag.arag_chat("Kira artışı ne kadar?", session_id="s1"),
+        rag.aget_relevant_legal_cases("s1"),
+        chat.asummarize_session("Kira artışı ne kadar?", "Yüzde 25."),
+        chat.agenerate_question("metin", "Ne yapmalıyım?"),
+        chat.aread_pdf(b"%PDF"),
+    ]
+    for call in calls:
+        result, lag = asyncio.run(max_event_loop_lag(call))
+        assert result
+        assert lag < MAX_LAG_SECONDS, f"event loop blocked for {lag * 1000:.0f}ms"
+
+
+def test_chat_endpoint_does_not_block_the_event_loop(monkeypatch) -> None:
+    registry = fake_registry()
+    saved = []
+
+    def slow_add_message(message, session):
+        time.sleep(BLOCKING_SECONDS)
+        saved.append(message.role)
+
+    async def add_summary(**kwargs):
+        saved.append(kwargs["summary"])
+
+    monkeypatch.setattr(rag, "get_registry", lambda: registry)
+    monkeypatch.setattr(chat, "get_registry", lambda: registry)
+    use_fake_history(monkeypatch)
+    monkeypatch.setattr(rag_api, "arag_chat", rag.arag_chat)
+    monkeypatch.setattr(rag_api, "asummarize_session", chat.asummarize_session)
+    monkeypatch.setattr(rag_api, "get_userid_by_token", lambda token: 1)
+    monkeypatch.setattr(rag_api, "add_legal_chat_message", slow_add_message)
+    monkeypatch.setattr(
+        rag_api, "legal_session_exist", lambda **kwargs: time.sleep(BLOCKING_SECONDS)
+    )
+    monkeypatch.setattr(rag_api, "add_legal_session_summary", add_summary)
+
+    response, lag = asyncio.run(
+        max_event_loop_lag(
+            rag_api.rag_regulation_chat(
+                session_id="s1",
+                question="Kira artışı ne kadar?",
+                file=None,
+                dependencies="token",
+                session=None,
+            )
+        )
+    )
+    assert response.status_code == 200
+    assert json.loads(response.body)["title"] == "Kira artışı"
+    assert saved == ["user", "assistant", "Kira artışı"]
+    assert lag < MAX_LAG_SECONDS, f"event loop blocked for {lag * 1000:.0f}ms"
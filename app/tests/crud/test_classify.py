@@ -0,0 +1,41 @@
+import asyncio
+
+from langchain_core.runnables import RunnableLambda
+
+from app.crud.classify import Classifier, KeywordClassifier
+
+
+def test_keyword_classifier_defaults() -> None:
+    model = KeywordClassifier.load(None)
+    assert model.predict("Belediyenin imar planı iptal davası")[0] == "DANISTAY"
+    category, confidence = model.predict("Boşanma davasında nafaka ve velayet")
+    assert category == "YARGITAY" and confidence > 0.9
+    assert model.predict("Dava nasıl açılır?")[1] < 0.8
+
+
+def test_keyword_classifier_fit() -> None:
+    questions = [
+        "vergi cezası iptali",
+        "vergi ziyaı cezası",
+        "işçi kıdem tazminatı",
+        "işçi fazla mesai alacağı",
+    ] * 5
+    labels = ["DANISTAY", "DANISTAY", "YARGITAY", "YARGITAY"] * 5
+    model = KeywordClassifier.fit(questions, labels)
+    assert model.predict("vergi")[0] == "DANISTAY"
+    assert model.predict("işçi")[0] == "YARGITAY"
+
+
+def test_classifier_falls_back_to_llm_once_per_question() -> None:
+    calls = []
+
+    def llm(prompt):
+        calls.append(prompt)
+        return {"category": "DANISTAY"}
+
+    classifier = Classifier()
+    classifier.classify_chain = RunnableLambda(llm)
+    assert classifier.classify("Kıdem tazminatı nasıl hesaplanır?") == "YARGITAY"
+    assert asyncio.run(classifier.aclassify("Dava  nasıl açılır?")) == "DANISTAY"
+    assert asyncio.run(classifier.aclassify("dava nasıl açılır?")) == "DANISTAY"
+    assert len(calls) == 1
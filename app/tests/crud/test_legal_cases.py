@@ -0,0 +1,58 @@
+import asyncio
+
+import app.crud.rag as rag
+
+
+def test_legal_cases_are_precomputed_per_turn(monkeypatch) -> None:
+    history = {"messages": 2}
+    computed = []
+
+    def load_conversation(session_id):
+        return "Human: Kira artışı?\nAI: Yüzde 25.", history["messages"]
+
+    async def compute(conversation):
+        await asyncio.sleep(0.05)
+        computed.append(history["messages"])
+        return [f"karar {history['messages']}"]
+
+    monkeypatch.setattr(rag.settings, "LEGAL_CASES_PRECOMPUTE", True)
+    monkeypatch.setattr(rag, "_load_conversation", load_conversation)
+    monkeypatch.setattr(rag, "_compute_legal_cases", compute)
+
+    def counted(name):
+        return rag.metrics.snapshot()["counters"].get(f"legal_cases.{name}", 0)
+
+    before = {name: counted(name) for name in ("precomputed", "cache_hits", "on_demand")}
+
+    async def run():
+        # A click while the precomputation runs waits for it instead of starting another.
+        rag.schedule_legal_cases("precompute-session")
+        assert await rag.aget_relevant_legal_cases("precompute-session") == ["karar 2"]
+        assert await rag.aget_relevant_legal_cases("precompute-session") == ["karar 2"]
+        assert computed == [2]
+
+        # A new turn without a precomputation is computed on demand.
+        history["messages"] = 4
+        assert await rag.aget_relevant_legal_cases("precompute-session") == ["karar 4"]
+        assert computed == [2, 4]
+        assert await rag.aget_relevant_legal_cases("precompute-session") == ["karar 4"]
+        assert computed == [2, 4]
+
+        history["messages"] = 6
+        rag.schedule_legal_cases("precompute-session")
+        await asyncio.sleep(0.1)
+        assert "precompute-session" not in rag._legal_cases_tasks
+        assert await rag.aget_relevant_legal_cases("precompute-session") == ["karar 6"]
+        assert computed == [2, 4, 6]
+
+    asyncio.run(run())
+    # Repeated clicks on a turn computed on demand are cache hits, not precomputed results.
+    assert counted("precomputed") - before["precomputed"] == 3
+    assert counted("cache_hits") - before["cache_hits"] == 1
+    assert counted("on_demand") - before["on_demand"] == 1
+
+
+def test_precompute_is_off_by_default(monkeypatch) -> None:
+    monkeypatch.setattr(rag.settings, "LEGAL_CASES_PRECOMPUTE", False)
+    rag.schedule_legal_cases("disabled-session")
+    assert "disabled-session" not in rag._legal_cases_tasks
@@ -0,0 +1,70 @@
+import asyncio
+import json
+
+from langchain.memory import ConversationBufferMemory
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.tools import StructuredTool
+
+from app.core.cache import TTLCache
+from app.crud.agent import PrebuiltAgent
+from app.tools.cache import SessionCachedTool, tool_cache_key
+
+
+class ScriptedChatModel(BaseChatModel):
+    """Calls rag_regulation with the turn's question, then answers with the tool output."""
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted"
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        last = messages[-1]
+        if last.type == "function":
+            message = AIMessage(content=f"Cevap: {last.content}")
+        else:
+            arguments = json.dumps({"question": last.content})
+            message = AIMessage(
+                content="",
+                additional_kwargs={"function_call": {"name": "rag_regulation", "arguments": arguments}},
+            )
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+
+def test_tool_results_are_reused_within_a_session() -> None:
+    calls = []
+
+    async def rag_regulation(question: str) -> str:
+        calls.append(question)
+        return f"TBK 344 ({len(calls)})"
+
+    tool = StructuredTool.from_function(
+        coroutine=rag_regulation, name="rag_regulation", description="laws and regulations"
+    )
+    cached = SessionCachedTool.wrap(tool, cache=TTLCache(maxsize=10, ttl=60))
+    prebuilt = PrebuiltAgent(llm=ScriptedChatModel(), tools=[cached])
+
+    async def turn(session_id, question):
+        memory = ConversationBufferMemory(
+            memory_key="chat_history", return_messages=True, output_key="output"
+        )
+        executor = prebuilt.executor(memory, temperature=0, max_tokens=100, user_id=1)
+        events = [
+            event
+            async for event in executor.astream_events(
+                {"input": question}, config={"metadata": {"session_id": session_id}}, version="v2"
+            )
+        ]
+        hits = [e["data"]["tool"] for e in events if e["event"] == "on_custom_event"]
+        (end,) = [e for e in events if e["event"] == "on_chain_end" and e["name"] == "AgentExecutor"]
+        return end["data"]["output"]["output"], hits
+
+    assert asyncio.run(turn("s1", "Kira artışı ne kadar?")) == ("Cevap: TBK 344 (1)", [])
+    assert asyncio.run(turn("s1", "kira artışı  ne kadar")) == ("Cevap: TBK 344 (1)", ["rag_regulation"])
+    assert asyncio.run(turn("s2", "Kira artışı ne kadar?")) == ("Cevap: TBK 344 (2)", [])
+    assert len(calls) == 2
+
+    # Without a session the tool is always called.
+    assert asyncio.run(cached.ainvoke({"question": "Kira artışı ne kadar?"})) == "TBK 344 (3)"
+    assert tool_cache_key("s1", "t", {"question": "A B?"}) == tool_cache_key("s1", "t", {"question": "a  b"})
@@ -0,0 +1,99 @@
+from inspect import signature
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+from langchain_core.callbacks import AsyncCallbackManagerForToolRun, adispatch_custom_event
+from langchain_core.runnables import RunnableConfig
+from langchain_core.tools import BaseTool
+
+from core.cache import TTLCache
+from core.config import settings
+from core.metrics import metrics
+from core.text import normalize_text
+from log_config import configure_logging
+
+# Configure logging
+logger = configure_logging(__name__)
+
+tool_cache = TTLCache(maxsize=settings.TOOL_CACHE_SIZE, ttl=settings.TOOL_CACHE_TTL_SECONDS)
+metrics.register_gauge("tool_cache", tool_cache.stats)
+
+
+def tool_cache_key(session_id: str, name: str, arguments: dict) -> Tuple[Hashable, ...]:
+    """(session, tool, arguments) with string arguments normalized like cache questions."""
+    normalized = tuple(
+        sorted(
+            (key, normalize_text(value).rstrip(" ?.!") if isinstance(value, str) else repr(value))
+            for key, value in arguments.items()
+        )
+    )
+    return session_id, name, normalized
+
+
+def _tool_kwargs(method: Callable, run_manager, config) -> Dict[str, Any]:
+    """The run_manager and config keyword arguments `method` accepts."""
+    parameters = signature(method).parameters
+    kwargs = {}
+    if "run_manager" in parameters:
+        kwargs["run_manager"] = run_manager
+    if "config" in parameters:
+        kwargs["config"] = config
+    return kwargs
+
+
+class SessionCachedTool(BaseTool):
+    """
+    Wraps an agent tool with a cache of its results per chat session.
+
+    The session is read from the `session_id` run metadata that agent_run passes
+    to the executor; runs without one go straight to the tool. A hit skips the
+    retrieval pipeline and dispatches a `tool_cache_hit` event to the agent
+    event stream. Failures are not cached.
+    """
+
+    tool: BaseTool
+    cache: Any
+
+    @classmethod
+    def wrap(cls, tool: BaseTool, cache: Optional[TTLCache] = None) -> "SessionCachedTool":
+        return cls(
+            name=tool.name,
+            description=tool.description,
+            args_schema=tool.args_schema,
+            return_direct=tool.return_direct,
+            verbose=tool.verbose,
+            handle_tool_error=tool.handle_tool_error,
+            handle_validation_error=tool.handle_validation_error,
+            tool=tool,
+            cache=cache if cache is not None else tool_cache,
+        )
+
+    def _run(self, *args: Any, config: RunnableConfig, run_manager=None, **kwargs: Any) -> Any:
+        kwargs.update(_tool_kwargs(self.tool._run, run_manager, config))
+        return self.tool._run(*args, **kwargs)
+
+    async def _arun(
+        self,
+        *args: Any,
+        config: RunnableConfig,
+        run_manager: Optional[AsyncCallbackManagerForToolRun] = None,
+        **kwargs: Any,
+    ) -> Any:
+        tool_kwargs = _tool_kwargs(self.tool._arun, run_manager, config)
+        session_id = run_manager.metadata.get("session_id") if run_manager else None
+        if session_id is None or args:
+            return await self.tool._arun(*args, **kwargs, **tool_kwargs)
+
+        key = tool_cache_key(session_id, self.name, kwargs)
+        result = self.cache.get(key)
+        if result is not None:
+            metrics.incr("tool_cache.hits")
+            logger.info(f"Tool {self.name} served from the session cache ({session_id})")
+            await adispatch_custom_event(
+                "tool_cache_hit", {"tool": self.name, "arguments": kwargs}
+            )
+            return result
+
+        metrics.incr("tool_cache.misses")
+        result = await self.tool._arun(**kwargs, **tool_kwargs)
+        self.cache.set(key, result)
+        return result
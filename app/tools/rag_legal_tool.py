@@ -1,5 +1,7 @@
 from typing import Callable, Type
 from langchain_core.tools import StructuredTool, Tool
+from core.config import settings
+from core.snippets import compact_documents
 from crud.rag import rag_legal_source, rag_legal_source_v2
 from pydantic.v1 import BaseModel, Field
 
@@ -8,11 +10,21 @@ class RagLegalToolSchema(BaseModel):
     question: str = Field(description="topic of the legal cases or court decisions which user require")
 
 
+async def rag_legal_snippets(question: str):
+    """Reranked legal cases, reduced to their source links and the passages matching the question."""
+    documents = await rag_legal_source(question)
+    if not settings.TOOL_OUTPUT_COMPACTION:
+        return documents
+    return compact_documents(
+        documents, question, settings.LEGAL_TOOL_MAX_TOKENS, name="rag_legal"
+    )
+
+
 def rag_legal_tool():
     return StructuredTool(
         name="rag_legal",
         description="useful when user require the certain legal cases or court decisions",
-        coroutine=rag_legal_source,
+        coroutine=rag_legal_snippets,
         args_schema=RagLegalToolSchema,
         infer_schema=True,
         verbose=True,
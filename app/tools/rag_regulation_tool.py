@@ -1,6 +1,8 @@
 from typing import Callable, Type
 from langchain_core.tools import StructuredTool
 from pydantic.v1 import BaseModel, Field
+from core.config import settings
+from core.text import truncate_tokens
 from crud.rag import rag_regulation, rag_regulation_without_source
 
 
@@ -8,11 +10,23 @@ class RagRegulationToolSchema(BaseModel):
     question: str = Field(description="user's question")
 
 
+async def rag_regulation_answer(question: str):
+    """
+    The regulation answer alone, without the echoed question and empty chat
+    history; it is already written for the question, so it is only cut when
+    it runs over REGULATION_TOOL_MAX_TOKENS.
+    """
+    result = await rag_regulation_without_source(question)
+    if not settings.TOOL_OUTPUT_COMPACTION:
+        return result
+    return truncate_tokens(result["answer"], settings.REGULATION_TOOL_MAX_TOKENS)
+
+
 def rag_regulation_tool():
     return StructuredTool.from_function(
         name="rag_regulation",
         description="useful when user's question is related with laws and regulations",
-        coroutine=rag_regulation_without_source,
+        coroutine=rag_regulation_answer,
         args_schema=RagRegulationToolSchema,
         infer_schema=True,
         verbose=True,